@@ -1,13 +1,17 @@
+import hashlib
+import json
 import logging
 import numbers
 import uuid
 from abc import ABCMeta, abstractmethod
 from collections import defaultdict
 from datetime import datetime, timedelta
+from functools import partial
 
 from django.conf import settings
 from django.utils.translation import ugettext
 
+from lxml import etree
 from lxml.builder import E
 
 from casexml.apps.phone.fixtures import FixtureProvider
@@ -149,12 +153,18 @@ class ReportDataCache(object):
     def __init__(self):
         self.data_cache = {}
         self.total_row_cache = {}
+        self.data_source_cache = {}
 
     def get_data(self, key, data_source):
         if key not in self.data_cache:
             self.data_cache[key] = data_source.get_data()
         return self.data_cache[key]
 
+    def get_data_source(self, key, get_data_source):
+        if key not in self.data_source_cache:
+            self.data_source_cache[key] = get_data_source()
+        return self.data_source_cache[key]
+
 
 def _get_report_index_fixture(restore_user, oldest_sync_time=None):
     last_sync_time = _format_last_sync_time(restore_user, oldest_sync_time)
@@ -257,7 +267,7 @@ class ReportFixturesProviderV2(BaseReportFixtureProvider):
 
             oldest_sync_time = self._get_oldest_sync_time(restore_state, synced_fixtures, purged_fixture_ids)
             fixtures.append(_get_report_index_fixture(restore_user, oldest_sync_time))
-            fixtures.extend(self._v2_fixtures(restore_user, synced_fixtures))
+            fixtures.extend(self._v2_fixtures(restore_user, synced_fixtures, restore_state))
             for report_uuid in purged_fixture_ids:
                 fixtures.extend(self._empty_v2_fixtures(report_uuid))
 
@@ -299,7 +309,7 @@ class ReportFixturesProviderV2(BaseReportFixtureProvider):
         now = _utcnow()
 
         last_ucr_syncs = {
-            log.report_uuid: log.datetime
+            log.report_uuid: log
             for log in last_sync_log.last_ucr_sync_times
         }
         configs_to_sync = []
@@ -312,8 +322,8 @@ class ReportFixturesProviderV2(BaseReportFixtureProvider):
                 )
                 continue
 
-            last_sync = last_ucr_syncs[config.uuid]
-            next_sync = last_sync + timedelta(hours=float(config.sync_delay))
+            last_sync_log_entry = last_ucr_syncs[config.uuid]
+            next_sync = last_sync_log_entry.datetime + timedelta(hours=float(config.sync_delay))
 
             if now > next_sync:
                 configs_to_sync.append(config)
@@ -321,9 +331,13 @@ class ReportFixturesProviderV2(BaseReportFixtureProvider):
                     UCRSyncLog(report_uuid=config.uuid, datetime=now)
                 )
             else:
-                current_sync_log.last_ucr_sync_times.append(
-                    UCRSyncLog(report_uuid=config.uuid, datetime=last_sync)
-                )
+                # keep the result key and fixture hash for the next incremental sync
+                current_sync_log.last_ucr_sync_times.append(UCRSyncLog(
+                    report_uuid=config.uuid,
+                    datetime=last_sync_log_entry.datetime,
+                    result_key=last_sync_log_entry.result_key,
+                    fixture_hash=last_sync_log_entry.fixture_hash,
+                ))
 
         config_uuids = {config.uuid for config in report_configs}
         extra_configs_on_phone = set(last_ucr_syncs.keys()).difference(config_uuids)
@@ -336,11 +350,14 @@ class ReportFixturesProviderV2(BaseReportFixtureProvider):
             E.fixture(id=self._report_filter_id(report_uuid))
         ]
 
-    def _v2_fixtures(self, restore_user, report_configs):
+    def _v2_fixtures(self, restore_user, report_configs, restore_state=None):
         fixtures = []
+        get_fixtures = self.report_config_to_fixture
+        if restore_state is not None and toggles.INCREMENTAL_MOBILE_UCR_FIXTURES.enabled(restore_user.domain):
+            get_fixtures = partial(self._get_incremental_fixtures, restore_state)
         for report_config in report_configs:
             try:
-                fixtures.extend(self.report_config_to_fixture(report_config, restore_user))
+                fixtures.extend(get_fixtures(report_config, restore_user))
             except ReportConfigurationNotFoundError as err:
                 logging.exception('Error generating report fixture: {}'.format(err))
                 continue
@@ -353,6 +370,43 @@ class ReportFixturesProviderV2(BaseReportFixtureProvider):
                     raise
         return fixtures
 
+    def _get_incremental_fixtures(self, restore_state, report_config, restore_user):
+        """
+        Get the fixtures of a report unless the phone already has the same
+        fixtures from the last sync.
+
+        The result key of the report (see ``_get_report_result_key``) and a
+        hash of its fixtures are stored in the sync log. The report query
+        isn't run when the result key didn't change since the last sync and
+        the fixtures aren't sent when their hash didn't change.
+        """
+        sync_log_entry = _get_ucr_sync_log(restore_state.current_sync_log, report_config.uuid)
+        if sync_log_entry is None:
+            sync_log_entry = UCRSyncLog(report_uuid=report_config.uuid, datetime=_utcnow())
+            restore_state.current_sync_log.last_ucr_sync_times.append(sync_log_entry)
+        last_sync_log_entry = None
+        if restore_state.last_sync_log and not restore_state.overwrite_cache:
+            last_sync_log_entry = _get_ucr_sync_log(restore_state.last_sync_log, report_config.uuid)
+
+        result_key = _get_report_result_key(self.report_data_cache, report_config, restore_user)
+        if (last_sync_log_entry is not None and result_key is not None
+                and last_sync_log_entry.result_key == result_key):
+            sync_log_entry.result_key = result_key
+            sync_log_entry.fixture_hash = last_sync_log_entry.fixture_hash
+            return []
+
+        if result_key is not None:
+            # The rows are stored under the new result key, so they must not be read from a
+            # read replica that hasn't caught up with the table version of the key yet
+            data_source, _, _ = get_report_data_source(self.report_data_cache, report_config, restore_user)
+            data_source.read_from_primary()
+        fixtures = self.report_config_to_fixture(report_config, restore_user)
+        sync_log_entry.result_key = result_key
+        sync_log_entry.fixture_hash = _get_report_fixtures_hash(fixtures)
+        if last_sync_log_entry is not None and last_sync_log_entry.fixture_hash == sync_log_entry.fixture_hash:
+            return []
+        return fixtures
+
     def report_config_to_fixture(self, report_config, restore_user):
         def _row_to_row_elem(deferred_fields, filter_options_by_field, row, index, is_total_row=False):
             row_elem = E.row(index=str(index), is_total_row=str(is_total_row))
@@ -391,6 +445,43 @@ class ReportFixturesProviderV2(BaseReportFixtureProvider):
         return 'commcare-reports-filters:' + report_uuid
 
 
+def _get_ucr_sync_log(sync_log, report_uuid):
+    for log in sync_log.last_ucr_sync_times:
+        if log.report_uuid == report_uuid:
+            return log
+    return None
+
+
+def _get_report_result_key(report_data_cache, report_config, restore_user):
+    """
+    :returns: a key that changes whenever the fixtures of the report could
+        change, or ``None`` if that isn't tracked for the report
+    """
+    data_source, defer_filters, _ = get_report_data_source(report_data_cache, report_config, restore_user)
+    if defer_filters:
+        # the options of deferred filters also depend on their choice providers
+        return None
+    result_key = data_source.get_result_key()
+    if result_key is None:
+        return None
+    return hashlib.sha1(json.dumps([
+        result_key,
+        report_config.to_json(),
+        toggles.ADD_ROW_INDEX_TO_MOBILE_UCRS.enabled(restore_user.domain),
+    ], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _get_report_fixtures_hash(fixtures):
+    """Hash of the V2 fixtures of a report, without the time they were generated"""
+    report_filter_elem, report_elem = fixtures
+    fixtures_hash = hashlib.sha1(etree.tostring(report_filter_elem))
+    fixtures_hash.update(json.dumps(sorted(report_elem.attrib.items())).encode('utf-8'))
+    for rows_elem in report_elem:
+        for row_elem in rows_elem:
+            fixtures_hash.update(etree.tostring(row_elem))
+    return fixtures_hash.hexdigest()
+
+
 def _utcnow():
     return datetime.utcnow()
 
@@ -407,6 +498,39 @@ def generate_rows_and_filters(report_data_cache, report_config, restore_user, ro
                 deferred_fields, filter_options_by_field, row, index, is_total_row
             ) -> row_element
     """
+    data_source, defer_filters, filter_values = get_report_data_source(
+        report_data_cache, report_config, restore_user)
+    filter_options_by_field = defaultdict(set)
+
+    row_elements = get_report_element(
+        report_data_cache,
+        report_config,
+        data_source,
+        {f.field for f in defer_filters},
+        filter_options_by_field,
+        row_to_element,
+    )
+    filters_elem = _get_filters_elem(defer_filters, filter_options_by_field, restore_user._couch_user)
+
+    if (report_config.report_id in settings.UCR_COMPARISONS and
+        COMPARE_UCR_REPORTS.enabled(uuid.uuid4().hex, NAMESPACE_OTHER)):
+        compare_ucr_dbs.delay(restore_user.domain, report_config.report_id, filter_values)
+
+    return row_elements, filters_elem
+
+
+def get_report_data_source(report_data_cache, report_config, restore_user):
+    """Get the data source of a report with the filters of the report config applied
+
+    :returns: A three-tuple: ``(data_source, defer_filters, filter_values)``
+    """
+    return report_data_cache.get_data_source(
+        report_config.uuid,
+        partial(_get_report_data_source, report_config, restore_user)
+    )
+
+
+def _get_report_data_source(report_config, restore_user):
     domain = restore_user.domain
     report, data_source = _get_report_and_data_source(report_config.report_id, domain)
 
@@ -431,23 +555,7 @@ def generate_rows_and_filters(report_data_cache, report_config, restore_user, ro
     ]
     data_source.set_filter_values(filter_values)
     data_source.set_defer_fields([f.field for f in defer_filters])
-    filter_options_by_field = defaultdict(set)
-
-    row_elements = get_report_element(
-        report_data_cache,
-        report_config,
-        data_source,
-        {f.field for f in defer_filters},
-        filter_options_by_field,
-        row_to_element,
-    )
-    filters_elem = _get_filters_elem(defer_filters, filter_options_by_field, restore_user._couch_user)
-
-    if (report_config.report_id in settings.UCR_COMPARISONS and
-        COMPARE_UCR_REPORTS.enabled(uuid.uuid4().hex, NAMESPACE_OTHER)):
-        compare_ucr_dbs.delay(domain, report_config.report_id, filter_values)
-
-    return row_elements, filters_elem
+    return data_source, defer_filters, filter_values
 
 
 def get_report_element(report_data_cache, report_config, data_source, deferred_fields, filter_options_by_field, row_to_element):
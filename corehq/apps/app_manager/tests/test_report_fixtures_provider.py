@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.test import SimpleTestCase
 
@@ -8,6 +8,8 @@ from mock import Mock, patch
 
 from casexml.apps.phone.models import UCRSyncLog
 
+from corehq.apps.app_manager.const import MOBILE_UCR_VERSION_2
+from corehq.apps.app_manager.fixtures import mobile_ucr
 from corehq.apps.app_manager.fixtures.mobile_ucr import (
     ReportDataCache,
     ReportFixturesProviderV1,
@@ -146,6 +148,124 @@ class ReportFixturesProviderTests(SimpleTestCase, TestXmlMixin):
             configs = provider._relevant_report_configs(restore_state, [])
             self.assertEqual(configs, ([], {report_app_config.uuid}))
 
+    def test_v2_incremental_fixtures(self):
+        report_id = 'deadbeef'
+        report_app_config = ReportAppConfig(
+            uuid='c0ffee',
+            report_id=report_id,
+            filters={'computed_owner_name_40cc88a0_1': StaticChoiceListFilter()}
+        )
+        restore_user = Mock(user_id='mock-user-id')
+
+        def get_fixtures(last_sync_log, data_source):
+            restore_state = Mock(
+                overwrite_cache=False,
+                restore_user=restore_user,
+                current_sync_log=Mock(last_ucr_sync_times=[]),
+                last_sync_log=last_sync_log,
+            )
+            report_datasource.from_spec.return_value = data_source
+            fixtures = ReportFixturesProviderV2()._get_incremental_fixtures(
+                restore_state, report_app_config, restore_user)
+            return fixtures, restore_state.current_sync_log
+
+        with mock_report_configuration_get({report_id: MAKE_REPORT_CONFIG('test_domain', report_id)}), \
+                patch.object(mobile_ucr, 'ConfigurableReportDataSource') as report_datasource, \
+                patch.object(mobile_ucr, '_format_last_sync_time') as last_sync_time_patch:
+            last_sync_time_patch.return_value = datetime(2017, 9, 11, 6, 35, 20).isoformat()
+            data_source = self.get_data_source_mock()
+            data_source.get_result_key.return_value = 'result-1'
+            fixtures, sync_log = get_fixtures(None, data_source)
+            self.assertEqual(2, len(fixtures))
+            [entry] = sync_log.last_ucr_sync_times
+            self.assertEqual(report_app_config.uuid, entry.report_uuid)
+            self.assertIsNotNone(entry.fixture_hash)
+
+            # the table didn't change: the report query isn't run
+            data_source = self.get_data_source_mock()
+            data_source.get_result_key.return_value = 'result-1'
+            fixtures, sync_log = get_fixtures(sync_log, data_source)
+            self.assertEqual([], fixtures)
+            data_source.get_data.assert_not_called()
+            self.assertEqual(entry.fixture_hash, sync_log.last_ucr_sync_times[0].fixture_hash)
+
+            # the table changed but the rows of the report didn't
+            data_source = self.get_data_source_mock()
+            data_source.get_result_key.return_value = 'result-2'
+            fixtures, sync_log = get_fixtures(sync_log, data_source)
+            self.assertEqual([], fixtures)
+            data_source.get_data.assert_called_once()
+
+            # the rows of the report changed
+            data_source = self.get_data_source_mock()
+            data_source.get_result_key.return_value = 'result-3'
+            data_source.get_data.return_value = [{'foo': 2, 'bar': 2, 'baz': 3}]
+            fixtures, sync_log = get_fixtures(sync_log, data_source)
+            self.assertEqual(2, len(fixtures))
+            self.assertNotEqual(entry.fixture_hash, sync_log.last_ucr_sync_times[0].fixture_hash)
+
+    @flag_enabled('INCREMENTAL_MOBILE_UCR_FIXTURES')
+    def test_v2_incremental_fixtures_sync_delay(self):
+        report_id = 'deadbeef'
+        report_app_config = ReportAppConfig(
+            uuid='c0ffee',
+            report_id=report_id,
+            filters={'computed_owner_name_40cc88a0_1': StaticChoiceListFilter()},
+            sync_delay=1.0,
+        )
+        restore_user = Mock(user_id='mock-user-id', domain='test_domain')
+        first_sync = datetime(2017, 9, 11, 6, 35, 20)
+
+        def sync(last_sync_log, data_source, now):
+            restore_state = Mock(
+                overwrite_cache=False,
+                restore_user=restore_user,
+                current_sync_log=Mock(last_ucr_sync_times=[]),
+                last_sync_log=last_sync_log,
+            )
+            report_datasource.from_spec.return_value = data_source
+            utcnow_patch.return_value = now
+            fixtures = ReportFixturesProviderV2()(
+                restore_state, restore_user, {MOBILE_UCR_VERSION_2}, [report_app_config])
+            report_fixture_ids = {
+                fixture.attrib['id'] for fixture in fixtures
+                if fixture.attrib['id'] != 'commcare-reports:index'
+            }
+            return report_fixture_ids, restore_state.current_sync_log
+
+        with mock_report_configuration_get({report_id: MAKE_REPORT_CONFIG('test_domain', report_id)}), \
+                patch.object(mobile_ucr, 'ConfigurableReportDataSource') as report_datasource, \
+                patch.object(mobile_ucr, '_format_last_sync_time') as last_sync_time_patch, \
+                patch.object(mobile_ucr, '_utcnow') as utcnow_patch:
+            last_sync_time_patch.return_value = first_sync.isoformat()
+            data_source = self.get_data_source_mock()
+            data_source.get_result_key.return_value = 'result-1'
+            fixture_ids, sync_log = sync(None, data_source, first_sync)
+            self.assertEqual(2, len(fixture_ids))
+            data_source.read_from_primary.assert_called_once_with()
+            [entry] = sync_log.last_ucr_sync_times
+            self.assertIsNotNone(entry.result_key)
+            self.assertIsNotNone(entry.fixture_hash)
+
+            # the report isn't due: its incremental state is kept
+            data_source = self.get_data_source_mock()
+            fixture_ids, sync_log = sync(sync_log, data_source, first_sync + timedelta(minutes=30))
+            self.assertEqual(set(), fixture_ids)
+            [kept_entry] = sync_log.last_ucr_sync_times
+            self.assertEqual(
+                (entry.report_uuid, entry.datetime, entry.result_key, entry.fixture_hash),
+                (kept_entry.report_uuid, kept_entry.datetime, kept_entry.result_key, kept_entry.fixture_hash),
+            )
+
+            # the report is due but the table didn't change
+            data_source = self.get_data_source_mock()
+            data_source.get_result_key.return_value = 'result-1'
+            fixture_ids, sync_log = sync(sync_log, data_source, first_sync + timedelta(hours=2))
+            self.assertEqual(set(), fixture_ids)
+            data_source.get_data.assert_not_called()
+            data_source.read_from_primary.assert_not_called()
+            self.assertEqual(entry.fixture_hash, sync_log.last_ucr_sync_times[0].fixture_hash)
+
     @patch('corehq.apps.app_manager.fixtures.mobile_ucr._format_last_sync_time')
     def test_get_report_index_fixture(self, last_sync_time_patch):
         last_sync_time_patch.return_value = datetime(2017, 9, 11, 6, 35, 20).isoformat()
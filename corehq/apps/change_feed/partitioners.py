@@ -1,9 +1,22 @@
+"""
+Kafka partitioning by the backlog of the pillow that reads each topic
+
+The backlog of every partition is measured by a single publisher (the
+``publish_partition_backlogs`` periodic task) and stored as a snapshot in
+redis. Producers only read the snapshot, and keep it in memory for a few
+seconds, so sending a change never reads pillow checkpoints or queries
+the kafka brokers for offsets.
+"""
+import random
+import time
+from collections import namedtuple
+
 from django.conf import settings
 from kafka import KafkaConsumer
 from memoized import memoized
 
 from corehq.apps.change_feed import topics
-from corehq.util.quickcache import quickcache
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
 from dimagi.utils.logging import notify_exception
 from pillowtop import get_pillow_by_name, get_all_pillow_configs
 
@@ -15,28 +28,82 @@ TOPIC_TO_PILLOW_NAME_MAP = {
     topics.FORM_SQL: 'xform-pillow',
 }
 
+BACKLOG_SNAPSHOT_CACHE_KEY = 'kafka-partition-backlog-snapshot'
+# seconds between snapshots
+BACKLOG_PUBLISH_INTERVAL = 10
+# older snapshots are not used (e.g. when the publisher is not running)
+BACKLOG_SNAPSHOT_MAX_AGE = 60
+# seconds a producer uses its copy of the snapshot before reading it again
+LOCAL_SNAPSHOT_TIMEOUT = 5
+
+# backlogs_by_topic: {topic: {partition: backlog length}}
+BacklogSnapshot = namedtuple('BacklogSnapshot', 'created_on backlogs_by_topic')
+_LocalSnapshot = namedtuple('_LocalSnapshot', 'loaded_on snapshot')
+
+_local_snapshot = _LocalSnapshot(0, None)
+
 
 def choose_best_partition_for_topic(topic):
-    if topic not in _get_topic_to_pillow_map():
+    """Choose a partition at random, weighted towards the shortest backlogs
+
+    Picking the partition with the shortest backlog every time would send
+    all changes to that partition until the next snapshot, so partitions
+    are instead picked with a probability inversely proportional to
+    their backlog.
+    """
+    snapshot = _get_backlog_snapshot()
+    if snapshot is None or time.time() - snapshot.created_on > BACKLOG_SNAPSHOT_MAX_AGE:
         # None means there's no best, use the default
         return None
 
+    backlog_lengths_by_partition = snapshot.backlogs_by_topic.get(topic)
+    if not backlog_lengths_by_partition:
+        return None
+    return choose_weighted_partition(backlog_lengths_by_partition)
+
+
+def choose_weighted_partition(backlog_lengths_by_partition):
+    partitions = sorted(backlog_lengths_by_partition)
+    weights = [1 / (1 + max(backlog_lengths_by_partition[partition], 0)) for partition in partitions]
+    return random.choices(partitions, weights)[0]
+
+
+def _get_backlog_snapshot():
+    # The snapshot is replaced rather than changed, so it is read without a lock.
+    # Concurrent readers may both load a new copy, which is only a cache read.
+    global _local_snapshot
+    local = _local_snapshot
+    now = time.time()
+    if now - local.loaded_on > LOCAL_SNAPSHOT_TIMEOUT:
+        local = _LocalSnapshot(now, _load_backlog_snapshot())
+        _local_snapshot = local
+    return local.snapshot
+
+
+def _load_backlog_snapshot():
     try:
-        backlog_lengths_by_partition = _get_backlog_lengths_by_partition(topic)
+        value = get_redis_default_cache().get(BACKLOG_SNAPSHOT_CACHE_KEY)
     except Exception:
-        # if there's any issue whatsoever fetching offsets
         # fall back to the default partitioning algorithm
-        notify_exception(None, "Error measuring kafka partition backlog lengths")
+        notify_exception(None, "Error reading kafka partition backlog snapshot")
         return None
-    else:
-        _, best_partition = min(
-            (backlog_length, partition)
-            for partition, backlog_length in backlog_lengths_by_partition.items()
-        )
-        return best_partition
+    return BacklogSnapshot(*value) if value else None
+
+
+def publish_backlog_snapshot():
+    """Measure the backlog of all partitioned topics and store the snapshot"""
+    backlogs_by_topic = {}
+    for topic in _get_topic_to_pillow_map():
+        try:
+            backlogs_by_topic[topic] = _get_backlog_lengths_by_partition(topic)
+        except Exception:
+            # producers use the default partitioning for this topic
+            notify_exception(None, "Error measuring kafka partition backlog lengths")
+    snapshot = BacklogSnapshot(time.time(), backlogs_by_topic)
+    get_redis_default_cache().set(BACKLOG_SNAPSHOT_CACHE_KEY, tuple(snapshot), timeout=BACKLOG_SNAPSHOT_MAX_AGE)
+    return snapshot
 
 
-@quickcache(['topic'], memoize_timeout=10, timeout=10)
 def _get_backlog_lengths_by_partition(topic):
     assert topic in _get_topic_to_pillow_map(), \
         f"Allowed topics are {', '.join(_get_topic_to_pillow_map().keys())}"
@@ -1,5 +1,6 @@
 import json
 import logging
+import time
 import uuid
 from functools import partial
 
@@ -15,6 +16,9 @@ CHANGE_ERROR = 'ERROR'
 CHANGE_SENT = 'SENT'
 KAFKA_AUDIT_LOGGER = 'kafka_producer_audit'
 
+# seconds to wait for the acks of all changes sent with ``send_changes``
+BATCH_SEND_TIMEOUT = 30
+
 logger = logging.getLogger(KAFKA_AUDIT_LOGGER)
 
 
@@ -40,23 +44,13 @@ class ChangeProducer(object):
         return self._producer
 
     def send_change(self, topic, change_meta):
-        if settings.USE_KAFKA_SHORTEST_BACKLOG_PARTITIONER:
-            from corehq.apps.change_feed.partitioners import choose_best_partition_for_topic
-            partition = choose_best_partition_for_topic(topic)
-        else:
-            partition = None
-
-        message = change_meta.to_json()
-        message_json_dump = json.dumps(message).encode('utf-8')
-        change_meta._transaction_id = uuid.uuid4().hex
         try:
-            _audit_log(CHANGE_PRE_SEND, change_meta)
-            future = self.producer.send(topic, message_json_dump, key=change_meta.document_id, partition=partition)
+            future = self._send(topic, change_meta)
             if self.auto_flush:
                 future.get()
                 _audit_log(CHANGE_SENT, change_meta)
         except Exception as e:
-            _audit_log('ERROR', change_meta)
+            _audit_log(CHANGE_ERROR, change_meta)
             raise KafkaPublishingError(e)
 
         if not self.auto_flush:
@@ -64,6 +58,53 @@ class ChangeProducer(object):
             on_error = partial(_on_error, change_meta)
             future.add_callback(on_success).add_errback(on_error)
 
+    def send_changes(self, changes, timeout=BATCH_SEND_TIMEOUT):
+        """Send changes together and wait for all of them to be acked
+
+        The changes are all handed to the producer before waiting for any
+        ack, so the wait is about one broker round trip rather than one
+        per change.
+
+        :param changes: list of ``(topic, change_meta)`` tuples.
+        :param timeout: seconds to wait for all acks.
+        :raises: ``KafkaPublishingError`` if any change was not sent.
+        """
+        sent = []
+        error = None
+        for topic, change_meta in changes:
+            try:
+                sent.append((change_meta, self._send(topic, change_meta)))
+            except Exception as e:
+                _audit_log(CHANGE_ERROR, change_meta)
+                error = error or e
+                break
+
+        deadline = time.time() + timeout
+        for change_meta, future in sent:
+            try:
+                future.get(timeout=max(deadline - time.time(), 0))
+            except Exception as e:
+                _audit_log(CHANGE_ERROR, change_meta)
+                error = error or e
+            else:
+                _audit_log(CHANGE_SENT, change_meta)
+
+        if error is not None:
+            raise KafkaPublishingError(error)
+
+    def _send(self, topic, change_meta):
+        if settings.USE_KAFKA_SHORTEST_BACKLOG_PARTITIONER:
+            from corehq.apps.change_feed.partitioners import choose_best_partition_for_topic
+            partition = choose_best_partition_for_topic(topic)
+        else:
+            partition = None
+
+        message = change_meta.to_json()
+        message_json_dump = json.dumps(message).encode('utf-8')
+        change_meta._transaction_id = uuid.uuid4().hex
+        _audit_log(CHANGE_PRE_SEND, change_meta)
+        return self.producer.send(topic, message_json_dump, key=change_meta.document_id, partition=partition)
+
     def flush(self, timeout=None):
         self.producer.flush(timeout=timeout)
 
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+
+from celery.task import periodic_task
+
+from corehq.apps.change_feed.partitioners import (
+    BACKLOG_PUBLISH_INTERVAL,
+    publish_backlog_snapshot,
+)
+
+
+@periodic_task(run_every=timedelta(seconds=BACKLOG_PUBLISH_INTERVAL), queue='background_queue')
+def publish_partition_backlogs():
+    if settings.USE_KAFKA_SHORTEST_BACKLOG_PARTITIONER:
+        publish_backlog_snapshot()
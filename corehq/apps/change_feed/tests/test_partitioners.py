@@ -0,0 +1,64 @@
+import time
+from collections import Counter
+
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from corehq.apps.change_feed import partitioners, topics
+from corehq.apps.change_feed.partitioners import (
+    BACKLOG_SNAPSHOT_MAX_AGE,
+    BacklogSnapshot,
+    choose_best_partition_for_topic,
+    choose_weighted_partition,
+)
+
+
+class ChooseBestPartitionTest(SimpleTestCase):
+
+    def setUp(self):
+        super(ChooseBestPartitionTest, self).setUp()
+        partitioners._local_snapshot = partitioners._LocalSnapshot(0, None)
+
+    def tearDown(self):
+        partitioners._local_snapshot = partitioners._LocalSnapshot(0, None)
+        super(ChooseBestPartitionTest, self).tearDown()
+
+    def _patch_snapshot(self, snapshot):
+        return patch.object(partitioners, '_load_backlog_snapshot', return_value=snapshot)
+
+    def test_no_snapshot(self):
+        with self._patch_snapshot(None):
+            self.assertIsNone(choose_best_partition_for_topic(topics.CASE_SQL))
+
+    def test_old_snapshot(self):
+        snapshot = BacklogSnapshot(time.time() - BACKLOG_SNAPSHOT_MAX_AGE - 1, {topics.CASE_SQL: {0: 0}})
+        with self._patch_snapshot(snapshot):
+            self.assertIsNone(choose_best_partition_for_topic(topics.CASE_SQL))
+
+    def test_topic_not_in_snapshot(self):
+        snapshot = BacklogSnapshot(time.time(), {topics.CASE_SQL: {0: 0}})
+        with self._patch_snapshot(snapshot):
+            self.assertIsNone(choose_best_partition_for_topic(topics.FORM_SQL))
+
+    def test_choose_partition(self):
+        snapshot = BacklogSnapshot(time.time(), {topics.CASE_SQL: {3: 0}})
+        with self._patch_snapshot(snapshot):
+            self.assertEqual(3, choose_best_partition_for_topic(topics.CASE_SQL))
+
+    def test_snapshot_loaded_once(self):
+        snapshot = BacklogSnapshot(time.time(), {topics.CASE_SQL: {3: 0}})
+        with self._patch_snapshot(snapshot) as load:
+            choose_best_partition_for_topic(topics.CASE_SQL)
+            choose_best_partition_for_topic(topics.CASE_SQL)
+        self.assertEqual(1, load.call_count)
+
+    def test_weighted_partition(self):
+        chosen = Counter(choose_weighted_partition({0: 0, 1: 0, 2: 99}) for i in range(1000))
+        # the lagging partition is chosen about 1% of the time
+        self.assertGreater(chosen[0], chosen[2])
+        self.assertGreater(chosen[1], chosen[2])
+        self.assertLess(chosen[2], 100)
+
+    def test_negative_backlog(self):
+        self.assertEqual(0, choose_weighted_partition({0: -5}))
@@ -19,6 +19,7 @@ from corehq.apps.change_feed.producer import (
     KAFKA_AUDIT_LOGGER,
     ChangeProducer,
 )
+from corehq.form_processor.exceptions import KafkaPublishingError
 from corehq.util.test_utils import capture_log_output
 
 
@@ -60,6 +61,52 @@ class TestKafkaAuditLogging(SimpleTestCase):
 
         self._check_logs(logs, meta.document_id, [CHANGE_PRE_SEND, CHANGE_ERROR])
 
+    def test_send_changes(self):
+        kafka_producer = ChangeProducer()
+        futures = [Future(), Future()]
+        for future in futures:
+            future.get = Mock()
+        kafka_producer.producer.send = Mock(side_effect=futures)
+        metas = [self._get_meta(), self._get_meta()]
+
+        with capture_log_output(KAFKA_AUDIT_LOGGER) as logs:
+            kafka_producer.send_changes([(topics.CASE, meta) for meta in metas])
+
+        lines = logs.get_output().splitlines()
+        self.assertEqual(
+            [CHANGE_PRE_SEND, CHANGE_PRE_SEND, CHANGE_SENT, CHANGE_SENT],
+            [line.split(',')[0] for line in lines]
+        )
+        self.assertEqual(
+            [meta.document_id for meta in metas] * 2,
+            [line.split(',')[2] for line in lines]
+        )
+
+    def test_send_changes_error(self):
+        kafka_producer = ChangeProducer()
+        futures = [Future(), Future()]
+        futures[0].get = Mock(side_effect=Exception())
+        futures[1].get = Mock()
+        kafka_producer.producer.send = Mock(side_effect=futures)
+        metas = [self._get_meta(), self._get_meta()]
+
+        with capture_log_output(KAFKA_AUDIT_LOGGER) as logs:
+            with self.assertRaises(KafkaPublishingError):
+                kafka_producer.send_changes([(topics.CASE, meta) for meta in metas])
+
+        # the other change is still waited for
+        futures[1].get.assert_called_once()
+        lines = logs.get_output().splitlines()
+        self.assertEqual(
+            [CHANGE_PRE_SEND, CHANGE_PRE_SEND, CHANGE_ERROR, CHANGE_SENT],
+            [line.split(',')[0] for line in lines]
+        )
+
+    def _get_meta(self):
+        return ChangeMeta(
+            document_id=uuid.uuid4().hex, data_source_type='dummy-type', data_source_name='dummy-name'
+        )
+
     def _test_success(self, auto_flush):
         kafka_producer = ChangeProducer(auto_flush=auto_flush)
         with capture_log_output(KAFKA_AUDIT_LOGGER) as logs:
@@ -1,5 +1,6 @@
 from collections import defaultdict
 from functools import partial
+from itertools import chain
 from operator import attrgetter
 from xml.etree import cElementTree as ElementTree
 
@@ -7,6 +8,7 @@ from casexml.apps.phone.fixtures import FixtureProvider
 from casexml.apps.phone.utils import (
     GLOBAL_USER_ID,
     get_or_cache_global_fixture,
+    get_or_cache_scoped_fixture,
 )
 
 from corehq.apps.fixtures.dbaccessors import iter_fixture_items_for_data_type
@@ -64,7 +66,7 @@ class ItemListsProvider(FixtureProvider):
         if global_types:
             items.extend(self.get_global_items(global_types, restore_state))
         if user_types:
-            items.extend(self.get_user_items(user_types, restore_user))
+            items.extend(self.get_user_items(user_types, restore_state))
         return items
 
     def get_global_items(self, global_types, restore_state):
@@ -80,9 +82,9 @@ class ItemListsProvider(FixtureProvider):
 
         return self._get_fixtures(global_types, get_items_by_type, GLOBAL_USER_ID)
 
-    def get_user_items(self, user_types, restore_user):
+    def get_user_items(self, user_types, restore_state):
         items_by_type = defaultdict(list)
-        for item in restore_user.get_fixture_data_items():
+        for item in restore_state.restore_user.get_fixture_data_items():
             data_type = user_types.get(item.data_type_id)
             if data_type:
                 self._set_cached_type(item, data_type)
@@ -92,7 +94,15 @@ class ItemListsProvider(FixtureProvider):
             return sorted(items_by_type.get(data_type, []),
                           key=attrgetter('sort_key'))
 
-        return self._get_fixtures(user_types, get_items_by_type, restore_user.user_id)
+        def get_scope():
+            # users that own the same items get the same fixtures
+            return sorted(
+                '{} {}'.format(doc._id, doc._rev)
+                for doc in chain(user_types.values(), *items_by_type.values())
+            )
+
+        data_fn = partial(self._get_fixtures, user_types, get_items_by_type)
+        return get_or_cache_scoped_fixture(restore_state, self.id, get_scope, data_fn)
 
     def _set_cached_type(self, item, data_type):
         # set the cached version used by the object so that it doesn't
@@ -2,6 +2,8 @@ from xml.etree import cElementTree as ElementTree
 
 from django.test import TestCase
 
+import mock
+
 from casexml.apps.case.tests.util import check_xml_line_by_line
 from casexml.apps.phone.tests.utils import \
     call_fixture_generator as call_fixture_generator_raw
@@ -24,6 +26,7 @@ from corehq.apps.fixtures.models import (
 from corehq.apps.users.dbaccessors.all_commcare_users import delete_all_users
 from corehq.apps.users.models import CommCareUser
 from corehq.blobs import get_blob_db
+from corehq.util.test_utils import flag_enabled
 
 
 def call_fixture_generator(user):
@@ -310,6 +313,36 @@ class FixtureDataTest(TestCase):
         fixtures = call_fixture_generator(sammy)
         self.assertEqual({item.attrib['user_id'] for item in fixtures}, {sammy.user_id})
 
+    @flag_enabled('SHARED_USER_FIXTURE_CACHE')
+    def test_shared_user_fixture(self):
+        sammy = CommCareUser.create(self.domain, 'sammy', '***')
+        self.addCleanup(sammy.delete)
+        ownership = FixtureOwnership(
+            domain=self.domain,
+            owner_id=sammy.get_id,
+            owner_type='user',
+            data_item_id=self.data_item.get_id
+        )
+        ownership.save()
+        self.addCleanup(ownership.delete)
+        frank = self.user.to_ota_restore_user()
+        sammy = sammy.to_ota_restore_user()
+
+        fixture, = call_fixture_generator(frank)
+        self.assertEqual(fixture.attrib['user_id'], frank.user_id)
+
+        # sammy owns the same items as frank
+        with mock.patch.object(FixtureDataItem, 'to_xml') as to_xml:
+            fixture, = call_fixture_generator(sammy)
+        to_xml.assert_not_called()
+        self.assertEqual(fixture.attrib['user_id'], sammy.user_id)
+        self.assertEqual(fixture.findtext('district_list/district/district_id'), 'Delhi_id')
+
+        self.data_item.fields['district_id'].field_list[0].field_value = 'New_Delhi_id'
+        self.data_item.save()
+        fixture, = call_fixture_generator(sammy)
+        self.assertEqual(fixture.findtext('district_list/district/district_id'), 'New_Delhi_id')
+
     def make_data_type(self, name, is_global):
         data_type = FixtureDataType(
             domain=self.domain,
@@ -1,5 +1,6 @@
 from collections import defaultdict
-from itertools import groupby
+from functools import partial
+from itertools import chain, groupby
 from xml.etree.cElementTree import Element, SubElement
 
 from django.contrib.postgres.fields.array import ArrayField
@@ -9,6 +10,7 @@ from django_cte import With
 from django_cte.raw import raw_cte_sql
 
 from casexml.apps.phone.fixtures import FixtureProvider
+from casexml.apps.phone.utils import get_or_cache_scoped_fixture
 
 from corehq import toggles
 from corehq.apps.app_manager.const import (
@@ -17,6 +19,11 @@ from corehq.apps.app_manager.const import (
     SYNC_HIERARCHICAL_FIXTURE,
 )
 from corehq.apps.custom_data_fields.dbaccessors import get_by_domain_and_type
+from corehq.apps.locations.bulk_fixtures import (
+    get_location_rows,
+    write_flat_fixture,
+    write_hierarchical_fixture,
+)
 from corehq.apps.fixtures.utils import get_index_schema_node
 from corehq.apps.locations.models import (
     LocationFixtureConfiguration,
@@ -122,8 +129,23 @@ class LocationFixtureProvider(FixtureProvider):
         if not should_sync_locations(restore_state.last_sync_log, locations_queryset, restore_state):
             return []
 
-        data_fields = _get_location_data_fields(restore_user.domain)
-        return self.serializer.get_xml_nodes(self.id, restore_user, locations_queryset, data_fields)
+        domain = restore_user.domain
+        data_fields = _get_location_data_fields(domain)
+        scope_fn = partial(_get_location_fixture_scope, domain, locations_queryset, data_fields)
+        data_fn = partial(self.serializer.get_xml_nodes, self.id, domain, locations_queryset, data_fields)
+        return get_or_cache_scoped_fixture(restore_state, self.id, scope_fn, data_fn)
+
+
+def _get_location_fixture_scope(domain, locations_queryset, data_fields):
+    """Users that sync the same locations get the same location fixture"""
+    locations = locations_queryset.prefetch_related(None).values_list('location_id', 'last_modified')
+    location_types = LocationType.objects.filter(domain=domain).values_list('id', 'last_modified')
+    scope = sorted(
+        '{} {}'.format(id_, last_modified.isoformat())
+        for id_, last_modified in chain(locations, location_types)
+    )
+    scope.append(' '.join(field.slug for field in data_fields))
+    return scope
 
 
 class HierarchicalLocationSerializer(object):
@@ -131,10 +153,14 @@ class HierarchicalLocationSerializer(object):
     def should_sync(self, restore_user, app):
         return should_sync_hierarchical_fixture(restore_user.project, app)
 
-    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields):
+    def get_xml_nodes(self, fixture_id, domain, locations_queryset, data_fields, user_id):
+        if toggles.BULK_LOCATION_FIXTURES.enabled(domain):
+            rows = get_location_rows(locations_queryset)
+            return [write_hierarchical_fixture(fixture_id, user_id, rows, data_fields)]
+
         locations_db = LocationSet(locations_queryset)
 
-        root_node = Element('fixture', {'id': fixture_id, 'user_id': restore_user.user_id})
+        root_node = Element('fixture', {'id': fixture_id, 'user_id': user_id})
         root_locations = locations_db.root_locations
 
         if root_locations:
@@ -154,23 +180,27 @@ class FlatLocationSerializer(object):
     def should_sync(self, restore_user, app):
         return should_sync_flat_fixture(restore_user.project, app)
 
-    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields):
+    def get_xml_nodes(self, fixture_id, domain, locations_queryset, data_fields, user_id):
 
-        all_types = LocationType.objects.filter(domain=restore_user.domain).values_list(
+        all_types = LocationType.objects.filter(domain=domain).values_list(
             'code', flat=True
         )
         location_type_attrs = ['{}_id'.format(t) for t in all_types if t is not None]
         attrs_to_index = ['@{}'.format(attr) for attr in location_type_attrs]
         attrs_to_index.extend(['@id', '@type', 'name'])
 
-        return [get_index_schema_node(fixture_id, attrs_to_index),
-                self._get_fixture_node(fixture_id, restore_user, locations_queryset,
-                                       location_type_attrs, data_fields)]
+        if toggles.BULK_LOCATION_FIXTURES.enabled(domain):
+            rows = get_location_rows(locations_queryset, order_by=['site_code'])
+            fixture_node = write_flat_fixture(fixture_id, user_id, rows, location_type_attrs, data_fields)
+        else:
+            fixture_node = self._get_fixture_node(fixture_id, user_id, locations_queryset,
+                                                  location_type_attrs, data_fields)
+        return [get_index_schema_node(fixture_id, attrs_to_index), fixture_node]
 
-    def _get_fixture_node(self, fixture_id, restore_user, locations_queryset,
+    def _get_fixture_node(self, fixture_id, user_id, locations_queryset,
                           location_type_attrs, data_fields):
         root_node = Element('fixture', {'id': fixture_id,
-                                        'user_id': restore_user.user_id,
+                                        'user_id': user_id,
                                         'indexed': 'true'})
         outer_node = Element('locations')
         root_node.append(outer_node)
@@ -200,7 +230,7 @@ class FlatLocationSerializer(object):
                     ).format(
                         domain=current_location.domain,
                         location_id=current_location.location_id,
-                        user_id=restore_user.user_id,
+                        user_id=user_id,
                     )
                     _soft_assert(False, msg=message)
 
@@ -14,6 +14,8 @@ from casexml.apps.phone.tests.utils import (
     call_fixture_generator,
     create_restore_user,
 )
+from casexml.apps.phone.utils import get_cached_items_with_count
+from casexml.apps.phone.xml import tostring
 
 from corehq.apps.app_manager.tests.util import (
     TestXmlMixin,
@@ -335,6 +337,39 @@ class LocationFixturesTest(LocationHierarchyTestCase, FixtureHasLocationsMixin):
             ['Massachusetts', 'Suffolk', 'Middlesex']
         )
 
+    @flag_enabled('HIERARCHICAL_LOCATION_FIXTURE')
+    @flag_enabled('SHARED_USER_FIXTURE_CACHE')
+    def test_shared_location_fixture(self):
+        other_user = create_restore_user(self.domain, 'other', '123')
+        self.addCleanup(other_user._couch_user.delete)
+        self.user._couch_user.set_location(self.locations['Suffolk'])
+        other_user._couch_user.set_location(self.locations['Suffolk'])
+        desired_locations = ['Massachusetts', 'Suffolk', 'Boston', 'Revere']
+
+        fixture, = call_fixture_generator(location_fixture_generator, self.user)
+        fixture, count = get_cached_items_with_count(fixture)
+        self.assertEqual(count, 1)
+        self.assertXmlEqual(self._assemble_expected_fixture('simple_fixture', desired_locations), fixture)
+
+        # the other user syncs the same locations
+        with mock.patch('corehq.apps.locations.fixtures._location_to_fixture') as location_to_fixture:
+            other_fixture, = call_fixture_generator(location_fixture_generator, other_user)
+        location_to_fixture.assert_not_called()
+        other_fixture, count = get_cached_items_with_count(other_fixture)
+        self.assertEqual(other_fixture, fixture.replace(
+            self.user.user_id.encode('utf-8'), other_user.user_id.encode('utf-8')))
+
+        boston = self.locations['Boston']
+
+        def rename_boston(name):
+            boston.name = name
+            boston.save()
+
+        rename_boston('Beantown')
+        self.addCleanup(rename_boston, 'Boston')
+        fixture, = call_fixture_generator(location_fixture_generator, other_user)
+        self.assertIn(b'<name>Beantown</name>', fixture)
+
 
 @mock.patch.object(Domain, 'uses_locations', lambda: True)  # removes dependency on accounting
 class ForkedHierarchiesTest(TestCase, FixtureHasLocationsMixin):
@@ -508,6 +543,27 @@ class LocationFixturesDataTest(LocationHierarchyTestCase, FixtureHasLocationsMix
             ).text
         )
 
+    @flag_enabled('HIERARCHICAL_LOCATION_FIXTURE')
+    def test_bulk_fixtures(self):
+        mass = self.locations['Massachusetts']
+        mass.metadata = {'baseball_team': 'Red Sox & <Friends>', 'favorite_passtime': 3}
+        mass.external_id = 'Mass "\u00e9"'
+        mass.save()
+
+        def _clear_metadata():
+            mass.metadata = {}
+            mass.external_id = None
+            mass.save()
+
+        self.addCleanup(_clear_metadata)
+        self.user._couch_user.set_location(mass)
+        for generator in [location_fixture_generator, flat_location_fixture_generator]:
+            expected = [tostring(node) for node in call_fixture_generator(generator, self.user)]
+            with flag_enabled('BULK_LOCATION_FIXTURES'):
+                actual = [node if isinstance(node, bytes) else tostring(node)
+                          for node in call_fixture_generator(generator, self.user)]
+            self.assertEqual(expected, actual)
+
 
 @mock.patch.object(Domain, 'uses_locations', lambda: True)  # removes dependency on accounting
 class WebUserLocationFixturesTest(LocationHierarchyTestCase, FixtureHasLocationsMixin):
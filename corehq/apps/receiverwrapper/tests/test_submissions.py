@@ -19,7 +19,11 @@ from corehq.form_processor.tests.utils import (
     use_sql_backend,
 )
 from corehq.util.json import CommCareJSONEncoder
-from corehq.util.test_utils import TestFileMixin, softer_assert
+from corehq.util.test_utils import (
+    TestFileMixin,
+    flag_enabled,
+    softer_assert,
+)
 
 
 class BaseSubmissionTest(TestCase):
@@ -267,6 +271,26 @@ class SubmissionTestSQL(SubmissionTest):
             [("file", b"text file"), ("image", b"other fake image")])
 
 
+@use_sql_backend
+@flag_enabled('BULK_FORM_SUBMISSIONS')
+class BatchSubmissionTestSQL(BaseSubmissionTest):
+
+    def test_submit_batch(self):
+        data_dir = os.path.join(os.path.dirname(__file__), "data")
+        url = reverse("receiver_secure_batch_post", args=[self.domain])
+        with open(os.path.join(data_dir, "simple_form.xml"), "rb") as form, \
+                open(os.path.join(data_dir, "invalid_form_xml.xml"), "rb") as invalid_form:
+            response = self.client.post(url, {"form": form, "invalid_form": invalid_form})
+
+        self.assertEqual(response.status_code, 200)
+        [result, invalid_result] = json.loads(response.content.decode('utf-8'))['results']
+        self.assertEqual(result['status'], 201)
+        form = FormAccessors(self.domain.name).get_form(result['form_id'])
+        self.assertEqual(form.xmlns, 'http://commcarehq.org/test/submit')
+        self.assertEqual(invalid_result['status'], 422)
+        self.assertIn("There was an error processing the form: Invalid XML", invalid_result['response'])
+
+
 @override_settings(TESTS_SHOULD_USE_SQL_BACKEND=True)
 class SubmissionSQLTransactionsTest(TestCase, TestFileMixin):
     root = os.path.dirname(__file__)
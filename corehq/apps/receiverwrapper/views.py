@@ -1,7 +1,11 @@
 import logging
 import os
 
-from django.http import HttpResponseBadRequest, HttpResponseForbidden
+from django.http import (
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+)
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
@@ -11,7 +15,11 @@ from tastypie.http import HttpTooManyRequests
 import couchforms
 from casexml.apps.case.xform import get_case_updates, is_device_report
 from couchforms import openrosa_response
-from couchforms.const import MAGIC_PROPERTY, BadRequest
+from couchforms.const import (
+    MAGIC_PROPERTY,
+    MULTIPART_EMPTY_PAYLOAD_ERROR,
+    BadRequest,
+)
 from couchforms.getters import MultimediaBug
 from dimagi.utils.decorators.profile import profile_prod
 from dimagi.utils.logging import notify_exception
@@ -45,6 +53,7 @@ from corehq.apps.receiverwrapper.util import (
 )
 from corehq.form_processor.exceptions import XFormLockError
 from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
+from corehq.form_processor.submission_batch import BatchSubmissionPost
 from corehq.form_processor.submission_post import SubmissionPost
 from corehq.form_processor.utils import (
     convert_xform_to_json,
@@ -62,6 +71,9 @@ PROFILE_PROBABILITY = float(os.getenv('COMMCARE_PROFILE_SUBMISSION_PROBABILITY',
 PROFILE_LIMIT = os.getenv('COMMCARE_PROFILE_SUBMISSION_LIMIT')
 PROFILE_LIMIT = int(PROFILE_LIMIT) if PROFILE_LIMIT is not None else 1
 
+# maximum number of forms in a batch submission
+MAX_BATCH_SUBMISSION_SIZE = 100
+
 
 @profile_prod('commcare_receiverwapper_process_form.prof', probability=PROFILE_PROBABILITY, limit=PROFILE_LIMIT)
 def _process_form(request, domain, app_id, user_id, authenticated,
@@ -145,6 +157,65 @@ def _process_form(request, domain, app_id, user_id, authenticated,
     return response
 
 
+def _process_form_batch(request, domain, user_id):
+    """Process all form instances uploaded in a multipart request
+
+    Each file of the request is a form instance. Forms are processed
+    without attachments.
+
+    :returns: JSON response with the status and OpenRosa response of each
+    form, in the order the files were uploaded. The rate limit is checked
+    for each form (see ``BatchSubmissionPost``).
+    """
+    instances = [
+        uploaded_file.read() or MULTIPART_EMPTY_PAYLOAD_ERROR
+        for key in request.FILES
+        for uploaded_file in request.FILES.getlist(key)
+    ]
+    if not instances:
+        return HttpResponseBadRequest("No forms in batch submission")
+    if len(instances) > MAX_BATCH_SUBMISSION_SIZE:
+        return HttpResponseBadRequest(
+            "Too many forms in batch submission. The maximum is {}".format(MAX_BATCH_SUBMISSION_SIZE))
+
+    if toggles.FORM_SUBMISSION_BLACKLIST.enabled(domain):
+        return openrosa_response.BLACKLISTED_RESPONSE
+
+    metric_tags = [
+        'backend:sql' if should_use_sql_backend(domain) else 'backend:couch',
+        'domain:{}'.format(domain),
+        'batch:true',
+    ]
+    batch_submission = BatchSubmissionPost(
+        instances=instances,
+        domain=domain,
+        auth_context=AuthContext(
+            domain=domain,
+            user_id=user_id,
+            authenticated=True,
+        ),
+        location=couchforms.get_location(request),
+        received_on=couchforms.get_received_on(request),
+        date_header=couchforms.get_date_header(request),
+        path=couchforms.get_path(request),
+        submit_ip=couchforms.get_submit_ip(request),
+        last_sync_token=couchforms.get_last_sync_token(request),
+        openrosa_headers=couchforms.get_openrosa_headers(request),
+    )
+    results = batch_submission.run()
+
+    for result in results:
+        _record_metrics(list(metric_tags), result.submission_type, result.response, xform=result.xform)
+    return JsonResponse({'results': [
+        {
+            'form_id': result.response.get('X-CommCareHQ-FormID'),
+            'status': result.response.status_code,
+            'response': result.response.content.decode('utf-8'),
+        }
+        for result in results
+    ]})
+
+
 def _submission_error(request, message, count_metric, metric_tags,
         domain, app_id, user_id, authenticated, meta=None, status=400,
         notify=True):
@@ -331,3 +402,50 @@ def secure_post(request, domain, app_id=None):
         )
 
     return decorated_view(request, domain, app_id=app_id)
+
+
+@login_or_digest_ex(allow_cc_users=True)
+@two_factor_exempt
+@toggles.BULK_FORM_SUBMISSIONS.required_decorator()
+def _secure_batch_post_digest(request, domain):
+    """only ever called from secure batch post"""
+    return _process_form_batch(request, domain, request.couch_user.get_id)
+
+
+@handle_401_response
+@login_or_basic_ex(allow_cc_users=True)
+@two_factor_exempt
+@toggles.BULK_FORM_SUBMISSIONS.required_decorator()
+def _secure_batch_post_basic(request, domain):
+    """only ever called from secure batch post"""
+    return _process_form_batch(request, domain, request.couch_user.get_id)
+
+
+@location_safe
+@csrf_exempt
+@require_POST
+@check_domain_migration
+def secure_batch_post(request, domain):
+    """Submit many forms in one request
+
+    Usage:
+        $ curl --form 'form1=@form1.xml' --form 'form2=@form2.xml' $URL
+    """
+    authtype_map = {
+        DIGEST: _secure_batch_post_digest,
+        BASIC: _secure_batch_post_basic,
+    }
+
+    if request.GET.get('authtype'):
+        authtype = request.GET['authtype']
+    else:
+        authtype = determine_authtype_from_request(request, default=BASIC)
+
+    try:
+        decorated_view = authtype_map[authtype]
+    except KeyError:
+        return HttpResponseBadRequest(
+            'authtype must be one of: {0}'.format(','.join(authtype_map))
+        )
+
+    return decorated_view(request, domain)
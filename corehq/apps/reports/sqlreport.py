@@ -266,12 +266,15 @@ class SqlData(ReportDataSource):
     def slugs(self):
         return [c.slug for c in self.columns]
 
+    def _get_session_helper(self):
+        return connection_manager.get_session_helper(self.engine_id, readonly=True)
+
     def _get_data(self, start=None, limit=None):
         if self.keys is not None and not self.group_by:
             raise SqlReportException('Keys supplied without group_by.')
 
         qc = self.query_context(start=start, limit=limit)
-        session_helper = connection_manager.get_session_helper(self.engine_id, readonly=True)
+        session_helper = self._get_session_helper()
         with session_helper.session_context() as session:
             return qc.resolve(session.connection(), self.filter_values)
 
@@ -281,7 +284,7 @@ class SqlData(ReportDataSource):
 
     def get_sql_queries(self):
         qc = self.query_context()
-        session_helper = connection_manager.get_session_helper(self.engine_id, readonly=True)
+        session_helper = self._get_session_helper()
         with session_helper.session_context() as session:
             return qc.get_query_strings(session.connection())
 
@@ -46,6 +46,28 @@ class IndicatorAdapter(object):
         else:
             self._best_effort_save_rows(indicator_rows, doc)
 
+    def best_effort_bulk_save(self, docs):
+        """
+        Like ``best_effort_save`` but saves the rows of all the documents with a single
+        ``save_rows`` call. If that fails the documents are saved one at a time so that
+        a single bad document doesn't prevent the rest from being saved.
+        """
+        rows = []
+        saved_docs = []
+        for doc in docs:
+            try:
+                rows.extend(self.get_all_values(doc))
+            except Exception as e:
+                self.handle_exception(doc, e)
+            else:
+                saved_docs.append(doc)
+
+        try:
+            self.save_rows(rows)
+        except Exception:
+            for doc in saved_docs:
+                self.best_effort_save(doc)
+
     def _best_effort_save_rows(self, rows, doc):
         """
         Like save rows, but should catch errors and log them
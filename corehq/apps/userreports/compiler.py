@@ -0,0 +1,391 @@
+"""
+Compiles configured UCR expression, filter and indicator trees into flat
+Python closures.
+
+The objects built by ``ExpressionFactory``, ``FilterFactory`` and ``IndicatorFactory``
+are interpreted for every document: every node is a jsonobject whose properties are
+looked up (and often re-wrapped) on each call. Compiling a tree once when a data source
+is loaded resolves all of that up front:
+
+* spec properties (property names and paths, datatype transforms, switch cases) are
+  read once and captured in closures
+* constant sub-expressions are folded, e.g. ``and`` filters with constant members,
+  comparisons against constants and conditionals with a constant test
+* nested ``and`` / ``or`` filters are flattened
+* nodes that are shared within a tree (e.g. named expressions and filters) are
+  compiled once
+
+Any node type that the compiler does not know about is used as is, so the compiled
+tree always produces the same results as the original one.
+
+If the compiler is given a ``DataSourceProfile`` every (non constant) node is wrapped
+in a timer. See ``corehq.apps.userreports.profiling``.
+"""
+from corehq.apps.userreports.expressions.getters import (
+    TransformedGetter,
+    transform_from_datatype,
+)
+from corehq.apps.userreports.expressions.specs import (
+    CoalesceExpressionSpec,
+    ConditionalExpressionSpec,
+    ConstantGetterSpec,
+    IdentityExpressionSpec,
+    NamedExpressionSpec,
+    PropertyNameGetterSpec,
+    PropertyPathGetterSpec,
+    RootDocExpressionSpec,
+    SwitchExpressionSpec,
+)
+from corehq.apps.userreports.filters import (
+    ANDFilter,
+    CustomFilter,
+    NamedFilter,
+    NOTFilter,
+    ORFilter,
+    SinglePropertyValueFilter,
+)
+from corehq.apps.userreports.indicators import (
+    BooleanIndicator,
+    ColumnValue,
+    CompoundIndicator,
+    RawIndicator,
+    SmallBooleanIndicator,
+)
+from corehq.apps.userreports.profiling import get_node_label
+
+
+class Constant(object):
+    """A compiled expression or filter that always returns the same value"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self, item, context=None):
+        return self.value
+
+
+def is_constant(fn):
+    return isinstance(fn, Constant)
+
+
+class ExpressionCompiler(object):
+    """
+    Compiles expressions and filters. Use one compiler per data source so that nodes
+    shared between the filters and indicators of the data source are only compiled once.
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile
+        self._compiled = {}
+        self._expression_compilers = {
+            IdentityExpressionSpec: self._compile_identity,
+            ConstantGetterSpec: self._compile_constant,
+            PropertyNameGetterSpec: self._compile_property_name,
+            PropertyPathGetterSpec: self._compile_property_path,
+            ConditionalExpressionSpec: self._compile_conditional,
+            SwitchExpressionSpec: self._compile_switch,
+            CoalesceExpressionSpec: self._compile_coalesce,
+            RootDocExpressionSpec: self._compile_root_doc,
+            NamedExpressionSpec: self._compile_named_expression,
+            TransformedGetter: self._compile_transformed_getter,
+        }
+        self._filter_compilers = {
+            ANDFilter: self._compile_and,
+            ORFilter: self._compile_or,
+            NOTFilter: self._compile_not,
+            SinglePropertyValueFilter: self._compile_single_property_value,
+            NamedFilter: self._compile_named_filter,
+            CustomFilter: self._compile_custom_filter,
+        }
+
+    def compile_expression(self, expression):
+        return self._compile(expression, self._expression_compilers)
+
+    def compile_filter(self, filter):
+        return self._compile(filter, self._filter_compilers)
+
+    def _compile(self, node, compilers):
+        key = id(node)
+        if key not in self._compiled:
+            compiled = node
+            compiler = compilers.get(type(node))
+            if compiler:
+                try:
+                    compiled = compiler(node)
+                except AttributeError:
+                    # node was not configured by its factory
+                    pass
+            if self.profile is not None and not is_constant(compiled):
+                compiled = self.profile.wrap(compiled, get_node_label(node))
+            # keep a reference to the node so that its id can't be reused
+            self._compiled[key] = (node, compiled)
+        return self._compiled[key][1]
+
+    # expressions
+
+    def _compile_identity(self, expression):
+        def identity(item, context=None):
+            return item
+        return identity
+
+    def _compile_constant(self, expression):
+        return Constant(expression.constant)
+
+    def _compile_property_name(self, expression):
+        transform = transform_from_datatype(expression.datatype)
+        name_expression = self.compile_expression(expression._property_name_expression)
+        if is_constant(name_expression):
+            property_name = name_expression.value
+
+            def property_name_getter(item, context=None):
+                return transform(item.get(property_name) if isinstance(item, dict) else None)
+        else:
+            def property_name_getter(item, context=None):
+                return transform(item.get(name_expression(item, context)) if isinstance(item, dict) else None)
+        return property_name_getter
+
+    def _compile_property_path(self, expression):
+        transform = transform_from_datatype(expression.datatype)
+        path = tuple(expression.property_path)
+
+        def property_path_getter(item, context=None):
+            if not path or not isinstance(item, dict):
+                return transform(None)
+            try:
+                for key in path:
+                    item = item[key]
+            except (KeyError, TypeError, ValueError):
+                return transform(None)
+            return transform(item)
+        return property_path_getter
+
+    def _compile_conditional(self, expression):
+        test = self.compile_filter(expression._test_function)
+        if_true = self.compile_expression(expression._true_expression)
+        if_false = self.compile_expression(expression._false_expression)
+        if is_constant(test):
+            return if_true if test.value else if_false
+
+        def conditional(item, context=None):
+            if test(item, context):
+                return if_true(item, context)
+            return if_false(item, context)
+        return conditional
+
+    def _compile_switch(self, expression):
+        switch_on = self.compile_expression(expression._switch_on_expression)
+        cases = [
+            (case, self.compile_expression(expression._case_expressions[case]))
+            for case in expression.cases
+        ]
+        cases_by_value = {case: case_expression for case, case_expression in reversed(cases)}
+        default = self.compile_expression(expression._default_expression)
+
+        def switch(item, context=None):
+            switch_value = switch_on(item, context)
+            if type(switch_value) is str:
+                case_expression = cases_by_value.get(switch_value, default)
+                return case_expression(item, context)
+            for case, case_expression in cases:
+                if switch_value == case:
+                    return case_expression(item, context)
+            return default(item, context)
+        return switch
+
+    def _compile_coalesce(self, expression):
+        primary = self.compile_expression(expression._expression)
+        default = self.compile_expression(expression._default_expression)
+
+        def coalesce(item, context=None):
+            value = primary(item, context)
+            default_value = default(item, context)
+            if value is None or value == '':
+                return default_value
+            return value
+        return coalesce
+
+    def _compile_root_doc(self, expression):
+        inner = self.compile_expression(expression._expression_fn)
+
+        def root_doc(item, context=None):
+            if context is None:
+                return None
+            return inner(context.root_doc, context)
+        return root_doc
+
+    def _compile_named_expression(self, expression):
+        inner = self.compile_expression(expression._context.named_expressions[expression.name])
+        if is_constant(inner):
+            return inner
+        cache_key_prefix = 'named_expression-{}-'.format(expression.name)
+
+        def named_expression(item, context=None):
+            # same caching behaviour as NamedExpressionSpec
+            key = cache_key_prefix + str(id(item))
+            if context and context.exists_in_cache(key):
+                return context.get_cache_value(key)
+            result = inner(item, context)
+            if context:
+                context.set_iteration_cache_value(key, result)
+            return result
+        return named_expression
+
+    def _compile_transformed_getter(self, getter):
+        inner = self.compile_expression(getter.getter)
+        transform = getter.transform
+        if not transform:
+            return inner
+
+        def transformed(item, context=None):
+            return transform(inner(item, context))
+        return transformed
+
+    # filters
+
+    def _compile_and(self, filter):
+        filters = []
+        for sub_filter in self._flatten(filter, ANDFilter):
+            if is_constant(sub_filter):
+                if not sub_filter.value:
+                    return Constant(False)
+            else:
+                filters.append(sub_filter)
+        if not filters:
+            return Constant(True)
+        if len(filters) == 1:
+            return _as_bool(filters[0])
+        filters = tuple(filters)
+
+        def and_filter(item, context=None):
+            for sub_filter in filters:
+                if not sub_filter(item, context):
+                    return False
+            return True
+        return and_filter
+
+    def _compile_or(self, filter):
+        filters = []
+        for sub_filter in self._flatten(filter, ORFilter):
+            if is_constant(sub_filter):
+                if sub_filter.value:
+                    return Constant(True)
+            else:
+                filters.append(sub_filter)
+        if not filters:
+            return Constant(False)
+        if len(filters) == 1:
+            return _as_bool(filters[0])
+        filters = tuple(filters)
+
+        def or_filter(item, context=None):
+            for sub_filter in filters:
+                if sub_filter(item, context):
+                    return True
+            return False
+        return or_filter
+
+    def _flatten(self, filter, filter_class):
+        for sub_filter in filter.filters:
+            if type(sub_filter) is filter_class:
+                yield from self._flatten(sub_filter, filter_class)
+            else:
+                yield self.compile_filter(sub_filter)
+
+    def _compile_not(self, filter):
+        inner = self.compile_filter(filter._filter)
+        if is_constant(inner):
+            return Constant(not inner.value)
+
+        def not_filter(item, context=None):
+            return not inner(item, context)
+        return not_filter
+
+    def _compile_single_property_value(self, filter):
+        expression = self.compile_expression(filter.expression)
+        reference = self.compile_expression(filter.reference_expression)
+        operator = filter.operator
+        if is_constant(reference):
+            reference_value = reference.value
+            if is_constant(expression):
+                return Constant(operator(expression.value, reference_value))
+
+            def single_property_value(item, context=None):
+                return operator(expression(item, context), reference_value)
+        else:
+            def single_property_value(item, context=None):
+                return operator(expression(item, context), reference(item, context))
+        return single_property_value
+
+    def _compile_named_filter(self, filter):
+        return self.compile_filter(filter.filter)
+
+    def _compile_custom_filter(self, filter):
+        return filter._filter
+
+    # indicators
+
+    def compile_indicators(self, indicator):
+        return CompiledIndicators(indicator, self, self.profile)
+
+
+def _as_bool(filter):
+    # and / or filters always return booleans
+    def bool_filter(item, context=None):
+        return bool(filter(item, context))
+    return bool_filter
+
+
+class CompiledIndicators(object):
+    """
+    Drop-in replacement for a (compound) indicator that flattens all the
+    indicators into a list of column getters.
+    """
+
+    def __init__(self, indicator, compiler, profile=None):
+        self.indicator = indicator
+        self._getters = []
+        self._add_indicator(indicator, compiler)
+        if profile is not None:
+            self._getters = [
+                (column, profile.wrap(getter, _get_indicator_label(column, getter)))
+                for column, getter in self._getters
+            ]
+
+    def _add_indicator(self, indicator, compiler):
+        if type(indicator) is CompoundIndicator:
+            for sub_indicator in indicator.indicators:
+                self._add_indicator(sub_indicator, compiler)
+        elif type(indicator) is RawIndicator:
+            self._getters.append((indicator.column, compiler.compile_expression(indicator.getter)))
+        elif type(indicator) in (BooleanIndicator, SmallBooleanIndicator):
+            self._getters.append((indicator.column, _boolean_getter(compiler.compile_filter(indicator.filter))))
+        else:
+            self._getters.append((None, indicator.get_values))
+
+    def get_columns(self):
+        return self.indicator.get_columns()
+
+    def get_values(self, item, context=None):
+        values = []
+        for column, getter in self._getters:
+            if column is None:
+                values.extend(getter(item, context))
+            else:
+                values.append(ColumnValue(column, getter(item, context)))
+        return values
+
+
+def _get_indicator_label(column, getter):
+    if column is None:
+        # an indicator that returns multiple columns
+        return 'indicator:{}'.format(getattr(getter, '__self__', getter).__class__.__name__)
+    return 'column:{}'.format(column.id)
+
+
+def _boolean_getter(filter):
+    if is_constant(filter):
+        return Constant(1 if filter.value else 0)
+
+    def boolean_getter(item, context=None):
+        return 1 if filter(item, context) else 0
+    return boolean_getter
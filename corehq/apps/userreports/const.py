@@ -47,6 +47,23 @@ VALID_REFERENCED_DOC_TYPES = [
 
 ASYNC_INDICATOR_QUEUE_TIME = timedelta(minutes=5)
 ASYNC_INDICATOR_CHUNK_SIZE = 100
+# build_async_indicators processes the indicators of a chunk in batches whose size is
+# adjusted so that each batch takes about ASYNC_INDICATOR_BATCH_TARGET_SECONDS
+ASYNC_INDICATOR_MIN_BATCH_SIZE = 10
+ASYNC_INDICATOR_BATCH_TARGET_SECONDS = 10
+
+# how IndicatorSqlAdapter.save_rows writes rows to the database
+UCR_LOAD_MODE_AUTO = 'auto'  # COPY if there are at least UCR_COPY_LOAD_THRESHOLD rows, otherwise INSERT
+UCR_LOAD_MODE_INSERT = 'insert'
+UCR_LOAD_MODE_COPY = 'copy'
+UCR_LOAD_MODES = (UCR_LOAD_MODE_AUTO, UCR_LOAD_MODE_INSERT, UCR_LOAD_MODE_COPY)
+UCR_COPY_LOAD_THRESHOLD = 500
+
+# number of documents whose rows are saved together when building a data source
+UCR_BUILD_BATCH_SIZE = 1000
+
+# maximum size of the report results that each process keeps in memory (see reports/cache.py)
+UCR_REPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
 
 XFORM_CACHE_KEY_PREFIX = 'xform_to_json_cache'
 
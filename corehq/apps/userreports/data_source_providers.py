@@ -1,5 +1,10 @@
+import hashlib
+import json
 from abc import ABCMeta, abstractmethod
 
+from dimagi.utils.chunked import chunked
+from dimagi.utils.couch.database import iter_docs
+
 from corehq.apps.userreports.models import (
     DataSourceConfiguration,
     StaticDataSourceConfiguration,
@@ -22,6 +27,25 @@ class DataSourceProvider(metaclass=ABCMeta):
         else:
             return sources
 
+    def get_data_source_revs(self):
+        """
+        :returns: dict of data source ID -> revision for all the data sources of this
+            provider. The revision changes whenever the data source changes. Data sources
+            that are not of ``referenced_doc_type`` may be included.
+        """
+        return {source._id: get_data_source_rev(source) for source in self.get_data_sources()}
+
+    def get_data_sources_by_id(self, data_source_ids):
+        data_source_ids = set(data_source_ids)
+        return [source for source in self.get_data_sources() if source._id in data_source_ids]
+
+
+def get_data_source_rev(config):
+    rev = getattr(config, '_rev', None)
+    if rev:
+        return rev
+    return hashlib.md5(json.dumps(config.to_json(), sort_keys=True).encode('utf-8')).hexdigest()
+
 
 class DynamicDataSourceProvider(DataSourceProvider):
 
@@ -29,6 +53,28 @@ class DynamicDataSourceProvider(DataSourceProvider):
         return DataSourceConfiguration.view(
             'userreports/active_data_sources', reduce=False, include_docs=True).all()
 
+    def get_data_source_revs(self):
+        data_source_ids = [
+            row['id'] for row in DataSourceConfiguration.view(
+                'userreports/active_data_sources', reduce=False, include_docs=False)
+        ]
+        revs = {}
+        for ids in chunked(data_source_ids, 1000, list):
+            for row in DataSourceConfiguration.get_db().view('_all_docs', keys=ids):
+                if 'value' in row:
+                    revs[row['id']] = row['value']['rev']
+        return revs
+
+    def get_data_sources_by_id(self, data_source_ids):
+        sources = [
+            DataSourceConfiguration.wrap(doc)
+            for doc in iter_docs(DataSourceConfiguration.get_db(), list(data_source_ids))
+            if doc.get('doc_type') == 'DataSourceConfiguration' and not doc.get('is_deactivated')
+        ]
+        if self.referenced_doc_type:
+            return [source for source in sources if source.referenced_doc_type == self.referenced_doc_type]
+        return sources
+
 
 class StaticDataSourceProvider(DataSourceProvider):
 
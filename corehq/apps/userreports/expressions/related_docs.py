@@ -0,0 +1,198 @@
+"""
+Support for fetching the documents referenced by ``related_doc`` expressions
+in bulk, ahead of evaluating a batch of documents.
+
+``RelatedDocExpressionSpec`` looks up each related document one by one. When a
+pillow processes a chunk of changes this means many serial round trips, often
+for the same parent cases and users. ``RelatedDocumentCache`` is shared by all
+the ``EvaluationContext`` objects of a chunk and can be pre-populated with
+``prefetch`` which evaluates the ``doc_id_expression`` of every related doc
+lookup in a set of data sources and bulk-fetches the results per doc type.
+"""
+from collections import Counter, defaultdict
+
+from pillowtop.dao.exceptions import DocumentNotFoundError
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.specs import EvaluationContext
+
+ROOT_SCOPE = 'root'
+MAX_PREFETCH_DEPTH = 3
+
+# sub-expressions (by expression type) that are evaluated against a different item
+# than the expression itself. Lookups inside them can't be predicted up front.
+_ITEM_CHANGING_KEYS = {
+    'nested': ('value_expression',),
+    'map_items': ('map_expression',),
+    'filter_items': ('filter_expression',),
+    'sort_items': ('sort_expression',),
+}
+
+
+def get_related_document(domain, related_doc_type, doc_id, load_source="related_doc_expression"):
+    document_store = get_document_store_for_doc_type(domain, related_doc_type, load_source=load_source)
+    try:
+        doc = document_store.get_document(doc_id)
+    except DocumentNotFoundError:
+        return None
+    if domain != doc.get('domain'):
+        return None
+    return doc
+
+
+def get_related_doc_specs(config):
+    """
+    Find all the ``related_doc`` expressions in a data source config.
+
+    :returns: list of ``(scope, related_doc_type, doc_id_expression_spec)`` tuples
+        where ``scope`` is ``ROOT_SCOPE`` if the doc ID expression is evaluated
+        against the root document or the doc type of the related document
+        it is evaluated against.
+    """
+    named_specs = {}
+    named_specs.update(config.named_filters)
+    named_specs.update(config.named_expressions)
+
+    found = []
+    seen = set()
+
+    def _walk(spec, scope, visiting_names):
+        if isinstance(spec, list):
+            for item in spec:
+                _walk(item, scope, visiting_names)
+            return
+        if not isinstance(spec, dict):
+            return
+
+        spec_type = spec.get('type')
+        if spec_type == 'related_doc':
+            doc_id_spec = spec.get('doc_id_expression')
+            related_doc_type = spec.get('related_doc_type')
+            key = (scope, related_doc_type, repr(doc_id_spec))
+            if key not in seen:
+                seen.add(key)
+                found.append((scope, related_doc_type, doc_id_spec))
+            _walk(doc_id_spec, scope, visiting_names)
+            _walk(spec.get('value_expression'), related_doc_type, visiting_names)
+            return
+        if spec_type == 'root_doc':
+            _walk(spec.get('expression'), ROOT_SCOPE, visiting_names)
+            return
+        if spec_type == 'named':
+            name = spec.get('name')
+            if name in named_specs and name not in visiting_names:
+                _walk(named_specs[name], scope, visiting_names | {name})
+            return
+
+        item_changing_keys = _ITEM_CHANGING_KEYS.get(spec_type, ())
+        for key, value in spec.items():
+            _walk(value, None if key in item_changing_keys else scope, visiting_names)
+
+    def walk(spec, scope):
+        _walk(spec, scope, frozenset())
+
+    walk(config.configured_filter, ROOT_SCOPE)
+    walk([validation.expression for validation in config.validations], ROOT_SCOPE)
+    walk(config.base_item_expression, ROOT_SCOPE)
+    # indicators are evaluated against the repeat items if there is a base item expression
+    walk(config.configured_indicators, None if config.base_item_expression else ROOT_SCOPE)
+    return [spec for spec in found if spec[0] is not None]
+
+
+class RelatedDocumentCache(object):
+    """
+    A cache of related documents for a single domain that can be shared across
+    ``EvaluationContext`` objects. Documents that are not in the cache are fetched
+    individually on first access and then stored.
+    """
+
+    def __init__(self, domain, load_source="related_doc_expression"):
+        self.domain = domain
+        self.load_source = load_source
+        self._docs = {}
+        # number of documents requested from the document stores, by doc type
+        self.fetch_counts = Counter()
+
+    def get_document(self, related_doc_type, doc_id):
+        key = (related_doc_type, doc_id)
+        if key not in self._docs:
+            self.fetch_counts[related_doc_type] += 1
+            self._docs[key] = get_related_document(self.domain, related_doc_type, doc_id, self.load_source)
+        return self._docs[key]
+
+    def bulk_fetch(self, related_doc_type, doc_ids):
+        """Fetch the given documents in bulk and add them to the cache.
+
+        Only documents that are found are cached. Missing documents will be looked
+        up again on access so that they get the same treatment as an uncached lookup.
+
+        :returns: list of the newly fetched documents
+        """
+        doc_ids = {doc_id for doc_id in doc_ids if (related_doc_type, doc_id) not in self._docs}
+        if not doc_ids:
+            return []
+        self.fetch_counts[related_doc_type] += len(doc_ids)
+        document_store = get_document_store_for_doc_type(
+            self.domain, related_doc_type, load_source=self.load_source)
+        fetched = []
+        for doc in document_store.iter_documents(list(doc_ids)):
+            doc_id = doc.get('_id')
+            if doc_id not in doc_ids:
+                continue
+            if doc.get('domain') == self.domain:
+                self._docs[(related_doc_type, doc_id)] = doc
+                fetched.append(doc)
+            else:
+                self._docs[(related_doc_type, doc_id)] = None
+        return fetched
+
+    def prefetch(self, docs_by_config):
+        """Bulk fetch the related documents needed to process documents with data sources.
+
+        :param docs_by_config: list of ``(config, docs)`` tuples where ``docs`` are the
+            documents that will be processed by the data source ``config``.
+
+        Nested lookups (e.g. the parent case of a parent case) are followed
+        up to ``MAX_PREFETCH_DEPTH`` levels.
+        """
+        doc_ids_by_type = defaultdict(set)
+        related_expressions_by_scope = defaultdict(list)
+        for config, docs in docs_by_config:
+            root_expressions = []
+            for scope, related_doc_type, doc_id_expression in config.related_doc_id_expressions:
+                if scope == ROOT_SCOPE:
+                    root_expressions.append((related_doc_type, doc_id_expression))
+                else:
+                    related_expressions_by_scope[scope].append((related_doc_type, doc_id_expression))
+            self._collect_doc_ids(docs, root_expressions, doc_ids_by_type)
+
+        for __ in range(MAX_PREFETCH_DEPTH):
+            fetched_by_type = {
+                related_doc_type: self.bulk_fetch(related_doc_type, doc_ids)
+                for related_doc_type, doc_ids in doc_ids_by_type.items()
+            }
+            doc_ids_by_type = defaultdict(set)
+            for related_doc_type, fetched in fetched_by_type.items():
+                self._collect_doc_ids(fetched, related_expressions_by_scope[related_doc_type], doc_ids_by_type)
+            if not doc_ids_by_type:
+                break
+
+    def _collect_doc_ids(self, docs, expressions, doc_ids_by_type):
+        if not expressions:
+            return
+        for doc in docs:
+            context = EvaluationContext(doc, 0, related_docs=self)
+            for related_doc_type, doc_id_expression in expressions:
+                doc_id = _safe_evaluate(doc_id_expression, doc, context)
+                if doc_id and isinstance(doc_id, str):
+                    doc_ids_by_type[related_doc_type].add(doc_id)
+
+
+def _safe_evaluate(expression, doc, context):
+    try:
+        return expression(doc, context)
+    except Exception:
+        # prefetching is best effort. Any errors will surface during normal processing
+        return None
@@ -8,11 +8,7 @@ from dimagi.ext.jsonobject import (
     ListProperty,
     StringProperty,
 )
-from pillowtop.dao.exceptions import DocumentNotFoundError
 
-from corehq.apps.change_feed.data_sources import (
-    get_document_store_for_doc_type,
-)
 from corehq.apps.locations.document_store import LOCATION_DOC_TYPE
 from corehq.apps.userreports.const import (
     NAMED_EXPRESSION_PREFIX,
@@ -33,6 +29,7 @@ from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
 from corehq.form_processor.interfaces.processor import FormProcessorInterface
 from corehq.util.couch import get_db_by_doc_type
 
+from .related_docs import get_related_document
 from .utils import eval_statements
 
 
@@ -512,22 +509,17 @@ class RelatedDocExpressionSpec(JsonObject):
     @staticmethod
     @ucr_context_cache(vary_on=('related_doc_type', 'doc_id',))
     def _get_document(related_doc_type, doc_id, context):
-        document_store = get_document_store_for_doc_type(
-            context.root_doc['domain'], related_doc_type,
-            load_source="related_doc_expression")
-        try:
-            doc = document_store.get_document(doc_id)
-        except DocumentNotFoundError:
-            return None
-        if context.root_doc['domain'] != doc.get('domain'):
-            return None
-        return doc
+        domain = context.root_doc['domain']
+        related_docs = context.related_docs
+        if related_docs is not None and related_docs.domain == domain:
+            return related_docs.get_document(related_doc_type, doc_id)
+        return get_related_document(domain, related_doc_type, doc_id)
 
     def get_value(self, doc_id, context):
         assert context.root_doc['domain']
         doc = self._get_document(self.related_doc_type, doc_id, context)
         # explicitly use a new evaluation context since this is a new document
-        return self._value_expression(doc, EvaluationContext(doc, 0))
+        return self._value_expression(doc, EvaluationContext(doc, 0, related_docs=context.related_docs))
 
     def __str__(self):
         return "{}[{}]/{}".format(self.related_doc_type,
@@ -7,6 +7,7 @@ from corehq.apps.change_feed.data_sources import (
     get_document_store_for_doc_type,
 )
 from corehq.apps.userreports.models import get_datasource_config
+from corehq.apps.userreports.profiling import profile_data_source
 
 
 class Command(BaseCommand):
@@ -17,6 +18,11 @@ class Command(BaseCommand):
         parser.add_argument('data_source_id')
         parser.add_argument('doc_id')
         parser.add_argument('--sort', dest='sort', action='store', default='time')
+        parser.add_argument('--expressions', action='store_true', default=False,
+                            help='Show the time spent in each expression and column of the '
+                                 'data source instead of using cProfile')
+        parser.add_argument('--iterations', type=int, default=1,
+                            help='Number of times to process the doc (with --expressions)')
 
     def handle(self, domain, data_source_id, doc_id, **options):
         config, _ = get_datasource_config(data_source_id, domain)
@@ -24,6 +30,11 @@ class Command(BaseCommand):
         doc_store = get_document_store_for_doc_type(
             domain, doc_type, load_source="profile_data_source")
         doc = doc_store.get_document(doc_id)
+        if options['expressions']:
+            profile = profile_data_source(config, [doc] * options['iterations'])
+            print(profile.format_report())
+            return
+
         sort_by = options['sort']
         local_variables = {'config': config, 'doc': doc}
 
@@ -10,11 +10,18 @@ class Command(BaseCommand):
         parser.add_argument('indicator_config_id')
         parser.add_argument('--in-place', action='store_true', dest='in_place', default=False,
                             help='Rebuild table in place (preserve existing data)')
+        parser.add_argument('--parallel', action='store_true', default=False,
+                            help='Rebuild into a new table, processing each shard / case type / xmlns '
+                                 'in a separate celery task. Use ucr_rebuild_status to see progress.')
         parser.add_argument('--initiated-by', action='store', required=True, dest='initiated',
                             help='Who initiated the rebuild (for sending email notifications)')
 
     def handle(self, indicator_config_id, **options):
-        if options['in_place']:
+        if options['parallel']:
+            tasks.rebuild_indicators_in_parallel(
+                indicator_config_id, options['initiated'], source='rebuild_indicator_table'
+            )
+        elif options['in_place']:
             tasks.rebuild_indicators_in_place(
                 indicator_config_id, options['initiated'], source='rebuild_indicator_table'
             )
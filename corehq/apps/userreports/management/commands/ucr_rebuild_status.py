@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from corehq.apps.userreports import tasks
+from corehq.apps.userreports.models import get_datasource_config
+from corehq.apps.userreports.parallel_rebuild import ParallelRebuild
+
+
+class Command(BaseCommand):
+    help = "Show the progress of the latest parallel rebuild of a data source"
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('indicator_config_id')
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help='Queue tasks for any ranges that have not completed')
+        parser.add_argument('--initiated-by', dest='initiated',
+                            help='Who initiated the resume (for sending email notifications)')
+
+    def handle(self, domain, indicator_config_id, **options):
+        config, _ = get_datasource_config(indicator_config_id, domain)
+        rebuild = ParallelRebuild.get_latest(config)
+        if rebuild is None:
+            raise CommandError("No parallel rebuild found for {}".format(indicator_config_id))
+
+        checkpoints = rebuild.get_checkpoints()
+        total_processed = 0
+        total_rate = 0
+        for checkpoint in checkpoints:
+            total_processed += checkpoint.docs_processed
+            rate = checkpoint.docs_per_second
+            if rate and not checkpoint.complete:
+                total_rate += rate
+            print("{:<40} {:<15} {:>10} / {:<10} {:>8} docs/s {}".format(
+                str(checkpoint.case_type_or_xmlns),
+                str(checkpoint.db_alias),
+                checkpoint.docs_processed,
+                checkpoint.estimated_total if checkpoint.estimated_total is not None else '?',
+                '{:.1f}'.format(rate) if rate else '-',
+                'complete' if checkpoint.complete else '',
+            ))
+
+        complete = sum(1 for checkpoint in checkpoints if checkpoint.complete)
+        print("\nBuild {}: {} / {} ranges complete, {} docs processed, {:.1f} docs/s".format(
+            rebuild.build_id, complete, len(checkpoints), total_processed, total_rate
+        ))
+        if rebuild.is_swapped_in():
+            print("The rebuilt table has been swapped in")
+
+        if options['resume']:
+            tasks.resume_parallel_rebuild.delay(config._id, options['initiated'])
@@ -0,0 +1,28 @@
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userreports', '0017_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasourceactionlog',
+            name='checkpoint',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='datasourceactionlog',
+            name='action',
+            field=models.CharField(choices=[
+                ('build', 'Build'),
+                ('migrate', 'Migrate'),
+                ('rebuild', 'Rebuild'),
+                ('drop', 'Drop'),
+                ('rebuild_range', 'Rebuild Range'),
+            ], db_index=True, max_length=32),
+        ),
+    ]
@@ -46,10 +46,13 @@ from corehq.apps.cachehq.mixins import (
 from corehq.apps.userreports.app_manager.data_source_meta import (
     REPORT_BUILDER_DATA_SOURCE_TYPE_VALUES,
 )
+from corehq.apps.userreports.compiler import ExpressionCompiler
 from corehq.apps.userreports.const import (
     DATA_SOURCE_TYPE_AGGREGATE,
     DATA_SOURCE_TYPE_STANDARD,
     FILTER_INTERPOLATION_DOC_TYPES,
+    UCR_LOAD_MODE_AUTO,
+    UCR_LOAD_MODES,
     UCR_SQL_BACKEND,
     VALID_REFERENCED_DOC_TYPES,
 )
@@ -68,9 +71,13 @@ from corehq.apps.userreports.exceptions import (
     ValidationError,
 )
 from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.expressions.related_docs import (
+    get_related_doc_specs,
+)
 from corehq.apps.userreports.filters.factory import FilterFactory
 from corehq.apps.userreports.indicators import CompoundIndicator
 from corehq.apps.userreports.indicators.factory import IndicatorFactory
+from corehq.apps.userreports.profiling import DataSourceProfile
 from corehq.apps.userreports.reports.factory import (
     ChartFactory,
     ReportColumnFactory,
@@ -102,6 +109,7 @@ class DataSourceActionLog(models.Model):
     MIGRATE = 'migrate'
     REBUILD = 'rebuild'
     DROP = 'drop'
+    REBUILD_RANGE = 'rebuild_range'
 
     domain = models.CharField(max_length=126, null=False, db_index=True)
     indicator_config_id = models.CharField(max_length=126, null=False, db_index=True)
@@ -113,9 +121,13 @@ class DataSourceActionLog(models.Model):
         (MIGRATE, _('Migrate')),
         (REBUILD, _('Rebuild')),
         (DROP, _('Drop')),
+        (REBUILD_RANGE, _('Rebuild Range')),
     ), db_index=True, null=False)
     migration_diffs = JSONField(null=True, blank=True)
 
+    # progress of a single range of a parallel rebuild. See ``corehq.apps.userreports.parallel_rebuild``
+    checkpoint = JSONField(null=True, blank=True)
+
     # True for actions that were skipped because the data source
     # was marked with ``disable_destructive_rebuild``
     skip_destructive = models.BooleanField(default=False)
@@ -144,6 +156,7 @@ class SQLSettings(DocumentSchema):
     partition_config = SchemaListProperty(SQLPartition)  # no longer used
     citus_config = SchemaProperty(CitusConfig)
     primary_key = ListProperty()
+    load_mode = StringProperty(choices=list(UCR_LOAD_MODES), default=UCR_LOAD_MODE_AUTO)
 
 
 class DataSourceBuildInformation(DocumentSchema):
@@ -260,7 +273,7 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
         if eval_context is None:
             eval_context = EvaluationContext(document)
 
-        filter_fn = self._get_main_filter()
+        filter_fn = self._get_compiled_main_filter()
         return filter_fn(document, eval_context)
 
     def deleted_filter(self, document):
@@ -298,6 +311,10 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
     def _get_main_filter(self):
         return self._get_filter([self.referenced_doc_type])
 
+    @memoized
+    def _get_compiled_main_filter(self):
+        return self._compiler.compile_filter(self._get_main_filter())
+
     @memoized
     def _get_deleted_filter(self):
         return self._get_filter(get_deleted_doc_types(self.referenced_doc_type), include_configured=False)
@@ -424,6 +441,34 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             None,
         )
 
+    @property
+    @memoized
+    def compiled_indicators(self):
+        """
+        Same as ``indicators`` but with all the expressions and filters compiled.
+        See ``corehq.apps.userreports.compiler``
+        """
+        return self._compiler.compile_indicators(self.indicators)
+
+    @property
+    @memoized
+    def _compiler(self):
+        return ExpressionCompiler(profile=getattr(self, '_profile', None))
+
+    def enable_profiling(self, profile=None):
+        """
+        Recompile this data source with profiling enabled.
+
+        :param profile: An existing ``DataSourceProfile`` to add to
+        :returns: the ``DataSourceProfile`` that the processing cost will be recorded in
+        """
+        self._profile = profile or DataSourceProfile(self._id)
+        DataSourceConfiguration._compiler.fget.reset_cache(self)
+        DataSourceConfiguration.compiled_indicators.fget.reset_cache(self)
+        DataSourceConfiguration.compiled_parsed_expression.fget.reset_cache(self)
+        DataSourceConfiguration._get_compiled_main_filter.reset_cache(self)
+        return self._profile
+
     @property
     @memoized
     def parsed_expression(self):
@@ -431,6 +476,25 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             return ExpressionFactory.from_spec(self.base_item_expression, context=self.get_factory_context())
         return None
 
+    @property
+    @memoized
+    def compiled_parsed_expression(self):
+        if self.base_item_expression:
+            return self._compiler.compile_expression(self.parsed_expression)
+        return None
+
+    @property
+    @memoized
+    def related_doc_id_expressions(self):
+        """
+        List of ``(scope, related_doc_type, doc_id_expression)`` for the related doc
+        lookups in this data source. Used to prefetch related documents in bulk.
+        """
+        return [
+            (scope, related_doc_type, ExpressionFactory.from_spec(spec, context=self.get_factory_context()))
+            for scope, related_doc_type, spec in get_related_doc_specs(self)
+        ]
+
     @memoized
     def get_columns(self):
         return self.indicators.get_columns()
@@ -448,7 +512,7 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             if not self.base_item_expression:
                 return [document]
             else:
-                result = self.parsed_expression(document, eval_context)
+                result = self.compiled_parsed_expression(document, eval_context)
                 if result is None:
                     return []
                 elif isinstance(result, list):
@@ -481,7 +545,7 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
 
         rows = []
         for item in self.get_items(doc, eval_context):
-            indicators = self.indicators.get_values(item, eval_context)
+            indicators = self.compiled_indicators.get_values(item, eval_context)
             rows.append(indicators)
             eval_context.increment_iteration()
 
@@ -0,0 +1,386 @@
+"""
+Parallel, resumable rebuilds of UCR data sources.
+
+A rebuild is split into ranges of source documents: one range per case type / form
+xmlns and, for cases and forms in the SQL backend, per shard database. Each range is
+processed independently (see ``tasks.process_rebuild_range``) and records its progress
+in a ``DataSourceActionLog`` checkpoint so that an interrupted rebuild can carry on from
+where each range left off.
+
+Rows are loaded into a shadow table which replaces the data source table once all the
+ranges are complete so the existing data stays available while the rebuild is running.
+
+While the rebuild is running the UCR pillow keeps saving changes to the existing table
+only. The kafka offsets of the data source's change feed topic are recorded when the
+rebuild starts and the changes since then are replayed into the shadow table before it
+is swapped in (see ``ParallelRebuild.swap_in``).
+"""
+import uuid
+from datetime import datetime
+from itertools import islice
+
+import attr
+
+from couchforms.models import all_known_formlike_doc_types
+from dimagi.utils.chunked import chunked
+from kafka.common import TopicPartition
+from pillowtop.dao.couch import ID_CHUNK_SIZE
+from pillowtop.utils import bulk_fetch_changes_docs
+
+from corehq.apps.change_feed import data_sources, document_types
+from corehq.apps.change_feed.consumer.feed import KafkaChangeFeed
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.change_feed.topics import (
+    get_multi_topic_offset,
+    get_topic_for_doc_type,
+)
+from corehq.apps.userreports.const import UCR_BUILD_BATCH_SIZE
+from corehq.apps.userreports.exceptions import TableRebuildError
+from corehq.apps.userreports.models import DataSourceActionLog
+from corehq.apps.userreports.specs import EvaluationContext
+from corehq.apps.userreports.util import get_indicator_adapter, get_table_name
+from corehq.form_processor.backends.sql.dbaccessors import (
+    CaseReindexAccessor,
+    FormReindexAccessor,
+)
+from corehq.form_processor.utils.general import should_use_sql_backend
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query
+
+# reads of the change feed that can time out in a row before a replay fails
+REPLAY_MAX_EMPTY_READS = 5
+
+
+@attr.s
+class RebuildRangeCheckpoint(object):
+    build_id = attr.ib()
+    case_type_or_xmlns = attr.ib()
+    db_alias = attr.ib(default=None)
+    last_pk = attr.ib(default=None)
+    docs_processed = attr.ib(default=0)
+    estimated_total = attr.ib(default=None)
+    complete = attr.ib(default=False)
+    started_on = attr.ib(default=None)
+    last_modified = attr.ib(default=None)
+    # kafka offsets of the change feed when the rebuild started: [[topic, partition, offset], ...]
+    change_offsets = attr.ib(default=None)
+
+    def to_json(self):
+        return attr.asdict(self)
+
+    @classmethod
+    def wrap(cls, data):
+        return cls(**data)
+
+    @property
+    def docs_per_second(self):
+        if not (self.started_on and self.last_modified):
+            return None
+        elapsed = (_parse_datetime(self.last_modified) - _parse_datetime(self.started_on)).total_seconds()
+        return self.docs_processed / elapsed if elapsed > 0 else None
+
+
+def get_shadow_table_name(config, build_id):
+    # leave room for the '_pkey' suffix postgres adds to the primary key
+    return '{}_{}'.format(get_table_name(config.domain, config.table_id, max_length=49), build_id)
+
+
+def supports_parallel_rebuild(config):
+    return (
+        not config.asynchronous
+        and not config.sql_settings.citus_config.distribution_type
+    )
+
+
+class ParallelRebuild(object):
+
+    def __init__(self, config, build_id):
+        self.config = config
+        self.build_id = build_id
+
+    @classmethod
+    def start(cls, config, initiated_by=None, source=None):
+        """Create the shadow table and a checkpoint for each range of the rebuild"""
+        assert supports_parallel_rebuild(config), config._id
+        rebuild = cls(config, uuid.uuid4().hex[:8])
+        rebuild.shadow_adapter.rebuild_table(initiated_by=initiated_by, source=source, skip_log=True)
+        # recorded before any document is read so that every later change is replayed
+        change_offsets = _offsets_to_json(get_multi_topic_offset(_get_change_feed_topics(config)))
+        for case_type_or_xmlns, db_alias in _get_ranges(config):
+            checkpoint = RebuildRangeCheckpoint(
+                build_id=rebuild.build_id,
+                case_type_or_xmlns=case_type_or_xmlns,
+                db_alias=db_alias,
+                estimated_total=_get_estimated_total(config, case_type_or_xmlns, db_alias),
+                change_offsets=change_offsets,
+            )
+            DataSourceActionLog.objects.create(
+                domain=config.domain,
+                indicator_config_id=config.data_source_id,
+                initiated_by=initiated_by,
+                action_source=source,
+                action=DataSourceActionLog.REBUILD_RANGE,
+                checkpoint=checkpoint.to_json(),
+            )
+        return rebuild
+
+    @classmethod
+    def get_latest(cls, config):
+        log = (
+            DataSourceActionLog.objects
+            .filter(indicator_config_id=config.data_source_id, action=DataSourceActionLog.REBUILD_RANGE)
+            .order_by('-date_created', '-id')
+            .first()
+        )
+        return cls(config, log.checkpoint['build_id']) if log else None
+
+    @property
+    def shadow_table_name(self):
+        return get_shadow_table_name(self.config, self.build_id)
+
+    @property
+    def shadow_adapter(self):
+        return get_indicator_adapter(
+            self.config, raise_errors=True, load_source='parallel_rebuild',
+            override_table_name=self.shadow_table_name,
+        )
+
+    def get_checkpoint_logs(self):
+        return DataSourceActionLog.objects.filter(
+            indicator_config_id=self.config.data_source_id,
+            action=DataSourceActionLog.REBUILD_RANGE,
+            checkpoint__build_id=self.build_id,
+        ).order_by('id')
+
+    def get_checkpoints(self):
+        return [RebuildRangeCheckpoint.wrap(log.checkpoint) for log in self.get_checkpoint_logs()]
+
+    def get_incomplete_range_ids(self):
+        return [log.id for log in self.get_checkpoint_logs() if not log.checkpoint['complete']]
+
+    def is_complete(self):
+        return not self.get_incomplete_range_ids()
+
+    def is_swapped_in(self):
+        return not self.shadow_adapter.table_exists
+
+    def process_range(self, range_id):
+        """Process the documents of a single range, starting from its last checkpoint"""
+        checkpoint = RebuildRangeCheckpoint.wrap(DataSourceActionLog.objects.get(id=range_id).checkpoint)
+        if checkpoint.complete:
+            return
+
+        checkpoint.started_on = checkpoint.started_on or _format_datetime(datetime.utcnow())
+        adapter = self.shadow_adapter
+        document_store = get_document_store_for_doc_type(
+            self.config.domain, self.config.referenced_doc_type,
+            case_type_or_xmlns=checkpoint.case_type_or_xmlns,
+            load_source='parallel_rebuild',
+        )
+        for last_pk, doc_ids in self._iter_doc_id_chunks(checkpoint, document_store):
+            for docs in chunked(document_store.iter_documents(doc_ids), UCR_BUILD_BATCH_SIZE):
+                adapter.best_effort_bulk_save(docs)
+            checkpoint.last_pk = last_pk
+            checkpoint.docs_processed += len(doc_ids)
+            self._save_checkpoint(range_id, checkpoint)
+
+        checkpoint.complete = True
+        self._save_checkpoint(range_id, checkpoint)
+
+    def swap_in(self, initiated_by=None, source=None):
+        """Replace the data source table with the shadow table
+
+        Documents that changed after their range was processed are stale or missing in
+        the shadow table, so the changes since the rebuild started are replayed into it
+        first. The changes made while that replay is running are only saved to the old
+        table by the UCR pillow, so they are replayed again once the new table is in place.
+        The swap fails if some of the changes can't be read (see ``replay_changes``).
+        """
+        assert self.is_complete(), self.build_id
+        offsets = self.replay_changes(self.shadow_adapter, self.get_change_offsets())
+        adapter = get_indicator_adapter(self.config, load_source='parallel_rebuild')
+        adapter.replace_table(self.shadow_table_name, initiated_by=initiated_by, source=source)
+        self.replay_changes(adapter, offsets)
+
+    def get_change_offsets(self):
+        """
+        :returns: the kafka offsets of the change feed when the rebuild started as a dict
+            of ``{(topic, partition): offset}`` or ``None`` if they were not recorded.
+        """
+        log = self.get_checkpoint_logs().first()
+        change_offsets = log.checkpoint.get('change_offsets') if log else None
+        if change_offsets is None:
+            return None
+        return {(topic, partition): offset for topic, partition, offset in change_offsets}
+
+    def replay_changes(self, adapter, since):
+        """Apply the changes of the data source's domain since ``since`` to ``adapter``
+
+        The changes are read up to the end of the change feed at the time this is called.
+        Raises ``TableRebuildError`` if some of the changes can't be read.
+
+        :returns: the offsets the changes were read up to, to replay the changes after them.
+        """
+        if since is None:
+            return None
+        change_feed = KafkaChangeFeed(
+            _get_change_feed_topics(self.config), client_id='ucr-parallel-rebuild-{}'.format(self.build_id)
+        )
+        end_offsets = {
+            (topic_partition.topic, topic_partition.partition): offset
+            for topic_partition, offset in change_feed.get_latest_offsets().items()
+        }
+        offsets = {key: since.get(key, 0) for key in end_offsets}
+        # only the last change of each document needs to be applied
+        changes_by_doc_id = {}
+        empty_reads = 0
+        while True:
+            remaining = {key for key, offset in offsets.items() if offset < end_offsets[key]}
+            if not remaining:
+                break
+            _check_offsets_retained(change_feed, {key: offsets[key] for key in remaining})
+            # the feed stops when no change is received for a short while, which doesn't
+            # mean that the end was reached, so carry on from the last change that was read
+            read_changes = False
+            for change in change_feed.iter_changes(since=offsets, forever=False):
+                key = (change.topic, change.partition)
+                if key not in remaining or change.sequence_id >= end_offsets[key]:
+                    continue
+                read_changes = True
+                if change.metadata.domain == self.config.domain:
+                    changes_by_doc_id.pop(change.id, None)
+                    changes_by_doc_id[change.id] = change
+                offsets[key] = change.sequence_id + 1
+                if offsets[key] >= end_offsets[key]:
+                    remaining.discard(key)
+                    if not remaining:
+                        break
+            empty_reads = 0 if read_changes else empty_reads + 1
+            if empty_reads >= REPLAY_MAX_EMPTY_READS:
+                raise TableRebuildError('Timed out reading the changes of {} from {} to {}'.format(
+                    self.config, _offsets_to_json(offsets), _offsets_to_json(end_offsets)
+                ))
+
+        for changes in chunked(changes_by_doc_id.values(), UCR_BUILD_BATCH_SIZE, list):
+            _apply_changes(self.config, adapter, changes)
+        return end_offsets
+
+    def _iter_doc_id_chunks(self, checkpoint, document_store):
+        """
+        :returns: generator of ``(last_pk, doc_ids)`` tuples. ``last_pk`` is the primary
+            key of the last document in the chunk for ranges that are read from a single
+            shard DB and ``None`` otherwise.
+        """
+        accessor = _get_reindex_accessor(self.config, checkpoint.case_type_or_xmlns, checkpoint.db_alias)
+        if accessor:
+            last_pk = checkpoint.last_pk
+            while True:
+                doc_ids = list(accessor.get_doc_ids(
+                    checkpoint.db_alias, last_doc_pk=last_pk, limit=ID_CHUNK_SIZE
+                ))
+                if not doc_ids:
+                    break
+                last_pk = doc_ids[-1].primary_key
+                yield last_pk, [doc_id.doc_id for doc_id in doc_ids]
+        else:
+            remaining_ids = islice(document_store.iter_document_ids(), checkpoint.docs_processed, None)
+            for doc_ids in chunked(remaining_ids, ID_CHUNK_SIZE, list):
+                yield None, doc_ids
+
+    def _save_checkpoint(self, range_id, checkpoint):
+        checkpoint.last_modified = _format_datetime(datetime.utcnow())
+        DataSourceActionLog.objects.filter(id=range_id).update(checkpoint=checkpoint.to_json())
+
+
+def _apply_changes(config, adapter, changes):
+    # same as ConfigurableReportPillowProcessor.process_changes_chunk for a single adapter
+    adapter.bulk_delete([{'_id': change.id} for change in changes if change.deleted])
+
+    # documents that are missing are skipped, like when processing a single change. The
+    # revision of the other documents doesn't matter since the latest one is replayed
+    _, docs = bulk_fetch_changes_docs([change for change in changes if not change.deleted], config.domain)
+    doc_subtypes = {change.id: change.metadata.document_subtype for change in changes}
+    to_save = []
+    to_delete = []
+    for doc in docs:
+        doc_subtype = doc_subtypes[doc['_id']]
+        if config.filter(doc, EvaluationContext(doc)):
+            to_save.append(doc)
+        elif doc_subtype is None or doc_subtype in config.get_case_type_or_xmlns_filter():
+            to_delete.append(doc)
+    adapter.bulk_delete(to_delete)
+    adapter.best_effort_bulk_save(to_save)
+
+
+def _check_offsets_retained(change_feed, offsets):
+    """
+    Raise ``TableRebuildError`` if some of the offsets are no longer in kafka. The change
+    feed would silently start from the oldest change that is left instead.
+    """
+    beginning_offsets = change_feed.consumer.beginning_offsets(
+        [TopicPartition(topic, partition) for topic, partition in offsets]
+    )
+    for topic_partition, beginning_offset in beginning_offsets.items():
+        offset = offsets[(topic_partition.topic, topic_partition.partition)]
+        if offset < beginning_offset:
+            raise TableRebuildError(
+                'Changes of {}/{} from offset {} are no longer retained (oldest is {})'.format(
+                    topic_partition.topic, topic_partition.partition, offset, beginning_offset
+                )
+            )
+
+
+def _get_change_feed_topics(config):
+    data_source_type = (
+        data_sources.SOURCE_SQL if should_use_sql_backend(config.domain) else data_sources.SOURCE_COUCH
+    )
+    return [get_topic_for_doc_type(config.referenced_doc_type, data_source_type)]
+
+
+def _offsets_to_json(offsets):
+    return [[topic, partition, offset] for (topic, partition), offset in sorted(offsets.items())]
+
+
+def _get_ranges(config):
+    if _is_sharded(config):
+        db_aliases = get_db_aliases_for_partitioned_query()
+    else:
+        db_aliases = [None]
+    return [
+        (case_type_or_xmlns, db_alias)
+        for case_type_or_xmlns in config.get_case_type_or_xmlns_filter()
+        for db_alias in db_aliases
+    ]
+
+
+def _is_sharded(config):
+    return (
+        config.referenced_doc_type in document_types.CASE_DOC_TYPES
+        or config.referenced_doc_type in all_known_formlike_doc_types()
+    ) and should_use_sql_backend(config.domain)
+
+
+def _get_reindex_accessor(config, case_type_or_xmlns, db_alias):
+    if db_alias is None:
+        return None
+    if config.referenced_doc_type in document_types.CASE_DOC_TYPES:
+        return CaseReindexAccessor(config.domain, limit_db_aliases=[db_alias], case_type=case_type_or_xmlns)
+    return FormReindexAccessor(
+        config.domain, include_attachments=False, limit_db_aliases=[db_alias], xmlns=case_type_or_xmlns
+    )
+
+
+def _get_estimated_total(config, case_type_or_xmlns, db_alias):
+    accessor = _get_reindex_accessor(config, case_type_or_xmlns, db_alias)
+    if accessor:
+        return accessor.get_approximate_doc_count(db_alias)
+    return None
+
+
+def _format_datetime(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+def _parse_datetime(value):
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
@@ -1,8 +1,11 @@
 import hashlib
+import multiprocessing
 import signal
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 
+import attr
+from django import db
 from django.conf import settings
 
 from pillowtop.checkpoints.manager import KafkaPillowCheckpoint
@@ -20,7 +23,10 @@ from corehq.apps.change_feed.consumer.feed import (
 )
 from corehq.apps.change_feed.topics import LOCATION as LOCATION_TOPIC
 from corehq.apps.domain.dbaccessors import get_domain_ids_by_names
-from corehq.apps.userreports.const import KAFKA_TOPICS
+from corehq.apps.userreports.const import (
+    FILTER_INTERPOLATION_DOC_TYPES,
+    KAFKA_TOPICS,
+)
 from corehq.apps.userreports.data_source_providers import (
     DynamicDataSourceProvider,
     StaticDataSourceProvider,
@@ -31,6 +37,9 @@ from corehq.apps.userreports.exceptions import (
     TableRebuildError,
     UserReportsWarning,
 )
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+)
 from corehq.apps.userreports.models import AsyncIndicator
 from corehq.apps.userreports.rebuild import (
     get_table_diffs,
@@ -48,6 +57,8 @@ from corehq.util.timer import TimingContext
 
 REBUILD_CHECK_INTERVAL = 60 * 60  # in seconds
 LONG_UCR_LOGGING_THRESHOLD = 0.5
+PROFILE_REPORT_INTERVAL = 10 * 60  # in seconds
+DOMAIN_POOL_TIMEOUT = 5 * 60  # in seconds
 
 
 class WarmShutdown(object):
@@ -105,11 +116,73 @@ def _filter_missing_domains(configs):
     ]
 
 
+class DomainFilterIndex(object):
+    """
+    Index of a domain's table adapters by the doc type and case type / xmlns
+    that their data source filters require (see ``get_case_type_or_xmlns_filter``).
+
+    This is used as a cheap pre-filter: only the adapters returned by ``get_candidates``
+    can possibly match a document, so the full filter only needs to be evaluated for them.
+    """
+
+    def __init__(self, adapters):
+        self.adapters = adapters
+        self._position = {adapter: i for i, adapter in enumerate(adapters)}
+        self._subtype_values = {}
+        self._by_doc_type_and_subtype = defaultdict(lambda: defaultdict(list))
+        self._unindexed_by_doc_type = defaultdict(list)
+        self._by_subtype = defaultdict(list)
+        self._unindexed = []
+        for adapter in adapters:
+            config = adapter.config
+            values = config.get_case_type_or_xmlns_filter()
+            self._subtype_values[adapter] = values
+            if None in values or not all(isinstance(value, str) for value in values):
+                self._unindexed_by_doc_type[config.referenced_doc_type].append(adapter)
+                self._unindexed.append(adapter)
+            else:
+                for value in set(values):
+                    self._by_doc_type_and_subtype[config.referenced_doc_type][value].append(adapter)
+                    self._by_subtype[value].append(adapter)
+
+    def get_candidates(self, doc):
+        """Adapters whose filters may match the doc, in the order of ``self.adapters``"""
+        doc_type = doc.get('doc_type')
+        candidates = list(self._unindexed_by_doc_type.get(doc_type, []))
+        by_subtype = self._by_doc_type_and_subtype.get(doc_type)
+        if by_subtype:
+            subtype = doc.get(FILTER_INTERPOLATION_DOC_TYPES.get(doc_type))
+            try:
+                candidates.extend(by_subtype.get(subtype, []))
+            except TypeError:
+                # unhashable value. Let the full filters decide
+                candidates.extend(adapter for adapters in by_subtype.values() for adapter in adapters)
+        return self._sorted(candidates)
+
+    def get_delete_candidates(self, doc_subtype):
+        """Adapters that should have the doc deleted if their filter doesn't match it
+
+        This is the case if the subtype is unknown or the subtype matches the adapter's
+        case type / xmlns filter but the full filter no longer applies.
+        """
+        if doc_subtype is None:
+            return self.adapters
+        candidates = list(self._by_subtype.get(doc_subtype, []))
+        # adapters with a filter of [None] never match a known subtype
+        candidates.extend(
+            adapter for adapter in self._unindexed if doc_subtype in self._subtype_values[adapter]
+        )
+        return self._sorted(candidates)
+
+    def _sorted(self, adapters):
+        return sorted(set(adapters), key=self._position.__getitem__)
+
+
 class ConfigurableReportTableManagerMixin(object):
 
     def __init__(self, data_source_providers, ucr_division=None,
                  include_ucrs=None, exclude_ucrs=None, bootstrap_interval=REBUILD_CHECK_INTERVAL,
-                 run_migrations=True):
+                 run_migrations=True, profile_data_sources=False):
         """Initializes the processor for UCRs
 
         Keyword Arguments:
@@ -121,6 +194,8 @@ class ConfigurableReportTableManagerMixin(object):
         bootstrap_interval -- time in seconds when the pillow checks for any data source changes
         run_migrations -- If True, rebuild tables if the data source changes.
                           Otherwise, do not attempt to change database
+        profile_data_sources -- If True, record the processing cost of each expression
+                                and column of the data sources and log it periodically
         """
         self.bootstrapped = False
         self.last_bootstrapped = datetime.utcnow()
@@ -130,6 +205,13 @@ class ConfigurableReportTableManagerMixin(object):
         self.exclude_ucrs = exclude_ucrs
         self.bootstrap_interval = bootstrap_interval
         self.run_migrations = run_migrations
+        self.profile_data_sources = profile_data_sources
+        self.profiles_by_config_id = {}
+        self.related_doc_fetches = Counter()
+        self.last_profile_report = datetime.utcnow()
+        # revisions of the data sources as of the last bootstrap, by data source ID.
+        # None if the processor was bootstrapped with an explicit list of configs
+        self.data_source_revs = None
         if self.include_ucrs and self.ucr_division:
             raise PillowConfigError("You can't have include_ucrs and ucr_division")
 
@@ -163,19 +245,22 @@ class ConfigurableReportTableManagerMixin(object):
 
     def bootstrap_if_needed(self):
         if self.needs_bootstrap():
-            self.bootstrap()
+            if self.bootstrapped and self.data_source_revs is not None:
+                self.bootstrap_changed()
+            else:
+                self.bootstrap()
 
     def bootstrap(self, configs=None):
+        self.data_source_revs = self.get_data_source_revs() if configs is None else None
         configs = self.get_filtered_configs(configs)
         if not configs:
             pillow_logging.warning("UCR pillow has no configs to process")
 
         self.table_adapters_by_domain = defaultdict(list)
+        self._filter_index_by_domain = {}
 
         for config in configs:
-            self.table_adapters_by_domain[config.domain].append(
-                get_indicator_adapter(config, raise_errors=True, load_source='change_feed')
-            )
+            self.table_adapters_by_domain[config.domain].append(self._get_adapter(config))
 
         if self.run_migrations:
             self.rebuild_tables_if_necessary()
@@ -183,6 +268,69 @@ class ConfigurableReportTableManagerMixin(object):
         self.bootstrapped = True
         self.last_bootstrapped = datetime.utcnow()
 
+    def bootstrap_changed(self):
+        """
+        Only reload the data sources that were added, changed or removed since the
+        last bootstrap and only check the tables of the changed data sources for
+        migrations.
+        """
+        revs = self.get_data_source_revs()
+        changed_ids = {
+            config_id for config_id, rev in revs.items()
+            if self.data_source_revs.get(config_id) != rev
+        }
+        removed_ids = set(self.data_source_revs) - set(revs)
+        self.data_source_revs = revs
+        self.last_bootstrapped = datetime.utcnow()
+        if not (changed_ids or removed_ids):
+            return
+
+        pillow_logging.info(
+            "UCR pillow reloading data sources. Changed: %s, removed: %s", changed_ids, removed_ids
+        )
+        self._remove_adapters(changed_ids | removed_ids)
+        configs = self.get_configs_by_id(changed_ids) if changed_ids else []
+        configs = self.get_filtered_configs(configs) if configs else []
+        adapters = []
+        for config in configs:
+            adapter = self._get_adapter(config)
+            self.table_adapters_by_domain[config.domain].append(adapter)
+            self._filter_index_by_domain.pop(config.domain, None)
+            adapters.append(adapter)
+
+        if self.run_migrations and adapters:
+            self._rebuild_sql_tables(adapters)
+
+    def get_data_source_revs(self):
+        revs = {}
+        for provider in self.data_source_providers:
+            revs.update(provider.get_data_source_revs())
+        return revs
+
+    def get_configs_by_id(self, config_ids):
+        return [
+            source
+            for provider in self.data_source_providers
+            for source in provider.get_data_sources_by_id(config_ids)
+        ]
+
+    def _get_adapter(self, config):
+        if self.profile_data_sources:
+            self.profiles_by_config_id[config._id] = config.enable_profiling(
+                self.profiles_by_config_id.get(config._id)
+            )
+        return get_indicator_adapter(config, raise_errors=True, load_source='change_feed')
+
+    def _remove_adapters(self, config_ids):
+        for domain, adapters in list(self.table_adapters_by_domain.items()):
+            remaining = [adapter for adapter in adapters if adapter.config._id not in config_ids]
+            if len(remaining) != len(adapters):
+                self._filter_index_by_domain.pop(domain, None)
+                if remaining:
+                    self.table_adapters_by_domain[domain] = remaining
+                else:
+                    del self.table_adapters_by_domain[domain]
+
     def rebuild_tables_if_necessary(self):
         self._rebuild_sql_tables([
             adapter
@@ -251,6 +399,52 @@ class ConfigurableReportTableManagerMixin(object):
             adapter.rebuild_table(source='pillowtop')
 
 
+@attr.s
+class DomainChunk(object):
+    """The changes of a single domain in a chunk along with their documents"""
+    domain = attr.ib()
+    changes = attr.ib()
+    docs = attr.ib()
+    # changes whose documents couldn't be fetched
+    retry_changes = attr.ib()
+
+    @property
+    def doc_subtypes(self):
+        return {change.id: change.metadata.document_subtype for change in self.changes}
+
+
+@attr.s
+class DomainChunkResult(object):
+    """
+    The result of transforming the documents of a ``DomainChunk``.
+
+    Everything is keyed by data source ID rather than by adapter so that it can
+    be returned from a worker process (see ``ConfigurableReportPillowProcessor``).
+    """
+    # revisions of the data sources that the documents were transformed with
+    config_revs = attr.ib()
+    rows_by_config_id = attr.ib(default=attr.Factory(lambda: defaultdict(list)))
+    delete_ids_by_config_id = attr.ib(default=attr.Factory(lambda: defaultdict(list)))
+    async_configs_by_doc_id = attr.ib(default=attr.Factory(lambda: defaultdict(list)))
+    # list of (doc_id, exception) tuples
+    doc_exceptions = attr.ib(default=attr.Factory(list))
+    related_doc_fetches = attr.ib(default=attr.Factory(Counter))
+
+
+# processor of the current worker process of a domain pool
+_domain_worker = None
+
+
+def _init_domain_worker(processor_kwargs):
+    global _domain_worker
+    _domain_worker = ConfigurableReportPillowProcessor(**processor_kwargs)
+
+
+def _transform_docs_in_worker(domain, docs, doc_subtypes):
+    _domain_worker.bootstrap_if_needed()
+    return _domain_worker.transform_docs_for_domain(domain, docs, doc_subtypes)
+
+
 class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, BulkPillowProcessor):
     """Generic processor for UCR.
 
@@ -261,10 +455,34 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
 
     Writes to:
       - UCR database
+
+    If ``domain_pool_size`` is set, the documents of the different domains in a
+    chunk of changes are transformed in parallel by a pool of worker processes.
+    Each worker keeps its own bootstrapped adapters. The documents are still
+    fetched and the rows are still saved in this process, which also remains
+    responsible for retrying failed changes. A domain whose transform fails in
+    the pool, or which was transformed with different data source revisions than
+    the ones this process has, is transformed again in this process.
     """
 
     domain_timing_context = Counter()
 
+    def __init__(self, data_source_providers, domain_pool_size=0, **kwargs):
+        """
+        Keyword Arguments:
+        domain_pool_size -- number of worker processes to transform documents with.
+                            Documents are transformed in this process if 0
+        """
+        super(ConfigurableReportPillowProcessor, self).__init__(data_source_providers, **kwargs)
+        self.domain_pool_size = domain_pool_size
+        self._worker_kwargs = dict(
+            kwargs,
+            data_source_providers=data_source_providers,
+            run_migrations=False,
+            profile_data_sources=False,
+        )
+        self._domain_pool = None
+
     @time_ucr_process_change
     def _save_doc_to_table(self, domain, table, doc, eval_context):
         # best effort will swallow errors in the table
@@ -273,6 +491,17 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
         except UserReportsWarning:
             # remove it until the next bootstrap call
             self.table_adapters_by_domain[domain].remove(table)
+            self._filter_index_by_domain.pop(domain, None)
+            if self.data_source_revs is not None:
+                # forget its revision so that it gets reloaded
+                self.data_source_revs.pop(table.config._id, None)
+
+    def _get_filter_index(self, domain):
+        if domain not in self._filter_index_by_domain:
+            self._filter_index_by_domain[domain] = DomainFilterIndex(
+                list(self.table_adapters_by_domain[domain])
+            )
+        return self._filter_index_by_domain[domain]
 
     def process_changes_chunk(self, changes):
         """
@@ -290,53 +519,189 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
 
         retry_changes = set()
         change_exceptions = []
-        for domain, changes_chunk in changes_by_domain.items():
-            with WarmShutdown():
-                failed, exceptions = self._process_chunk_for_domain(domain, changes_chunk)
-            retry_changes.update(failed)
-            change_exceptions.extend(exceptions)
+        if self._use_domain_pool(changes_by_domain):
+            for chunk, result in self._transform_chunks_in_pool(changes_by_domain):
+                with WarmShutdown():
+                    failed, exceptions = self._load_chunk_for_domain(chunk, result)
+                retry_changes.update(failed)
+                change_exceptions.extend(exceptions)
+        else:
+            for domain, changes_chunk in changes_by_domain.items():
+                with WarmShutdown():
+                    failed, exceptions = self._process_chunk_for_domain(domain, changes_chunk)
+                retry_changes.update(failed)
+                change_exceptions.extend(exceptions)
+
+        if self.profile_data_sources:
+            self._report_profiles_if_needed()
 
         return retry_changes, change_exceptions
 
-    def _process_chunk_for_domain(self, domain, changes_chunk):
-        adapters = list(self.table_adapters_by_domain[domain])
-        changes_by_id = {change.id: change for change in changes_chunk}
-        to_delete_by_adapter = defaultdict(list)
-        rows_to_save_by_adapter = defaultdict(list)
-        async_configs_by_doc_id = defaultdict(list)
+    def _report_profiles_if_needed(self):
+        if datetime.utcnow() - self.last_profile_report < timedelta(seconds=PROFILE_REPORT_INTERVAL):
+            return
+        for profile in self.profiles_by_config_id.values():
+            if profile.stats:
+                pillow_logging.info("UCR profile\n%s", profile.format_report(limit=20))
+        if self.related_doc_fetches:
+            pillow_logging.info("UCR related doc fetches: %s", dict(self.related_doc_fetches))
+        self.last_profile_report = datetime.utcnow()
+
+    def _use_domain_pool(self, changes_by_domain):
+        return (
+            self.domain_pool_size
+            and len(changes_by_domain) > 1
+            # the workers load their data sources from the providers
+            and self.data_source_revs is not None
+            # profiles are only collected in this process
+            and not self.profile_data_sources
+        )
+
+    def _get_domain_pool(self):
+        if self._domain_pool is None:
+            # don't share open database connections with the worker processes
+            db.connections.close_all()
+            connection_manager.dispose_all()
+            self._domain_pool = multiprocessing.Pool(
+                processes=self.domain_pool_size,
+                initializer=_init_domain_worker,
+                initargs=[self._worker_kwargs],
+            )
+        return self._domain_pool
+
+    def _terminate_domain_pool(self):
+        if self._domain_pool is not None:
+            self._domain_pool.terminate()
+            self._domain_pool = None
+
+    def _transform_chunks_in_pool(self, changes_by_domain):
+        """
+        :returns: generator of ``(DomainChunk, DomainChunkResult)`` tuples
+        """
+        pool = self._get_domain_pool()
+        pending = []
+        for domain, changes_chunk in changes_by_domain.items():
+            chunk = self._extract_chunk_for_domain(domain, changes_chunk)
+            async_result = pool.apply_async(
+                _transform_docs_in_worker, (domain, chunk.docs, chunk.doc_subtypes)
+            )
+            pending.append((chunk, async_result))
+
+        for chunk, async_result in pending:
+            result = None
+            if self._domain_pool is not None:
+                try:
+                    result = async_result.get(timeout=DOMAIN_POOL_TIMEOUT)
+                except multiprocessing.TimeoutError:
+                    pillow_logging.exception("UCR domain pool timed out on domain %s", chunk.domain)
+                    # a worker may have died. Start with a new pool for the next chunk
+                    self._terminate_domain_pool()
+                except Exception:
+                    pillow_logging.exception("UCR domain pool failed on domain %s", chunk.domain)
+            if result is None or result.config_revs != self._get_config_revs(chunk.domain):
+                result = self.transform_docs_for_domain(chunk.domain, chunk.docs, chunk.doc_subtypes)
+            yield chunk, result
+
+    def _get_config_revs(self, domain):
+        return {
+            adapter.config._id: self.data_source_revs.get(adapter.config._id)
+            for adapter in self._get_filter_index(domain).adapters
+        } if self.data_source_revs is not None else None
+
+    def _extract_chunk_for_domain(self, domain, changes_chunk):
         to_update = {change for change in changes_chunk if not change.deleted}
         with self._datadog_timing('extract'):
             retry_changes, docs = bulk_fetch_changes_docs(to_update, domain)
-        change_exceptions = []
+        return DomainChunk(domain, changes_chunk, docs, retry_changes)
+
+    def _process_chunk_for_domain(self, domain, changes_chunk):
+        chunk = self._extract_chunk_for_domain(domain, changes_chunk)
+        result = self.transform_docs_for_domain(domain, chunk.docs, chunk.doc_subtypes)
+        return self._load_chunk_for_domain(chunk, result)
+
+    def transform_docs_for_domain(self, domain, docs, doc_subtypes):
+        """
+        Evaluate the filters and indicators of the domain's data sources for the docs.
+
+        This doesn't write to the UCR database so it can run in a worker process.
+
+        :param doc_subtypes: dict of the document subtype of each doc by doc ID
+        :returns: ``DomainChunkResult``
+        """
+        filter_index = self._get_filter_index(domain)
+        result = DomainChunkResult(self._get_config_revs(domain))
+
+        related_docs = RelatedDocumentCache(domain)
+        with self._datadog_timing('single_batch_filter'):
+            eval_contexts = {}
+            matching_adapters_by_doc_id = {}
+            docs_by_adapter = defaultdict(list)
+            for doc in docs:
+                eval_context = EvaluationContext(doc, related_docs=related_docs)
+                eval_contexts[doc['_id']] = eval_context
+                matching_adapters = [
+                    adapter for adapter in filter_index.get_candidates(doc)
+                    if adapter.config.filter(doc, eval_context)
+                ]
+                matching_adapters_by_doc_id[doc['_id']] = matching_adapters
+                for adapter in matching_adapters:
+                    if not adapter.run_asynchronous:
+                        docs_by_adapter[adapter].append(doc)
+
+        with self._datadog_timing('related_doc_prefetch'):
+            related_docs.prefetch([
+                (adapter.config, adapter_docs) for adapter, adapter_docs in docs_by_adapter.items()
+            ])
 
         with self._datadog_timing('single_batch_transform'):
             for doc in docs:
-                change = changes_by_id[doc['_id']]
-                doc_subtype = change.metadata.document_subtype
-                eval_context = EvaluationContext(doc)
+                doc_subtype = doc_subtypes[doc['_id']]
+                eval_context = eval_contexts[doc['_id']]
+                matching_adapters = matching_adapters_by_doc_id[doc['_id']]
                 with self._datadog_timing('single_doc_transform'):
-                    for adapter in adapters:
-                        with self._datadog_timing('transform', adapter.config._id):
-                            if adapter.config.filter(doc, eval_context):
-                                if adapter.run_asynchronous:
-                                    async_configs_by_doc_id[doc['_id']].append(adapter.config._id)
-                                else:
-                                    try:
-                                        rows_to_save_by_adapter[adapter].extend(adapter.get_all_values(doc, eval_context))
-                                    except Exception as e:
-                                        change_exceptions.append((change, e))
-                                    eval_context.reset_iteration()
-                            elif (doc_subtype is None
-                                    or doc_subtype in adapter.config.get_case_type_or_xmlns_filter()):
-                                # Delete if the subtype is unknown or
-                                # if the subtype matches our filters, but the full filter no longer applies
-                                to_delete_by_adapter[adapter].append(doc)
+                    for adapter in matching_adapters:
+                        config_id = adapter.config._id
+                        with self._datadog_timing('transform', config_id):
+                            if adapter.run_asynchronous:
+                                result.async_configs_by_doc_id[doc['_id']].append(config_id)
+                            else:
+                                try:
+                                    result.rows_by_config_id[config_id].extend(
+                                        adapter.get_all_values(doc, eval_context)
+                                    )
+                                except Exception as e:
+                                    result.doc_exceptions.append((doc['_id'], e))
+                                eval_context.reset_iteration()
+
+                # Delete if the subtype is unknown or
+                # if the subtype matches our filters, but the full filter no longer applies
+                for adapter in filter_index.get_delete_candidates(doc_subtype):
+                    if adapter not in matching_adapters:
+                        result.delete_ids_by_config_id[adapter.config._id].append(doc['_id'])
+
+        result.related_doc_fetches.update(related_docs.fetch_counts)
+        return result
+
+    def _load_chunk_for_domain(self, chunk, result):
+        """Save the rows of a ``DomainChunkResult`` and delete the rows that no longer apply
+
+        :returns: tuple of the changes to retry and a list of ``(change, exception)`` tuples
+        """
+        adapters = self._get_filter_index(chunk.domain).adapters
+        adapters_by_config_id = {adapter.config._id: adapter for adapter in adapters}
+        changes_by_id = {change.id: change for change in chunk.changes}
+        docs_by_id = {doc['_id']: doc for doc in chunk.docs}
+        to_update = {change for change in chunk.changes if not change.deleted}
+        retry_changes = set(chunk.retry_changes)
+        change_exceptions = [(changes_by_id[doc_id], e) for doc_id, e in result.doc_exceptions]
 
         with self._datadog_timing('single_batch_delete'):
             # bulk delete by adapter
-            to_delete = [{'_id': c.id} for c in changes_chunk if c.deleted]
+            to_delete = [{'_id': c.id} for c in chunk.changes if c.deleted]
             for adapter in adapters:
-                delete_docs = to_delete_by_adapter[adapter] + to_delete
+                delete_docs = [
+                    docs_by_id[doc_id] for doc_id in result.delete_ids_by_config_id.get(adapter.config._id, [])
+                ] + to_delete
                 if not delete_docs:
                     continue
                 with self._datadog_timing('delete', adapter.config._id):
@@ -344,24 +709,28 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
                         adapter.bulk_delete(delete_docs)
                     except Exception:
                         delete_ids = [doc['_id'] for doc in delete_docs]
-                        retry_changes.update([c for c in changes_chunk if c.id in delete_ids])
+                        retry_changes.update([c for c in chunk.changes if c.id in delete_ids])
 
         with self._datadog_timing('single_batch_load'):
             # bulk update by adapter
-            for adapter, rows in rows_to_save_by_adapter.items():
-                with self._datadog_timing('load', adapter.config._id):
+            for config_id, rows in result.rows_by_config_id.items():
+                adapter = adapters_by_config_id[config_id]
+                with self._datadog_timing('load', config_id):
                     try:
                         adapter.save_rows(rows)
                     except Exception:
                         retry_changes.update(to_update)
 
-        if async_configs_by_doc_id:
+        if result.async_configs_by_doc_id:
             with self._datadog_timing('async_config_load'):
                 doc_type_by_id = {
                     _id: changes_by_id[_id].metadata.document_type
-                    for _id in async_configs_by_doc_id.keys()
+                    for _id in result.async_configs_by_doc_id.keys()
                 }
-                AsyncIndicator.bulk_update_records(async_configs_by_doc_id, domain, doc_type_by_id)
+                AsyncIndicator.bulk_update_records(result.async_configs_by_doc_id, chunk.domain, doc_type_by_id)
+
+        if self.profile_data_sources:
+            self.related_doc_fetches.update(result.related_doc_fetches)
 
         return retry_changes, change_exceptions
 
@@ -479,7 +848,8 @@ class ConfigurableReportKafkaPillow(ConstructedPillow):
 def get_kafka_ucr_pillow(pillow_id='kafka-ucr-main', ucr_division=None,
                          include_ucrs=None, exclude_ucrs=None, topics=None,
                          num_processes=1, process_num=0,
-                         processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE, **kwargs):
+                         processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE,
+                         profile_data_sources=False, domain_pool_size=0, **kwargs):
     """UCR pillow that reads from all Kafka topics and writes data into the UCR database tables.
 
         Processors:
@@ -494,7 +864,9 @@ def get_kafka_ucr_pillow(pillow_id='kafka-ucr-main', ucr_division=None,
             ucr_division=ucr_division,
             include_ucrs=include_ucrs,
             exclude_ucrs=exclude_ucrs,
-            run_migrations=(process_num == 0)  # only first process runs migrations
+            run_migrations=(process_num == 0),  # only first process runs migrations
+            profile_data_sources=profile_data_sources,
+            domain_pool_size=domain_pool_size,
         ),
         pillow_name=pillow_id,
         topics=topics,
@@ -507,7 +879,8 @@ def get_kafka_ucr_pillow(pillow_id='kafka-ucr-main', ucr_division=None,
 def get_kafka_ucr_static_pillow(pillow_id='kafka-ucr-static', ucr_division=None,
                                 include_ucrs=None, exclude_ucrs=None, topics=None,
                                 num_processes=1, process_num=0,
-                                processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE, **kwargs):
+                                processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE,
+                                profile_data_sources=False, domain_pool_size=0, **kwargs):
     """UCR pillow that reads from all Kafka topics and writes data into the UCR database tables.
 
     Only processes `static` UCR datasources (configuration lives in the codebase instead of the database).
@@ -525,7 +898,9 @@ def get_kafka_ucr_static_pillow(pillow_id='kafka-ucr-static', ucr_division=None,
             include_ucrs=include_ucrs,
             exclude_ucrs=exclude_ucrs,
             bootstrap_interval=7 * 24 * 60 * 60,  # 1 week
-            run_migrations=(process_num == 0)  # only first process runs migrations
+            run_migrations=(process_num == 0),  # only first process runs migrations
+            profile_data_sources=profile_data_sources,
+            domain_pool_size=domain_pool_size,
         ),
         pillow_name=pillow_id,
         topics=topics,
@@ -0,0 +1,158 @@
+"""
+Opt-in profiling of the cost of processing documents with a data source.
+
+``DataSourceProfile`` records the number of calls and the time spent in each
+expression and filter node of a data source, as well as in each indicator column.
+It is enabled for a data source with ``DataSourceConfiguration.enable_profiling``
+which recompiles the data source (see ``corehq.apps.userreports.compiler``) with
+every node wrapped in a timer.
+
+For each node both the cumulative time (including the time spent in the nodes
+below it) and the self time (excluding it) are recorded. Ranking the nodes
+by self time shows which expressions account for most of the processing cost.
+
+Nodes that the compiler doesn't know about are timed as a whole. The nodes
+below them are not timed individually.
+"""
+import time
+from collections import Counter
+
+import attr
+
+from corehq.apps.userreports.expressions.getters import TransformedGetter
+from corehq.apps.userreports.filters import (
+    NamedFilter,
+    SinglePropertyValueFilter,
+)
+
+
+@attr.s
+class NodeStats(object):
+    label = attr.ib()
+    calls = attr.ib(default=0)
+    cumulative_time = attr.ib(default=0.)
+    self_time = attr.ib(default=0.)
+
+
+class DataSourceProfile(object):
+
+    def __init__(self, config_id=None):
+        self.config_id = config_id
+        self.stats = {}
+        self.related_doc_fetches = Counter()
+        # self time of the node that is currently being evaluated is the total time of
+        # that node minus the time of each child node, which are collected here
+        self._child_time_stack = []
+
+    def wrap(self, fn, label):
+        stats = self.stats.get(label)
+        if stats is None:
+            stats = self.stats[label] = NodeStats(label)
+        child_time_stack = self._child_time_stack
+
+        def profiled(item, context=None):
+            child_time_stack.append(0.)
+            start = time.perf_counter()
+            try:
+                return fn(item, context)
+            finally:
+                elapsed = time.perf_counter() - start
+                child_time = child_time_stack.pop()
+                stats.calls += 1
+                stats.cumulative_time += elapsed
+                stats.self_time += elapsed - child_time
+                if child_time_stack:
+                    child_time_stack[-1] += elapsed
+        return profiled
+
+    def add_related_doc_fetches(self, fetches):
+        """
+        :param fetches: ``Counter`` of related doc fetches by doc type
+        """
+        self.related_doc_fetches.update(fetches)
+
+    def get_ranked_stats(self):
+        return sorted(self.stats.values(), key=lambda stats: stats.self_time, reverse=True)
+
+    def format_report(self, limit=None):
+        ranked = self.get_ranked_stats()
+        total_time = sum(stats.self_time for stats in ranked)
+        lines = [
+            'Data source: {}'.format(self.config_id),
+            '{:>10} {:>12} {:>12} {:>7} {:>7}  {}'.format(
+                'calls', 'self (s)', 'cumul. (s)', 'self %', 'total %', 'node'
+            ),
+        ]
+        running_total = 0.
+        for stats in ranked[:limit]:
+            running_total += stats.self_time
+            lines.append('{:>10} {:>12.4f} {:>12.4f} {:>7.1%} {:>7.1%}  {}'.format(
+                stats.calls,
+                stats.self_time,
+                stats.cumulative_time,
+                stats.self_time / total_time if total_time else 0,
+                running_total / total_time if total_time else 0,
+                stats.label,
+            ))
+        if self.related_doc_fetches:
+            lines.append('Related doc fetches: {}'.format(', '.join(
+                '{}: {}'.format(doc_type, count) for doc_type, count in sorted(self.related_doc_fetches.items())
+            )))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return {
+            'config_id': self.config_id,
+            'nodes': [attr.asdict(stats) for stats in self.get_ranked_stats()],
+            'related_doc_fetches': dict(self.related_doc_fetches),
+        }
+
+
+_LABEL_DETAIL_PROPERTIES = {
+    'property_name': 'property_name',
+    'property_path': 'property_path',
+    'related_doc': 'related_doc_type',
+    'named': 'name',
+}
+
+
+def get_node_label(node):
+    """A short description of an expression or filter node for profiling reports"""
+    if isinstance(node, TransformedGetter):
+        return get_node_label(node.getter)
+    if isinstance(node, SinglePropertyValueFilter):
+        return 'filter({})'.format(get_node_label(node.expression))
+    if isinstance(node, NamedFilter):
+        return 'named_filter:{}'.format(node.filter_name)
+
+    node_type = getattr(node, 'type', None) or type(node).__name__
+    detail = _get_label_detail(node, _LABEL_DETAIL_PROPERTIES.get(node_type))
+    return '{}:{}'.format(node_type, detail) if detail else node_type
+
+
+def _get_label_detail(node, property_name):
+    if not property_name:
+        return None
+    value = getattr(node, property_name, None)
+    if isinstance(value, (list, tuple)):
+        return '/'.join(str(part) for part in value)
+    return str(value) if value is not None else None
+
+
+def profile_data_source(config, docs):
+    """
+    Process documents with a copy of the data source that has profiling enabled.
+
+    :returns: the ``DataSourceProfile``
+    """
+    from corehq.apps.userreports.expressions.related_docs import (
+        RelatedDocumentCache,
+    )
+    from corehq.apps.userreports.specs import EvaluationContext
+    config = config.__class__.wrap(config.to_json())
+    profile = config.enable_profiling()
+    related_docs = RelatedDocumentCache(config.domain, load_source='profile_data_source')
+    for doc in docs:
+        config.get_all_values(doc, EvaluationContext(doc, related_docs=related_docs))
+    profile.add_related_doc_fetches(related_docs.fetch_counts)
+    return profile
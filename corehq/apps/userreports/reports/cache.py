@@ -0,0 +1,169 @@
+"""
+Cache of the results of UCR report queries.
+
+Results are cached in the memory of each process, keyed on the report query
+(including the filter values) and on the version of the data source table.
+The table version is shared between processes through the django cache and is
+changed by the indicator adapters whenever they write to the table (see
+``bumps_table_version``), so a cached result is never used once the data it was
+computed from has changed.
+
+Report rows are stored by column: numeric columns are kept in ``array.array``
+objects and other columns in tuples. This takes much less memory than a list
+of dicts for large results. The size of the cache is bounded by
+``UCR_REPORT_CACHE_MAX_BYTES`` and the least recently used results are evicted
+first.
+"""
+import hashlib
+import json
+import sys
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+from functools import wraps
+
+from django.core.cache import cache
+
+from corehq.apps.userreports.const import UCR_REPORT_CACHE_MAX_BYTES
+
+_MISSING = object()
+
+
+def _get_table_version_key(table_name):
+    return 'ucr-table-version-{}'.format(table_name)
+
+
+def get_table_version(table_name):
+    """
+    :returns: the current version of the table or ``None`` if the version can't
+        be stored, in which case results for the table shouldn't be cached
+    """
+    key = _get_table_version_key(table_name)
+    version = cache.get(key)
+    if version is None:
+        # a new random version can't match any results that were cached for
+        # an earlier version, even if the earlier version was evicted
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_table_version(table_name):
+    cache.delete(_get_table_version_key(table_name))
+
+
+def bumps_table_version(fn):
+    """Decorator for adapter methods that change the contents of the adapter's table"""
+    @wraps(fn)
+    def _inner(self, *args, **kwargs):
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            bump_table_version(self.get_table().name)
+    return _inner
+
+
+def get_report_cache_key(table_name, *parts):
+    """
+    :param parts: JSON serializable values that identify the query. Values that
+        aren't JSON serializable (e.g. dates) are serialized as strings.
+    :returns: the cache key or ``None`` if the results can't be cached
+    """
+    version = get_table_version(table_name)
+    if version is None:
+        return None
+    parts_hash = hashlib.md5(
+        json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    return '{}:{}:{}'.format(table_name, version, parts_hash)
+
+
+class ColumnarResult(object):
+    """Report rows (a list of dicts) stored as one array or tuple per column"""
+
+    def __init__(self, keys, columns, num_rows):
+        self.keys = keys
+        self.columns = columns
+        self.num_rows = num_rows
+
+    @classmethod
+    def from_rows(cls, rows):
+        keys = []
+        for row in rows:
+            keys.extend(key for key in row if key not in keys)
+        columns = [
+            _to_column([row.get(key, _MISSING) for row in rows])
+            for key in keys
+        ]
+        return cls(tuple(keys), columns, len(rows))
+
+    def to_rows(self):
+        rows = [{} for _ in range(self.num_rows)]
+        for key, column in zip(self.keys, self.columns):
+            for row, value in zip(rows, column):
+                if value is not _MISSING:
+                    row[key] = value
+        return rows
+
+    @property
+    def nbytes(self):
+        size = sys.getsizeof(self.keys)
+        for column in self.columns:
+            size += sys.getsizeof(column)
+            if not isinstance(column, array):
+                size += sum(sys.getsizeof(value) for value in column if value is not _MISSING)
+        return size
+
+
+def _to_column(values):
+    if values and all(type(value) is int for value in values):
+        try:
+            return array('q', values)
+        except OverflowError:
+            return tuple(values)
+    if values and all(type(value) is float for value in values):
+        return array('d', values)
+    return tuple(values)
+
+
+class ReportResultCache(object):
+    """Size bounded LRU cache of report results"""
+
+    def __init__(self, max_bytes=UCR_REPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.size -= old_entry[1]
+            while self._entries and self.size + nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.size -= evicted_bytes
+            self._entries[key] = (value, nbytes)
+            self.size += nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+report_result_cache = ReportResultCache()
@@ -142,6 +142,17 @@ class ConfigurableReportDataSource(object):
     def get_total_records(self):
         return self.data_source.get_total_records()
 
+    def get_result_key(self):
+        """See ``ConfigurableReportSqlDataSource.get_result_key``"""
+        if isinstance(self.data_source, ConfigurableReportSqlDataSource):
+            return self.data_source.get_result_key()
+        return None
+
+    def read_from_primary(self):
+        """See ``ConfigurableReportSqlDataSource.read_from_primary``"""
+        if isinstance(self.data_source, ConfigurableReportSqlDataSource):
+            self.data_source.read_from_primary()
+
     def get_total_row(self):
         return self.data_source.get_total_row()
 
@@ -1,22 +1,32 @@
+import datetime
 import hashlib
+import io
 import itertools
 import logging
+import uuid
 
 from django.utils.translation import ugettext as _
 
 import psycopg2
 import sqlalchemy
 from memoized import memoized
+from psycopg2 import sql
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import Index, PrimaryKeyConstraint
 
 from corehq.apps.userreports.adapter import IndicatorAdapter
+from corehq.apps.userreports.const import (
+    UCR_COPY_LOAD_THRESHOLD,
+    UCR_LOAD_MODE_COPY,
+    UCR_LOAD_MODE_INSERT,
+)
 from corehq.apps.userreports.exceptions import (
     ColumnNotFoundError,
     TableRebuildError,
     translate_programming_error,
 )
+from corehq.apps.userreports.reports.cache import bumps_table_version
 from corehq.apps.userreports.sql.columns import column_to_sql
 from corehq.apps.userreports.util import get_table_name
 from corehq.sql_db.connections import connection_manager
@@ -96,6 +106,7 @@ class IndicatorSqlAdapter(IndicatorAdapter):
                 raise ValueError("unknown distribution type: %r" % config.distribution_type)
             return True
 
+    @bumps_table_version
     def rebuild_table(self, initiated_by=None, source=None, skip_log=False):
         self.log_table_rebuild(initiated_by, source, skip=skip_log)
         self.session_helper.Session.remove()
@@ -118,6 +129,25 @@ class IndicatorSqlAdapter(IndicatorAdapter):
         finally:
             self.session_helper.Session.commit()
 
+    @bumps_table_version
+    def replace_table(self, source_table_name, initiated_by=None, source=None):
+        """
+        Replace the table of this adapter with ``source_table_name`` in a single
+        transaction. The source table must have been built from the same data source
+        config e.g. by an adapter with ``override_table_name=source_table_name``.
+        """
+        self.log_table_rebuild(initiated_by, source)
+        self.session_helper.Session.remove()
+        metadata = get_metadata(self.engine_id)
+        source_table = get_indicator_table(self.config, metadata, override_table_name=source_table_name)
+        try:
+            swap_table(self.engine, source_table, self.get_table())
+        except ProgrammingError as e:
+            raise TableRebuildError('problem replacing UCR table {}: {}'.format(self.config, e))
+        finally:
+            metadata.remove(source_table)
+
+    @bumps_table_version
     def drop_table(self, initiated_by=None, source=None, skip_log=False):
         self.log_table_drop(initiated_by, source, skip_log)
         # this will hang if there are any open sessions, so go ahead and close them
@@ -128,6 +158,7 @@ class IndicatorSqlAdapter(IndicatorAdapter):
             get_metadata(self.engine_id).remove(table)
 
     @unit_testing_only
+    @bumps_table_version
     def clear_table(self):
         table = self.get_table()
         with self.engine.begin() as connection:
@@ -168,6 +199,7 @@ class IndicatorSqlAdapter(IndicatorAdapter):
         except Exception as e:
             self.handle_exception(doc, e)
 
+    @bumps_table_version
     def save_rows(self, rows):
         """
         Saves rows to a data source after deleting the old rows
@@ -175,6 +207,10 @@ class IndicatorSqlAdapter(IndicatorAdapter):
         if not rows:
             return
 
+        if self._use_copy(rows):
+            self._copy_rows(rows)
+            return
+
         # transform format from ColumnValue to dict
         formatted_rows = [
             {i.column.database_column_name.decode('utf-8'): i.value for i in row}
@@ -205,6 +241,84 @@ class IndicatorSqlAdapter(IndicatorAdapter):
             for query in queries:
                 session.execute(query)
 
+    def _use_copy(self, rows):
+        if self.session_helper.is_citus_db:
+            if self.config.sql_settings.citus_config.distribution_type == 'hash':
+                return False
+        load_mode = self.config.sql_settings.load_mode
+        if load_mode == UCR_LOAD_MODE_COPY:
+            return True
+        elif load_mode == UCR_LOAD_MODE_INSERT:
+            return False
+        return len(rows) >= UCR_COPY_LOAD_THRESHOLD
+
+    def _copy_rows(self, rows):
+        """
+        Saves rows by streaming them with ``COPY`` into a temporary table and
+        merging that into the data source table with a single statement.
+
+        This avoids compiling one large ``INSERT`` statement through SQLAlchemy
+        which is slow for large numbers of rows.
+        """
+        table = self.get_table()
+        column_names = [
+            column_value.column.database_column_name.decode('utf-8') for column_value in rows[0]
+        ]
+        data = io.StringIO()
+        for row in rows:
+            data.write('\t'.join(_to_copy_text(column_value.value) for column_value in row))
+            data.write('\n')
+        data.seek(0)
+
+        temp_table = sql.Identifier('tmp_{}'.format(uuid.uuid4().hex))
+        target_table = sql.Identifier(table.name)
+        columns = sql.SQL(', ').join(sql.Identifier(name) for name in column_names)
+        if self.supports_upsert():
+            pk_columns = [column.name for column in table.primary_key.columns]
+            update_columns = [name for name in column_names if name not in pk_columns]
+            if update_columns:
+                on_conflict = sql.SQL('DO UPDATE SET {}').format(sql.SQL(', ').join(
+                    sql.SQL('{0} = EXCLUDED.{0}').format(sql.Identifier(name)) for name in update_columns
+                ))
+            else:
+                on_conflict = sql.SQL('DO NOTHING')
+            merge_queries = [
+                sql.SQL('INSERT INTO {table} ({columns}) SELECT {columns} FROM {temp_table} '
+                        'ON CONFLICT ({pk_columns}) {on_conflict}').format(
+                    table=target_table,
+                    columns=columns,
+                    temp_table=temp_table,
+                    pk_columns=sql.SQL(', ').join(sql.Identifier(name) for name in pk_columns),
+                    on_conflict=on_conflict,
+                )
+            ]
+        else:
+            merge_queries = [
+                sql.SQL('DELETE FROM {table} WHERE doc_id IN (SELECT doc_id FROM {temp_table})').format(
+                    table=target_table, temp_table=temp_table,
+                ),
+                sql.SQL('INSERT INTO {table} ({columns}) SELECT {columns} FROM {temp_table}').format(
+                    table=target_table, columns=columns, temp_table=temp_table,
+                ),
+            ]
+
+        with self.session_context() as session:
+            cursor = session.connection().connection.cursor()
+            try:
+                cursor.execute(
+                    sql.SQL('CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP').format(
+                        temp_table, target_table
+                    )
+                )
+                cursor.copy_expert(
+                    sql.SQL('COPY {} ({}) FROM STDIN').format(temp_table, columns),
+                    data
+                )
+                for query in merge_queries:
+                    cursor.execute(query)
+            finally:
+                cursor.close()
+
     def _by_column_update(self, rows):
         config = self.config.sql_settings.citus_config
         shard_col = config.distribution_column
@@ -254,6 +368,7 @@ class IndicatorSqlAdapter(IndicatorAdapter):
             rows.extend(self.get_all_values(doc))
         self.save_rows(rows)
 
+    @bumps_table_version
     def bulk_delete(self, docs):
         if self.session_helper.is_citus_db:
             config = self.config.sql_settings.citus_config
@@ -370,6 +485,10 @@ class MultiDBSqlAdapter(object):
         for adapter in self.all_adapters:
             adapter.rebuild_table(initiated_by=initiated_by, source=source, skip_log=skip_log)
 
+    def replace_table(self, source_table_name, initiated_by=None, source=None):
+        for adapter in self.all_adapters:
+            adapter.replace_table(source_table_name, initiated_by=initiated_by, source=source)
+
     def drop_table(self, initiated_by=None, source=None, skip_log=False):
         for adapter in self.all_adapters:
             adapter.drop_table(initiated_by=initiated_by, source=source, skip_log=skip_log)
@@ -387,6 +506,10 @@ class MultiDBSqlAdapter(object):
         for adapter in self.all_adapters:
             adapter.bulk_save(docs)
 
+    def best_effort_bulk_save(self, docs):
+        for adapter in self.all_adapters:
+            adapter.best_effort_bulk_save(docs)
+
     def bulk_delete(self, docs):
         for adapter in self.all_adapters:
             adapter.bulk_delete(docs)
@@ -426,6 +549,34 @@ class ErrorRaisingMultiDBAdapter(MultiDBSqlAdapter):
     mirror_adapter_cls = ErrorRaisingIndicatorSqlAdapter
 
 
+def _to_copy_text(value):
+    """Format a value for ``COPY ... FROM`` in postgres' text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, list):
+        text = _to_array_literal(value)
+    elif isinstance(value, (datetime.date, datetime.time)):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return (
+        text.replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _to_array_literal(values):
+    def _element(value):
+        if value is None:
+            return 'NULL'
+        if isinstance(value, (datetime.date, datetime.time)):
+            value = value.isoformat()
+        return '"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"'))
+    return '{{{}}}'.format(','.join(_element(value) for value in values))
+
+
 def get_indicator_table(indicator_config, metadata, override_table_name=None):
     sql_columns = [column_to_sql(col) for col in indicator_config.get_columns()]
     table_name = override_table_name or get_table_name(indicator_config.domain, indicator_config.table_id)
@@ -476,3 +627,32 @@ def rebuild_table(engine, table):
 def build_table(engine, table):
     with engine.begin() as connection:
         table.create(connection, checkfirst=True)
+
+
+def swap_table(engine, source_table, target_table):
+    """
+    Drop ``target_table`` and rename ``source_table`` (and its indexes) to take its
+    place. Both tables must have the same definition.
+    """
+    preparer = engine.dialect.identifier_preparer
+    target_indexes = {_index_columns(index): index for index in target_table.indexes}
+    index_renames = [
+        (preparer.format_index(index), preparer.format_index(target_indexes[_index_columns(index)]))
+        for index in source_table.indexes
+        if _index_columns(index) in target_indexes
+    ]
+    index_renames.append((
+        preparer.quote('{}_pkey'.format(source_table.name)),
+        preparer.quote('{}_pkey'.format(target_table.name)),
+    ))
+    with engine.begin() as connection:
+        target_table.drop(connection, checkfirst=True)
+        connection.execute('ALTER TABLE {} RENAME TO {}'.format(
+            preparer.format_table(source_table), preparer.format_table(target_table)
+        ))
+        for old_name, new_name in index_renames:
+            connection.execute('ALTER INDEX {} RENAME TO {}'.format(old_name, new_name))
+
+
+def _index_columns(index):
+    return tuple(column.name for column in index.columns)
@@ -1,20 +1,30 @@
 import numbers
+import sys
+from contextlib import contextmanager
 
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext
 from memoized import memoized
 from sqlagg.sorting import OrderBy
 
+from corehq import toggles
 from corehq.apps.reports.sqlreport import SqlData
 from corehq.apps.userreports.decorators import catch_and_raise_exceptions
 from corehq.apps.userreports.exceptions import InvalidQueryColumn
 from corehq.apps.userreports.mixins import ConfigurableReportDataSourceMixin
+from corehq.apps.userreports.reports.cache import (
+    ColumnarResult,
+    get_report_cache_key,
+    report_result_cache,
+)
 from corehq.apps.userreports.reports.sorting import ASCENDING
 from corehq.apps.userreports.reports.specs import CalculatedColumn
 from corehq.sql_db.connections import connection_manager
 
 
 class ConfigurableReportSqlDataSource(ConfigurableReportDataSourceMixin, SqlData):
+    _read_from_primary = False
+
     @property
     def engine_id(self):
         if self._engine_id is not None:
@@ -26,6 +36,26 @@ class ConfigurableReportSqlDataSource(ConfigurableReportDataSourceMixin, SqlData
     def override_engine_id(self, engine_id):
         self._engine_id = engine_id
 
+    def read_from_primary(self):
+        """
+        Read from the primary database instead of a read replica, so the
+        results are at least as recent as the current result key (see
+        ``get_result_key``).
+        """
+        self._read_from_primary = True
+
+    @contextmanager
+    def _reading_from_primary(self):
+        read_from_primary = self._read_from_primary
+        self._read_from_primary = True
+        try:
+            yield
+        finally:
+            self._read_from_primary = read_from_primary
+
+    def _get_session_helper(self):
+        return connection_manager.get_session_helper(self.engine_id, readonly=not self._read_from_primary)
+
     @property
     def filters(self):
         return [_f for _f in [fv.to_sql_filter() for fv in self._filter_values.values()] if _f]
@@ -58,9 +88,69 @@ class ConfigurableReportSqlDataSource(ConfigurableReportDataSourceMixin, SqlData
         # This explicitly only includes columns that resolve to database queries.
         return [c for c in self.inner_columns if not isinstance(c, CalculatedColumn)]
 
+    @property
+    def _tracks_table_version(self):
+        from corehq.apps.userreports.models import DataSourceConfiguration
+        # only the tables of data sources record their changes (see IndicatorSqlAdapter)
+        return isinstance(self.config, DataSourceConfiguration)
+
+    @property
+    def _cache_results(self):
+        return self._tracks_table_version and toggles.UCR_REPORT_RESULT_CACHE.enabled(self.domain)
+
+    def _get_result_cache_key(self, *args):
+        """
+        Results that are cached are read from the primary database: a read
+        replica could return rows from before the table version in the key,
+        and they would be served until the next change to the table.
+
+        :param args: values (other than the query) that the result depends on
+        :returns: the key of the result in the report result cache or ``None``
+            if the result shouldn't be cached
+        """
+        if not self._cache_results:
+            return None
+        return self.get_result_key(*args)
+
+    def get_result_key(self, *args):
+        """
+        Get a key of the result of the query with the current filter values.
+        The key changes whenever the table of the data source changes, so
+        results with the same key are the same.
+
+        :param args: values (other than the query) that the result depends on
+        :returns: the key or ``None`` if changes to the table aren't tracked
+        """
+        if not self._tracks_table_version:
+            return None
+        return get_report_cache_key(
+            self.table_name,
+            self.engine_id,
+            self.lang,
+            self.get_query_strings(),
+            self.filter_values,
+            [column.to_json() for column in self.top_level_columns],
+            args,
+        )
+
     @memoized
     @method_decorator(catch_and_raise_exceptions)
     def get_data(self, start=None, limit=None):
+        cache_key = self._get_result_cache_key('data', start, limit)
+        if cache_key is None:
+            return self._get_formatted_data(start, limit)
+
+        cached = report_result_cache.get(cache_key)
+        if cached is not None:
+            return cached.to_rows()
+
+        with self._reading_from_primary():
+            ret = self._get_formatted_data(start, limit)
+        result = ColumnarResult.from_rows(ret)
+        report_result_cache.set(cache_key, result, result.nbytes)
+        return ret
+
+    def _get_formatted_data(self, start, limit):
         ret = super(ConfigurableReportSqlDataSource, self).get_data(start=start, limit=limit)
 
         for report_column in self.top_level_db_columns:
@@ -75,19 +165,49 @@ class ConfigurableReportSqlDataSource(ConfigurableReportDataSourceMixin, SqlData
     @method_decorator(catch_and_raise_exceptions)
     def get_query_strings(self):
         qc = self.query_context()
-        session_helper = connection_manager.get_session_helper(self.engine_id, readonly=True)
+        session_helper = self._get_session_helper()
         with session_helper.session_context() as session:
             return qc.get_query_strings(session.connection())
 
     @method_decorator(catch_and_raise_exceptions)
     def get_total_records(self):
+        cache_key = self._get_result_cache_key('total_records')
+        if cache_key is None:
+            return self._get_total_records()
+
+        cached = report_result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._reading_from_primary():
+            total_records = self._get_total_records()
+        report_result_cache.set(cache_key, total_records, sys.getsizeof(total_records))
+        return total_records
+
+    def _get_total_records(self):
         qc = self.query_context()
-        session_helper = connection_manager.get_session_helper(self.engine_id, readonly=True)
+        session_helper = self._get_session_helper()
         with session_helper.session_context() as session:
             return qc.count(session.connection(), self.filter_values)
 
     @method_decorator(catch_and_raise_exceptions)
     def get_total_row(self):
+        cache_key = self._get_result_cache_key('total_row')
+        if cache_key is None:
+            return self._get_total_row()
+
+        cached = report_result_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        with self._reading_from_primary():
+            total_row = self._get_total_row()
+        report_result_cache.set(
+            cache_key, tuple(total_row), sum(sys.getsizeof(value) for value in total_row)
+        )
+        return total_row
+
+    def _get_total_row(self):
         def _clean_total_row(val, col):
             if isinstance(val, numbers.Number):
                 return val
@@ -96,7 +216,7 @@ class ConfigurableReportSqlDataSource(ConfigurableReportDataSourceMixin, SqlData
             return ''
 
         qc = self.query_context()
-        session_helper = connection_manager.get_session_helper(self.engine_id, readonly=True)
+        session_helper = self._get_session_helper()
         with session_helper.session_context() as session:
             totals = qc.totals(
                 session.connection(),
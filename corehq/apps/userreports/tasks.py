@@ -32,14 +32,20 @@ from corehq.apps.reports.util import (
     send_report_download_email,
 )
 from corehq.apps.userreports.const import (
+    ASYNC_INDICATOR_BATCH_TARGET_SECONDS,
     ASYNC_INDICATOR_CHUNK_SIZE,
+    ASYNC_INDICATOR_MIN_BATCH_SIZE,
     ASYNC_INDICATOR_QUEUE_TIME,
+    UCR_BUILD_BATCH_SIZE,
     UCR_CELERY_QUEUE,
     UCR_INDICATOR_CELERY_QUEUE,
 )
 from corehq.apps.userreports.exceptions import (
     StaticDataSourceConfigurationNotFoundError,
 )
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+)
 from corehq.apps.userreports.models import (
     AsyncIndicator,
     DataSourceConfiguration,
@@ -47,6 +53,10 @@ from corehq.apps.userreports.models import (
     get_report_config,
     id_is_static,
 )
+from corehq.apps.userreports.parallel_rebuild import (
+    ParallelRebuild,
+    supports_parallel_rebuild,
+)
 from corehq.apps.userreports.rebuild import DataSourceResumeHelper
 from corehq.apps.userreports.reports.data_source import (
     ConfigurableReportDataSource,
@@ -80,14 +90,16 @@ def _get_config_by_id(indicator_config_id):
 def _build_indicators(config, document_store, relevant_ids):
     adapter = get_indicator_adapter(config, raise_errors=True, load_source='build_indicators')
 
-    for doc in document_store.iter_documents(relevant_ids):
-        if config.asynchronous:
+    if config.asynchronous:
+        for doc in document_store.iter_documents(relevant_ids):
             AsyncIndicator.update_record(
                 doc.get('_id'), config.referenced_doc_type, config.domain, [config._id]
             )
-        else:
-            # save is a noop if the filter doesn't match
-            adapter.best_effort_save(doc)
+        return
+
+    # save rows in batches so that large rebuilds can use the bulk (COPY) load path
+    for docs in chunked(document_store.iter_documents(relevant_ids), UCR_BUILD_BATCH_SIZE):
+        adapter.best_effort_bulk_save(docs)
 
 
 @task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True)
@@ -141,6 +153,68 @@ def rebuild_indicators_in_place(indicator_config_id, initiated_by=None, source=N
         _iteratively_build_table(config, in_place=True)
 
 
+@task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True)
+def rebuild_indicators_in_parallel(indicator_config_id, initiated_by=None, source=None):
+    """
+    Rebuild a data source into a shadow table, processing each range of source
+    documents in its own task. See ``corehq.apps.userreports.parallel_rebuild``.
+    """
+    config = _get_config_by_id(indicator_config_id)
+    if not supports_parallel_rebuild(config):
+        rebuild_indicators(indicator_config_id, initiated_by=initiated_by, source=source)
+        return
+
+    if not id_is_static(indicator_config_id):
+        config.meta.build.initiated = datetime.utcnow()
+        config.meta.build.finished = False
+        config.meta.build.rebuilt_asynchronously = False
+        config.save()
+
+    rebuild = ParallelRebuild.start(config, initiated_by=initiated_by, source=source)
+    for range_id in rebuild.get_incomplete_range_ids():
+        process_rebuild_range.delay(indicator_config_id, rebuild.build_id, range_id, initiated_by)
+
+
+@task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True)
+def resume_parallel_rebuild(indicator_config_id, initiated_by=None):
+    config = _get_config_by_id(indicator_config_id)
+    rebuild = ParallelRebuild.get_latest(config)
+    if rebuild is None or rebuild.is_swapped_in():
+        return
+
+    range_ids = rebuild.get_incomplete_range_ids()
+    for range_id in range_ids:
+        process_rebuild_range.delay(indicator_config_id, rebuild.build_id, range_id, initiated_by)
+    if not range_ids:
+        _finish_parallel_rebuild(rebuild, initiated_by)
+
+
+@task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True, acks_late=True)
+def process_rebuild_range(indicator_config_id, build_id, range_id, initiated_by=None):
+    config = _get_config_by_id(indicator_config_id)
+    rebuild = ParallelRebuild(config, build_id)
+    rebuild.process_range(range_id)
+    _finish_parallel_rebuild(rebuild, initiated_by)
+
+
+def _finish_parallel_rebuild(rebuild, initiated_by):
+    config = rebuild.config
+    # only the last range to complete swaps in the new table. The lock is held while the
+    # changes made during the rebuild are replayed, which can take a while
+    with CriticalSection(['ucr-parallel-rebuild-{}'.format(rebuild.build_id)], timeout=60 * 60):
+        if not rebuild.is_complete() or rebuild.is_swapped_in():
+            return
+
+        success = _('Your UCR table {} has finished rebuilding in {}').format(config.table_id, config.domain)
+        failure = _('There was an error rebuilding Your UCR table {} in {}.').format(
+            config.table_id, config.domain
+        )
+        send = toggles.SEND_UCR_REBUILD_INFO.enabled(initiated_by)
+        with notify_someone(initiated_by, success_message=success, error_message=failure, send=send):
+            rebuild.swap_in(initiated_by=initiated_by, source='parallel_rebuild')
+            _mark_build_finished(config)
+
+
 @task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True, acks_late=True)
 def resume_building_indicators(indicator_config_id, initiated_by=None):
     config = _get_config_by_id(indicator_config_id)
@@ -159,7 +233,6 @@ def resume_building_indicators(indicator_config_id, initiated_by=None):
 
 def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-1):
     resume_helper = resume_helper or DataSourceResumeHelper(config)
-    indicator_config_id = config._id
     case_type_or_xmlns_list = config.get_case_type_or_xmlns_filter()
     completed_ct_xmlns = resume_helper.get_completed_case_type_or_xmlns()
     if completed_ct_xmlns:
@@ -191,7 +264,11 @@ def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-
         resume_helper.add_completed_case_type_or_xmlns(case_type_or_xmlns)
 
     resume_helper.clear_resume_info()
-    if not id_is_static(indicator_config_id):
+    _mark_build_finished(config, in_place)
+
+
+def _mark_build_finished(config, in_place=False):
+    if not id_is_static(config._id):
         if in_place:
             config.meta.build.finished_in_place = True
         else:
@@ -343,6 +420,9 @@ def _queue_indicators(indicators):
         build_async_indicators.delay(indicator_doc_ids)
         datadog_counter('commcare.async_indicator.indicators_queued', len(indicator_doc_ids))
 
+    # keep the indicators of the same data sources together so that the
+    # batches of build_async_indicators need as few adapters as possible
+    indicators = sorted(indicators, key=lambda i: sorted(i.indicator_config_ids))
     to_queue = []
     for indicator in indicators:
         to_queue.append(indicator)
@@ -354,15 +434,60 @@ def _queue_indicators(indicators):
         _queue_chunk(to_queue)
 
 
+class AdaptiveBatchSize(object):
+    """
+    Batch size that is adjusted after each batch so that processing a batch takes
+    about ``target_seconds``
+    """
+
+    def __init__(self, initial, minimum, maximum, target_seconds):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+
+    def record(self, batch_size, duration):
+        if not batch_size:
+            return
+        if duration <= 0:
+            target_size = self.maximum
+        else:
+            target_size = self.target_seconds * batch_size / duration
+        # move half way to the target size to smooth out outliers
+        size = int((self.size + target_size) / 2)
+        self.size = max(self.minimum, min(self.maximum, size))
+
+
+# shared by the async indicator tasks of this worker process
+async_indicator_batch_size = AdaptiveBatchSize(
+    initial=ASYNC_INDICATOR_MIN_BATCH_SIZE,
+    minimum=ASYNC_INDICATOR_MIN_BATCH_SIZE,
+    maximum=ASYNC_INDICATOR_CHUNK_SIZE,
+    target_seconds=ASYNC_INDICATOR_BATCH_TARGET_SECONDS,
+)
+
+
 @task(serializer='pickle', queue=UCR_INDICATOR_CELERY_QUEUE, ignore_result=True, acks_late=True)
 def build_async_indicators(indicator_doc_ids):
     # written to be used with _queue_indicators, indicator_doc_ids must
     #   be a chunk of 100
-    for ids in chunked(indicator_doc_ids, 10):
-        _build_async_indicators(ids)
+    adapters_by_config_id = {}
+    remaining_ids = list(indicator_doc_ids)
+    while remaining_ids:
+        batch_size = async_indicator_batch_size.size
+        ids, remaining_ids = remaining_ids[:batch_size], remaining_ids[batch_size:]
+        with TimingContext() as timer:
+            _build_async_indicators(ids, adapters_by_config_id)
+        async_indicator_batch_size.record(len(ids), timer.duration)
 
 
-def _build_async_indicators(indicator_doc_ids):
+def _build_async_indicators(indicator_doc_ids, adapters_by_config_id=None):
+    """
+    :param adapters_by_config_id: adapters that were already loaded by an earlier
+        batch of the same task, by data source ID. A data source that no longer
+        exists is mapped to ``None``. This is updated with the adapters loaded
+        for this batch.
+    """
     def handle_exception(exception, config_id, doc, adapter):
         metric = None
         if isinstance(exception, (ProtocolError, ReadTimeout)):
@@ -388,6 +513,25 @@ def _build_async_indicators(indicator_doc_ids):
         ]
         return set(row['doc_id'] for row in formatted_rows)
 
+    if adapters_by_config_id is None:
+        adapters_by_config_id = {}
+
+    def _get_adapter(config_id):
+        """
+        :returns: the adapter of the data source or ``None`` if it no longer exists
+        """
+        if config_id not in adapters_by_config_id:
+            try:
+                config = _get_config_by_id(config_id)
+            except (ResourceNotFound, StaticDataSourceConfigurationNotFoundError):
+                celery_task_logger.info("{} no longer exists, skipping".format(config_id))
+                adapters_by_config_id[config_id] = None
+            else:
+                adapters_by_config_id[config_id] = get_indicator_adapter(
+                    config, load_source='build_async_indicators'
+                )
+        return adapters_by_config_id[config_id]
+
     # tracks processed/deleted configs to be removed from each indicator
     configs_to_remove_by_indicator_id = defaultdict(list)
 
@@ -407,8 +551,9 @@ def _build_async_indicators(indicator_doc_ids):
         if not all_indicators:
             return
 
+        domain = all_indicators[0].domain
         doc_store = get_document_store_for_doc_type(
-            all_indicators[0].domain, all_indicators[0].doc_type,
+            domain, all_indicators[0].doc_type,
             load_source="build_async_indicators",
         )
         failed_indicators = set()
@@ -418,25 +563,42 @@ def _build_async_indicators(indicator_doc_ids):
         indicator_by_doc_id = {i.doc_id: i for i in all_indicators}
         config_ids = set()
         with timer:
-            for doc in doc_store.iter_documents(list(indicator_by_doc_id.keys())):
+            docs = list(doc_store.iter_documents(list(indicator_by_doc_id.keys())))
+
+            # load the adapters and the related docs that the data sources need up front
+            adapters_by_doc_id = defaultdict(list)
+            docs_by_adapter = defaultdict(list)
+            for doc in docs:
                 indicator = indicator_by_doc_id[doc['_id']]
-                eval_context = EvaluationContext(doc)
                 for config_id in indicator.indicator_config_ids:
                     config_ids.add(config_id)
                     try:
-                        config = _get_config_by_id(config_id)
-                    except (ResourceNotFound, StaticDataSourceConfigurationNotFoundError):
-                        celery_task_logger.info("{} no longer exists, skipping".format(config_id))
-                        # remove because the config no longer exists
-                        _mark_config_to_remove(config_id, [indicator.pk])
-                        continue
+                        adapter = _get_adapter(config_id)
                     except ESError:
                         celery_task_logger.info("ES errored when trying to retrieve config")
                         failed_indicators.add(indicator)
                         continue
-                    adapter = None
+                    except Exception as e:
+                        failed_indicators.add(indicator)
+                        handle_exception(e, config_id, doc, None)
+                        continue
+                    if adapter is None:
+                        # remove because the config no longer exists
+                        _mark_config_to_remove(config_id, [indicator.pk])
+                        continue
+                    adapters_by_doc_id[doc['_id']].append(adapter)
+                    docs_by_adapter[adapter].append(doc)
+
+            related_docs = RelatedDocumentCache(domain, load_source='build_async_indicators')
+            related_docs.prefetch([
+                (adapter.config, adapter_docs) for adapter, adapter_docs in docs_by_adapter.items()
+            ])
+
+            for doc in docs:
+                indicator = indicator_by_doc_id[doc['_id']]
+                eval_context = EvaluationContext(doc, related_docs=related_docs)
+                for adapter in adapters_by_doc_id[doc['_id']]:
                     try:
-                        adapter = get_indicator_adapter(config, load_source='build_async_indicators')
                         rows_to_save = adapter.get_all_values(doc, eval_context)
                         if rows_to_save:
                             rows_to_save_by_adapter[adapter].extend(rows_to_save)
@@ -445,7 +607,7 @@ def _build_async_indicators(indicator_doc_ids):
                         eval_context.reset_iteration()
                     except Exception as e:
                         failed_indicators.add(indicator)
-                        handle_exception(e, config_id, doc, adapter)
+                        handle_exception(e, adapter.config._id, doc, adapter)
 
             for adapter, rows in rows_to_save_by_adapter.items():
                 doc_ids = doc_ids_from_rows(rows)
@@ -453,14 +615,14 @@ def _build_async_indicators(indicator_doc_ids):
                 try:
                     adapter.save_rows(rows)
                 except Exception as e:
-                    failed_indicators.union(indicators)
+                    failed_indicators.update(indicators)
                     message = str(e)
                     notify_exception(None,
                         "Exception bulk saving async indicators:{}".format(message))
                 else:
                     # remove because it's sucessfully processed
                     _mark_config_to_remove(
-                        config_id,
+                        adapter.config._id,
                         [i.pk for i in indicators]
                     )
 
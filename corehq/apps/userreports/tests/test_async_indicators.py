@@ -10,7 +10,10 @@ from corehq.apps.userreports.models import (
     AsyncIndicator,
     DataSourceConfiguration,
 )
-from corehq.apps.userreports.tasks import build_async_indicators
+from corehq.apps.userreports.tasks import (
+    AdaptiveBatchSize,
+    build_async_indicators,
+)
 from corehq.apps.userreports.tests.utils import load_data_from_db
 from corehq.apps.userreports.util import get_indicator_adapter, get_table_name
 
@@ -298,3 +301,28 @@ class BulkAsyncIndicatorProcessingTest(TestCase):
             mock.call('commcare.async_indicator.processed_success', 0),
             mock.call('commcare.async_indicator.processed_fail', 10)
         ])
+
+
+class AdaptiveBatchSizeTest(SimpleTestCase):
+
+    def _batch_size(self):
+        return AdaptiveBatchSize(initial=10, minimum=5, maximum=100, target_seconds=10)
+
+    def test_grows_when_fast(self):
+        batch_size = self._batch_size()
+        batch_size.record(10, 1)
+        self.assertEqual(55, batch_size.size)
+        batch_size.record(55, 1)
+        self.assertEqual(100, batch_size.size)
+
+    def test_shrinks_when_slow(self):
+        batch_size = self._batch_size()
+        batch_size.record(10, 20)
+        self.assertEqual(7, batch_size.size)
+        batch_size.record(7, 100)
+        self.assertEqual(5, batch_size.size)
+
+    def test_empty_batch(self):
+        batch_size = self._batch_size()
+        batch_size.record(0, 0)
+        self.assertEqual(10, batch_size.size)
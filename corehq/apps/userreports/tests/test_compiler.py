@@ -0,0 +1,94 @@
+from django.test import SimpleTestCase
+
+from corehq.apps.userreports.compiler import ExpressionCompiler, is_constant
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.filters.factory import FilterFactory
+from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
+from corehq.apps.userreports.tests.utils import (
+    get_sample_data_source,
+    get_sample_doc_and_indicators,
+)
+from corehq.util.test_utils import generate_cases
+
+
+class CompiledDataSourceTest(SimpleTestCase):
+
+    def setUp(self):
+        self.config = get_sample_data_source()
+
+    def test_same_values(self):
+        doc, _ = get_sample_doc_and_indicators()
+        context = EvaluationContext(doc)
+        expected = [(cv.column.id, cv.value) for cv in self.config.indicators.get_values(doc, context)]
+        compiled = [(cv.column.id, cv.value) for cv in self.config.compiled_indicators.get_values(doc, context)]
+        self.assertEqual(expected, compiled)
+
+    def test_same_columns(self):
+        self.assertEqual(self.config.indicators.get_columns(), self.config.compiled_indicators.get_columns())
+
+    def test_filter(self):
+        doc, _ = get_sample_doc_and_indicators()
+        self.assertTrue(self.config.filter(doc))
+        doc['type'] = 'not-ticket'
+        self.assertFalse(self.config.filter(doc))
+
+
+class ConstantFoldingTest(SimpleTestCase):
+
+    def test_and_with_false_constant(self):
+        compiled = _compile_filter({
+            'type': 'and',
+            'filters': [
+                {'type': 'boolean_expression', 'expression': 1, 'operator': 'eq', 'property_value': 2},
+                {'type': 'boolean_expression', 'expression': {'type': 'property_name', 'property_name': 'a'},
+                 'operator': 'eq', 'property_value': 2},
+            ]
+        })
+        self.assertTrue(is_constant(compiled))
+        self.assertFalse(compiled({'a': 2}))
+
+    def test_conditional_with_constant_test(self):
+        compiled = _compile_expression({
+            'type': 'conditional',
+            'test': {'type': 'not', 'filter': {
+                'type': 'boolean_expression', 'expression': 1, 'operator': 'eq', 'property_value': 2,
+            }},
+            'expression_if_true': {'type': 'property_name', 'property_name': 'a'},
+            'expression_if_false': 'never',
+        })
+        self.assertFalse(is_constant(compiled))
+        self.assertEqual('yes', compiled({'a': 'yes'}))
+
+
+class CompiledExpressionTest(SimpleTestCase):
+    pass
+
+
+@generate_cases([
+    ({'type': 'property_name', 'property_name': 'a'}, {'a': 'x'}),
+    ({'type': 'property_name', 'property_name': 'a', 'datatype': 'integer'}, {'a': '3'}),
+    ({'type': 'property_name', 'property_name': 'a'}, ['not a dict']),
+    ({'type': 'property_path', 'property_path': ['a', 'b']}, {'a': {'b': 'c'}}),
+    ({'type': 'property_path', 'property_path': ['a', 'b']}, {'a': 'not a dict'}),
+    ({'type': 'property_path', 'property_path': ['a', 'b']}, {'a': ['b']}),
+    ({'type': 'property_path', 'property_path': ['a', 'b'], 'datatype': 'date'}, {'a': {'b': '2019-01-01'}}),
+    ({'type': 'switch', 'switch_on': {'type': 'property_name', 'property_name': 'a'},
+      'cases': {'x': 1, 'y': 2}, 'default': 3}, {'a': 'y'}),
+    ({'type': 'switch', 'switch_on': {'type': 'property_name', 'property_name': 'a'},
+      'cases': {'x': 1, 'y': 2}, 'default': 3}, {'a': ['unhashable']}),
+    ({'type': 'coalesce', 'expression': {'type': 'property_name', 'property_name': 'a'},
+      'default_expression': 'default'}, {'a': ''}),
+    ({'type': 'root_doc', 'expression': {'type': 'property_name', 'property_name': 'a'}}, {'a': 'root'}),
+], CompiledExpressionTest)
+def test_compiled_expression_matches(self, spec, doc):
+    expression = ExpressionFactory.from_spec(spec)
+    compiled = ExpressionCompiler().compile_expression(expression)
+    self.assertEqual(expression(doc, EvaluationContext(doc)), compiled(doc, EvaluationContext(doc)))
+
+
+def _compile_filter(spec):
+    return ExpressionCompiler().compile_filter(FilterFactory.from_spec(spec, FactoryContext.empty()))
+
+
+def _compile_expression(spec):
+    return ExpressionCompiler().compile_expression(ExpressionFactory.from_spec(spec, FactoryContext.empty()))
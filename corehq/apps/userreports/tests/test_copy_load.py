@@ -0,0 +1,55 @@
+import datetime
+
+from django.test import SimpleTestCase
+
+from corehq.apps.userreports.const import (
+    UCR_COPY_LOAD_THRESHOLD,
+    UCR_LOAD_MODE_COPY,
+    UCR_LOAD_MODE_INSERT,
+)
+from corehq.apps.userreports.sql.adapter import (
+    IndicatorSqlAdapter,
+    _to_copy_text,
+)
+from corehq.apps.userreports.tests.utils import get_sample_data_source
+from corehq.util.test_utils import generate_cases
+
+
+class CopyTextTest(SimpleTestCase):
+    pass
+
+
+@generate_cases([
+    (None, '\\N'),
+    ('plain', 'plain'),
+    ('tab\tnew\nline\r', 'tab\\tnew\\nline\\r'),
+    ('back\\slash', 'back\\\\slash'),
+    (3, '3'),
+    (1.5, '1.5'),
+    (datetime.date(2020, 1, 2), '2020-01-02'),
+    (datetime.datetime(2020, 1, 2, 3, 4, 5), '2020-01-02T03:04:05'),
+    (['a', None, 'b"c'], '{"a",NULL,"b\\\\"c"}'),
+], CopyTextTest)
+def test_to_copy_text(self, value, expected):
+    self.assertEqual(expected, _to_copy_text(value))
+
+
+class UseCopyTest(SimpleTestCase):
+
+    def setUp(self):
+        self.config = get_sample_data_source()
+        self.adapter = IndicatorSqlAdapter.__new__(IndicatorSqlAdapter)
+        self.adapter.config = self.config
+        self.adapter.session_helper = type('FakeSessionHelper', (), {'is_citus_db': False})()
+
+    def test_auto(self):
+        self.assertFalse(self.adapter._use_copy([None] * (UCR_COPY_LOAD_THRESHOLD - 1)))
+        self.assertTrue(self.adapter._use_copy([None] * UCR_COPY_LOAD_THRESHOLD))
+
+    def test_copy(self):
+        self.config.sql_settings.load_mode = UCR_LOAD_MODE_COPY
+        self.assertTrue(self.adapter._use_copy([None]))
+
+    def test_insert(self):
+        self.config.sql_settings.load_mode = UCR_LOAD_MODE_INSERT
+        self.assertFalse(self.adapter._use_copy([None] * UCR_COPY_LOAD_THRESHOLD))
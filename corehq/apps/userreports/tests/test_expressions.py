@@ -6,13 +6,14 @@ from decimal import Decimal
 from django.test import SimpleTestCase, TestCase, override_settings
 
 from fakecouch import FakeCouchDb
-from mock import MagicMock
+from mock import MagicMock, patch
 from simpleeval import InvalidExpression
 
 from casexml.apps.case.const import CASE_INDEX_EXTENSION
 from casexml.apps.case.mock import CaseFactory, CaseIndex, CaseStructure
 from casexml.apps.case.models import CommCareCase
 from casexml.apps.case.tests.util import delete_all_cases, delete_all_xforms
+from pillowtop.dao.mock import MockDocumentStore
 
 from corehq.apps.groups.models import Group
 from corehq.apps.userreports.decorators import ucr_context_cache
@@ -23,6 +24,11 @@ from corehq.apps.userreports.expressions.specs import (
     PropertyPathGetterSpec,
     eval_statements,
 )
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+    get_related_document,
+)
+from corehq.apps.userreports.models import DataSourceConfiguration
 from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
 from corehq.apps.users.models import CommCareUser
 from corehq.form_processor.interfaces.dbaccessors import FormAccessors
@@ -926,6 +932,76 @@ class RelatedDocExpressionTest(SimpleTestCase):
         self.assertEqual('foo', self.expression(my_doc, context))
 
 
+class RelatedDocumentCacheTest(SimpleTestCase):
+    domain = 'related-doc-cache-domain'
+
+    def setUp(self):
+        self.config = DataSourceConfiguration(
+            domain=self.domain,
+            referenced_doc_type='CommCareCase',
+            table_id='related_docs',
+            configured_filter={},
+            configured_indicators=[{
+                "type": "expression",
+                "column_id": "grandparent_name",
+                "datatype": "string",
+                "expression": {
+                    "type": "related_doc",
+                    "related_doc_type": "CommCareCase",
+                    "doc_id_expression": {"type": "property_name", "property_name": "parent_id"},
+                    "value_expression": {
+                        "type": "related_doc",
+                        "related_doc_type": "CommCareCase",
+                        "doc_id_expression": {"type": "property_name", "property_name": "parent_id"},
+                        "value_expression": {"type": "property_name", "property_name": "name"},
+                    },
+                },
+            }],
+        )
+        self.store = MockDocumentStore({
+            'parent': {'_id': 'parent', 'domain': self.domain, 'parent_id': 'grandparent'},
+            'grandparent': {'_id': 'grandparent', 'domain': self.domain, 'name': 'Granny'},
+            'other-domain': {'_id': 'other-domain', 'domain': 'other', 'name': 'Stranger'},
+        })
+        store_patch = patch('corehq.apps.userreports.expressions.related_docs.get_document_store_for_doc_type',
+                            return_value=self.store)
+        store_patch.start()
+        self.addCleanup(store_patch.stop)
+        fetch_patch = patch('corehq.apps.userreports.expressions.related_docs.get_related_document',
+                            wraps=get_related_document)
+        self.single_fetch = fetch_patch.start()
+        self.addCleanup(fetch_patch.stop)
+
+    def test_related_doc_specs(self):
+        scopes = [(scope, doc_type) for scope, doc_type, _ in self.config.related_doc_id_expressions]
+        self.assertEqual([('root', 'CommCareCase'), ('CommCareCase', 'CommCareCase')], scopes)
+
+    def test_prefetch_nested(self):
+        docs = [
+            {'_id': 'child1', 'domain': self.domain, 'parent_id': 'parent'},
+            {'_id': 'child2', 'domain': self.domain, 'parent_id': 'parent'},
+        ]
+        related_docs = RelatedDocumentCache(self.domain)
+        related_docs.prefetch([(self.config, docs)])
+
+        expression = self.config.indicators.indicators[-1].getter
+        for doc in docs:
+            self.assertEqual('Granny', expression(doc, EvaluationContext(doc, related_docs=related_docs)))
+        self.single_fetch.assert_not_called()
+
+    def test_cross_domain_doc(self):
+        related_docs = RelatedDocumentCache(self.domain)
+        related_docs.bulk_fetch('CommCareCase', ['other-domain'])
+        self.assertIsNone(related_docs.get_document('CommCareCase', 'other-domain'))
+        self.single_fetch.assert_not_called()
+
+    def test_fetch_on_cache_miss(self):
+        related_docs = RelatedDocumentCache(self.domain)
+        self.assertEqual('Granny', related_docs.get_document('CommCareCase', 'grandparent')['name'])
+        self.assertEqual('Granny', related_docs.get_document('CommCareCase', 'grandparent')['name'])
+        self.assertEqual(1, self.single_fetch.call_count)
+
+
 class RelatedDocExpressionDbTest(TestCase):
     domain = 'related-doc-db-test-domain'
 
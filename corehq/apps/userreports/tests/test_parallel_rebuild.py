@@ -0,0 +1,186 @@
+from django.test import SimpleTestCase, TestCase
+
+import mock
+
+from casexml.apps.case.models import CommCareCase
+
+from corehq.apps.change_feed import topics
+from corehq.apps.change_feed.consumer.feed import KafkaChangeFeed
+from corehq.apps.change_feed.producer import producer
+from corehq.apps.userreports import parallel_rebuild
+from corehq.apps.userreports.exceptions import TableRebuildError
+from corehq.apps.userreports.parallel_rebuild import (
+    ParallelRebuild,
+    RebuildRangeCheckpoint,
+    get_shadow_table_name,
+)
+from corehq.apps.userreports.tests.utils import (
+    doc_to_change,
+    get_sample_data_source,
+    get_sample_doc_and_indicators,
+)
+from corehq.apps.userreports.util import get_indicator_adapter
+
+
+class RebuildRangeCheckpointTest(SimpleTestCase):
+
+    def test_wrap(self):
+        checkpoint = RebuildRangeCheckpoint('abc', 'ticket', 'p1', last_pk=10, docs_processed=5)
+        self.assertEqual(checkpoint, RebuildRangeCheckpoint.wrap(checkpoint.to_json()))
+
+    def test_docs_per_second(self):
+        checkpoint = RebuildRangeCheckpoint(
+            'abc', 'ticket', docs_processed=100,
+            started_on='2020-01-01T00:00:00.000000',
+            last_modified='2020-01-01T00:00:10.000000',
+        )
+        self.assertEqual(10, checkpoint.docs_per_second)
+
+    def test_docs_per_second_not_started(self):
+        self.assertIsNone(RebuildRangeCheckpoint('abc', 'ticket').docs_per_second)
+
+
+class ShadowTableNameTest(SimpleTestCase):
+
+    def test_shadow_table_name(self):
+        config = get_sample_data_source()
+        config.table_id = 'a' * 100
+        name = get_shadow_table_name(config, '0123abcd')
+        self.assertTrue(name.endswith('_0123abcd'))
+        # postgres truncates names longer than 63 characters
+        self.assertLessEqual(len('{}_pkey'.format(name)), 63)
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class ParallelRebuildTest(TestCase):
+
+    def setUp(self):
+        super(ParallelRebuildTest, self).setUp()
+        self.config = get_sample_data_source()
+        self.config.save()
+        self.addCleanup(self.config.delete)
+        self.adapter = get_indicator_adapter(self.config)
+        self.adapter.build_table()
+        self.addCleanup(self.adapter.drop_table)
+
+        self.docs = []
+        for owner_id in ['a', 'b', 'c']:
+            doc, _ = get_sample_doc_and_indicators(owner_id=owner_id)
+            CommCareCase.get_db().save_doc(doc)
+            self.addCleanup(self._delete_doc, doc['_id'])
+            self.docs.append(doc)
+
+    def _delete_doc(self, doc_id):
+        db = CommCareCase.get_db()
+        if db.doc_exist(doc_id):
+            db.delete_doc(doc_id)
+
+    def _start(self):
+        rebuild = ParallelRebuild.start(self.config)
+        self.addCleanup(rebuild.shadow_adapter.drop_table)
+        return rebuild
+
+    def _get_owners(self, adapter):
+        return sorted(row.owner for row in adapter.get_query_object())
+
+    def test_process_range(self):
+        rebuild = self._start()
+        [range_id] = rebuild.get_incomplete_range_ids()
+        rebuild.process_range(range_id)
+
+        self.assertTrue(rebuild.is_complete())
+        [checkpoint] = rebuild.get_checkpoints()
+        self.assertEqual(3, checkpoint.docs_processed)
+        self.assertEqual(['a', 'b', 'c'], self._get_owners(rebuild.shadow_adapter))
+        # the data source table isn't changed until the shadow table is swapped in
+        self.assertEqual([], self._get_owners(self.adapter))
+
+    def test_resume(self):
+        rebuild = self._start()
+        [range_id] = rebuild.get_incomplete_range_ids()
+        save_checkpoint = ParallelRebuild._save_checkpoint
+
+        def interrupt(instance, range_id, checkpoint):
+            save_checkpoint(instance, range_id, checkpoint)
+            raise _Interrupted()
+
+        with mock.patch.object(parallel_rebuild, 'ID_CHUNK_SIZE', 1):
+            with mock.patch.object(ParallelRebuild, '_save_checkpoint', interrupt), \
+                    self.assertRaises(_Interrupted):
+                rebuild.process_range(range_id)
+            [checkpoint] = rebuild.get_checkpoints()
+            self.assertEqual(1, checkpoint.docs_processed)
+            self.assertEqual([range_id], rebuild.get_incomplete_range_ids())
+
+            ParallelRebuild.get_latest(self.config).process_range(range_id)
+
+        [checkpoint] = rebuild.get_checkpoints()
+        self.assertTrue(checkpoint.complete)
+        self.assertEqual(3, checkpoint.docs_processed)
+        self.assertEqual(['a', 'b', 'c'], self._get_owners(rebuild.shadow_adapter))
+
+    def _process_and_change_docs(self):
+        rebuild = self._start()
+        [range_id] = rebuild.get_incomplete_range_ids()
+        rebuild.process_range(range_id)
+
+        # changes after the range was processed
+        changed, deleted = self.docs[0], self.docs[1]
+        changed['owner_id'] = 'd'
+        CommCareCase.get_db().save_doc(changed)
+        producer.send_change(topics.CASE, doc_to_change(changed).metadata)
+        CommCareCase.get_db().delete_doc(deleted['_id'])
+        deletion = doc_to_change(deleted).metadata
+        deletion.is_deletion = True
+        producer.send_change(topics.CASE, deletion)
+        return rebuild
+
+    def test_swap_in(self):
+        rebuild = self._process_and_change_docs()
+        rebuild.swap_in()
+
+        self.assertTrue(rebuild.is_swapped_in())
+        self.assertEqual(['c', 'd'], self._get_owners(self.adapter))
+
+    def test_swap_in_feed_stops_early(self):
+        rebuild = self._process_and_change_docs()
+        iter_changes = KafkaChangeFeed.iter_changes
+        calls = []
+
+        def stop_after_first_change(change_feed, since, forever):
+            # the first read times out after a single change
+            calls.append(since)
+            changes = iter_changes(change_feed, since=since, forever=forever)
+            return changes if len(calls) > 1 else iter([next(changes)])
+
+        with mock.patch.object(KafkaChangeFeed, 'iter_changes', stop_after_first_change):
+            rebuild.swap_in()
+
+        self.assertGreater(len(calls), 1)
+        self.assertEqual(['c', 'd'], self._get_owners(self.adapter))
+
+    def test_swap_in_feed_times_out(self):
+        rebuild = self._process_and_change_docs()
+        with mock.patch.object(KafkaChangeFeed, 'iter_changes', return_value=iter([])), \
+                self.assertRaises(TableRebuildError):
+            rebuild.swap_in()
+        self.assertFalse(rebuild.is_swapped_in())
+
+    def test_swap_in_changes_not_retained(self):
+        rebuild = self._process_and_change_docs()
+
+        def beginning_offsets(partitions):
+            return {topic_partition: 10 ** 9 for topic_partition in partitions}
+
+        with mock.patch('kafka.KafkaConsumer.beginning_offsets', side_effect=beginning_offsets), \
+                self.assertRaises(TableRebuildError):
+            rebuild.swap_in()
+        self.assertFalse(rebuild.is_swapped_in())
+
+    def test_swap_in_incomplete(self):
+        rebuild = self._start()
+        with self.assertRaises(AssertionError):
+            rebuild.swap_in()
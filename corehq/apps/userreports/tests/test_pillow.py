@@ -1,4 +1,5 @@
 import decimal
+import multiprocessing
 import uuid
 from datetime import datetime, timedelta
 
@@ -29,6 +30,9 @@ from corehq.apps.userreports.pillow import (
     REBUILD_CHECK_INTERVAL,
     ConfigurableReportPillowProcessor,
     ConfigurableReportTableManagerMixin,
+    DomainChunk,
+    DomainChunkResult,
+    DomainFilterIndex,
 )
 from corehq.apps.userreports.tasks import (
     queue_async_indicators,
@@ -92,6 +96,107 @@ class ConfigurableReportTableManagerTest(SimpleTestCase):
         self.assertTrue(table_manager.needs_bootstrap())
 
 
+class _ConfigListProvider(MockDataSourceProvider):
+
+    def __init__(self, configs):
+        super(_ConfigListProvider, self).__init__()
+        self.configs = configs
+
+    def get_all_data_sources(self):
+        return list(self.configs)
+
+
+@mock.patch('corehq.apps.userreports.pillow.get_indicator_adapter',
+            side_effect=lambda config, **kwargs: mock.MagicMock(config=config))
+class IncrementalBootstrapTest(SimpleTestCase):
+
+    def setUp(self):
+        self.configs = [self._config('a'), self._config('b')]
+        self.provider = _ConfigListProvider(self.configs)
+        self.processor = ConfigurableReportPillowProcessor([self.provider], run_migrations=False)
+
+    @staticmethod
+    def _config(table_id):
+        config = get_sample_data_source()
+        config._id = table_id
+        config.table_id = table_id
+        return config
+
+    def _table_ids(self):
+        return [
+            adapter.config.table_id
+            for adapter in self.processor.table_adapters_by_domain[self.configs[0].domain]
+        ]
+
+    def _rebootstrap(self):
+        self.processor.last_bootstrapped = datetime.utcnow() - timedelta(seconds=REBUILD_CHECK_INTERVAL + 1)
+        self.processor.bootstrap_if_needed()
+
+    def test_unchanged(self, get_indicator_adapter):
+        self.processor.bootstrap()
+        get_indicator_adapter.reset_mock()
+        self._rebootstrap()
+        self.assertEqual(0, get_indicator_adapter.call_count)
+        self.assertEqual(['a', 'b'], self._table_ids())
+
+    def test_changes(self, get_indicator_adapter):
+        self.processor.bootstrap()
+        get_indicator_adapter.reset_mock()
+        changed = self._config('b')
+        changed.display_name = 'changed'
+        self.provider.configs = [changed, self._config('c')]
+        self._rebootstrap()
+        self.assertEqual(
+            ['b', 'c'],
+            sorted(call[0][0].table_id for call in get_indicator_adapter.call_args_list)
+        )
+        self.assertEqual(['b', 'c'], sorted(self._table_ids()))
+        self.assertFalse(self.processor.needs_bootstrap())
+
+
+@mock.patch('corehq.apps.userreports.pillow.get_indicator_adapter',
+            side_effect=lambda config, **kwargs: mock.MagicMock(config=config))
+class DomainPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        config = get_sample_data_source()
+        config._id = 'a'
+        self.domain = config.domain
+        self.processor = ConfigurableReportPillowProcessor(
+            [_ConfigListProvider([config])], run_migrations=False, domain_pool_size=2
+        )
+
+    def _transform_in_pool(self, get_result):
+        self.processor.bootstrap()
+        pool = self.processor._domain_pool = mock.MagicMock()
+        pool.apply_async.return_value.get.side_effect = get_result
+        chunk = DomainChunk(self.domain, [], [], set())
+        with mock.patch.object(self.processor, '_extract_chunk_for_domain', return_value=chunk), \
+                mock.patch.object(self.processor, 'transform_docs_for_domain', return_value='in-process'):
+            return [result for _, result in self.processor._transform_chunks_in_pool({self.domain: []})]
+
+    def test_only_used_for_multiple_domains(self, _):
+        self.processor.bootstrap()
+        self.assertFalse(self.processor._use_domain_pool({self.domain: []}))
+        self.assertTrue(self.processor._use_domain_pool({self.domain: [], 'other': []}))
+
+    def test_worker_result(self, _):
+        self.processor.bootstrap()
+        worker_result = DomainChunkResult({'a': self.processor.data_source_revs['a']})
+        self.assertEqual([worker_result], self._transform_in_pool(lambda timeout: worker_result))
+
+    def test_stale_worker_result(self, _):
+        worker_result = DomainChunkResult({'a': 'stale-rev'})
+        self.assertEqual(['in-process'], self._transform_in_pool(lambda timeout: worker_result))
+
+    def test_worker_error(self, _):
+        self.assertEqual(['in-process'], self._transform_in_pool(Exception('boom')))
+
+    def test_worker_timeout(self, _):
+        self.assertEqual(['in-process'], self._transform_in_pool(multiprocessing.TimeoutError()))
+        self.assertIsNone(self.processor._domain_pool)
+
+
 @override_settings(TESTS_SHOULD_USE_SQL_BACKEND=True)
 class ChunkedUCRProcessorTest(TestCase):
     @classmethod
@@ -810,6 +915,79 @@ class IndicatorConfigFilterTest(SimpleTestCase):
             self.assertTrue(self.config.deleted_filter(document), 'Failing dog: %s' % document)
 
 
+class DomainFilterIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.ticket_adapter = self._adapter('CommCareCase', {
+            'type': 'boolean_expression',
+            'expression': {'type': 'property_name', 'property_name': 'type'},
+            'operator': 'eq',
+            'property_value': 'ticket',
+        })
+        self.bug_adapter = self._adapter('CommCareCase', {
+            'type': 'boolean_expression',
+            'expression': {'type': 'property_name', 'property_name': 'type'},
+            'operator': 'in',
+            'property_value': ['bug', 'ticket'],
+        })
+        self.any_case_adapter = self._adapter('CommCareCase', {})
+        self.form_adapter = self._adapter('XFormInstance', {
+            'type': 'boolean_expression',
+            'expression': {'type': 'property_name', 'property_name': 'xmlns'},
+            'operator': 'eq',
+            'property_value': 'http://example.com/form',
+        })
+        self.index = DomainFilterIndex([
+            self.ticket_adapter, self.bug_adapter, self.any_case_adapter, self.form_adapter
+        ])
+
+    @staticmethod
+    def _adapter(doc_type, configured_filter):
+        config = DataSourceConfiguration(
+            domain='user-reports',
+            referenced_doc_type=doc_type,
+            table_id=uuid.uuid4().hex,
+            configured_filter=configured_filter,
+            configured_indicators=[],
+        )
+        return mock.MagicMock(config=config)
+
+    def test_candidates(self):
+        self.assertEqual(
+            [self.ticket_adapter, self.bug_adapter, self.any_case_adapter],
+            self.index.get_candidates({'doc_type': 'CommCareCase', 'type': 'ticket'})
+        )
+        self.assertEqual(
+            [self.bug_adapter, self.any_case_adapter],
+            self.index.get_candidates({'doc_type': 'CommCareCase', 'type': 'bug'})
+        )
+        self.assertEqual(
+            [self.any_case_adapter],
+            self.index.get_candidates({'doc_type': 'CommCareCase', 'type': 'other'})
+        )
+        self.assertEqual(
+            [self.form_adapter],
+            self.index.get_candidates({'doc_type': 'XFormInstance', 'xmlns': 'http://example.com/form'})
+        )
+        self.assertEqual([], self.index.get_candidates({'doc_type': 'CommCareUser'}))
+
+    def test_candidates_include_all_matching_adapters(self):
+        docs = [
+            {'doc_type': 'CommCareCase', 'domain': 'user-reports', 'type': case_type}
+            for case_type in ('ticket', 'bug', 'other', None)
+        ]
+        for doc in docs:
+            matching = [adapter for adapter in self.index.adapters if adapter.config.filter(doc)]
+            candidates = self.index.get_candidates(doc)
+            self.assertTrue(set(matching) <= set(candidates), doc)
+
+    def test_delete_candidates(self):
+        self.assertEqual(self.index.adapters, self.index.get_delete_candidates(None))
+        self.assertEqual([self.ticket_adapter, self.bug_adapter], self.index.get_delete_candidates('ticket'))
+        self.assertEqual([self.bug_adapter], self.index.get_delete_candidates('bug'))
+        self.assertEqual([], self.index.get_delete_candidates('other'))
+
+
 def _save_sql_case(doc):
     system_props = ['_id', '_rev', 'opened_on', 'owner_id', 'doc_type', 'domain', 'type']
     with drop_connected_signals(case_post_save):
@@ -0,0 +1,84 @@
+from django.test import SimpleTestCase
+
+from corehq.apps.userreports.compiler import ExpressionCompiler
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.profiling import (
+    DataSourceProfile,
+    get_node_label,
+)
+from corehq.apps.userreports.specs import EvaluationContext
+from corehq.apps.userreports.tests.utils import (
+    get_sample_data_source,
+    get_sample_doc_and_indicators,
+)
+
+
+class DataSourceProfileTest(SimpleTestCase):
+
+    def test_profiled_values(self):
+        doc, _ = get_sample_doc_and_indicators()
+        expected = _get_values(get_sample_data_source(), doc)
+
+        config = get_sample_data_source()
+        profile = config.enable_profiling()
+        self.assertEqual(expected, _get_values(config, doc))
+        for column in config.get_columns():
+            self.assertEqual(1, profile.stats['column:{}'.format(column.id)].calls)
+
+    def test_self_time(self):
+        profile = DataSourceProfile()
+        expression = ExpressionFactory.from_spec({
+            'type': 'conditional',
+            'test': {
+                'type': 'boolean_expression',
+                'expression': {'type': 'property_name', 'property_name': 'a'},
+                'operator': 'eq',
+                'property_value': 'x',
+            },
+            'expression_if_true': {'type': 'property_path', 'property_path': ['b', 'c']},
+            'expression_if_false': 'no',
+        })
+        compiled = ExpressionCompiler(profile=profile).compile_expression(expression)
+        doc = {'a': 'x', 'b': {'c': 'yes'}}
+        self.assertEqual('yes', compiled(doc, EvaluationContext(doc)))
+
+        conditional = profile.stats['conditional']
+        self.assertEqual(1, conditional.calls)
+        self.assertEqual(1, profile.stats['property_path:b/c'].calls)
+        self.assertEqual(1, profile.stats['property_name:a'].calls)
+        self.assertLessEqual(conditional.self_time, conditional.cumulative_time)
+        self.assertAlmostEqual(
+            conditional.cumulative_time,
+            sum(stats.self_time for stats in profile.stats.values()),
+        )
+
+    def test_format_report(self):
+        profile = DataSourceProfile('abc')
+        profile.wrap(lambda item, context: item, 'identity')(1)
+        profile.add_related_doc_fetches({'CommCareCase': 2})
+        report = profile.format_report()
+        self.assertIn('identity', report)
+        self.assertIn('CommCareCase: 2', report)
+
+
+class NodeLabelTest(SimpleTestCase):
+
+    def test_property_name(self):
+        expression = ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'a'})
+        self.assertEqual('property_name:a', get_node_label(expression))
+
+    def test_related_doc(self):
+        expression = ExpressionFactory.from_spec({
+            'type': 'related_doc',
+            'related_doc_type': 'CommCareUser',
+            'doc_id_expression': {'type': 'property_name', 'property_name': 'user_id'},
+            'value_expression': {'type': 'property_name', 'property_name': 'username'},
+        })
+        self.assertEqual('related_doc:CommCareUser', get_node_label(expression))
+
+
+def _get_values(config, doc):
+    return [
+        [(column_value.column.id, column_value.value) for column_value in row]
+        for row in config.get_all_values(doc)
+    ]
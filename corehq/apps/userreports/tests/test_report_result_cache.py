@@ -0,0 +1,131 @@
+from array import array
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+import mock
+
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.reports.cache import (
+    ColumnarResult,
+    ReportResultCache,
+    bump_table_version,
+    get_report_cache_key,
+    get_table_version,
+)
+from corehq.apps.userreports.sql.data_source import (
+    ConfigurableReportSqlDataSource,
+)
+from corehq.util.test_utils import flag_disabled, flag_enabled
+
+
+class ColumnarResultTest(SimpleTestCase):
+
+    def test_round_trip(self):
+        rows = [
+            {'owner': 'a', 'count': 3, 'avg': 1.5, 'total': Decimal('2.5')},
+            {'owner': 'b', 'count': 4, 'avg': 2.5, 'total': None},
+        ]
+        self.assertEqual(rows, ColumnarResult.from_rows(rows).to_rows())
+
+    def test_missing_keys(self):
+        rows = [{'a': 1}, {'b': 2}]
+        self.assertEqual(rows, ColumnarResult.from_rows(rows).to_rows())
+
+    def test_numeric_columns_are_arrays(self):
+        result = ColumnarResult.from_rows([{'count': 1, 'avg': 1.5, 'name': 'a'}])
+        columns = dict(zip(result.keys, result.columns))
+        self.assertIsInstance(columns['count'], array)
+        self.assertIsInstance(columns['avg'], array)
+        self.assertIsInstance(columns['name'], tuple)
+
+    def test_mixed_columns_keep_types(self):
+        rows = [{'value': 1}, {'value': True}, {'value': 2 ** 70}]
+        self.assertEqual(
+            [int, bool, int],
+            [type(row['value']) for row in ColumnarResult.from_rows(rows).to_rows()]
+        )
+
+
+class ReportResultCacheTest(SimpleTestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = ReportResultCache(max_bytes=10)
+        cache.set('a', 'a', 4)
+        cache.set('b', 'b', 4)
+        cache.get('a')
+        cache.set('c', 'c', 4)
+        self.assertEqual('a', cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('c', cache.get('c'))
+        self.assertEqual(8, cache.size)
+
+    def test_too_large(self):
+        cache = ReportResultCache(max_bytes=10)
+        cache.set('a', 'a', 11)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_replace(self):
+        cache = ReportResultCache(max_bytes=10)
+        cache.set('a', 'a', 4)
+        cache.set('a', 'b', 6)
+        self.assertEqual('b', cache.get('a'))
+        self.assertEqual(6, cache.size)
+
+
+@mock.patch('corehq.apps.userreports.reports.cache.cache', caches['locmem'])
+class TableVersionTest(SimpleTestCase):
+
+    def test_bump_changes_cache_key(self):
+        key = get_report_cache_key('table', 'query')
+        self.assertEqual(key, get_report_cache_key('table', 'query'))
+        bump_table_version('table')
+        self.assertNotEqual(key, get_report_cache_key('table', 'query'))
+
+    def test_tables_are_independent(self):
+        version = get_table_version('table_a')
+        bump_table_version('table_b')
+        self.assertEqual(version, get_table_version('table_a'))
+
+    def test_no_cache_key_without_version(self):
+        with mock.patch('corehq.apps.userreports.reports.cache.cache', caches['dummy']):
+            self.assertIsNone(get_report_cache_key('table', 'query'))
+
+
+@flag_enabled('UCR_REPORT_RESULT_CACHE')
+@mock.patch('corehq.apps.userreports.reports.cache.cache', caches['locmem'])
+@mock.patch('corehq.apps.userreports.sql.data_source.report_result_cache', ReportResultCache(max_bytes=10000))
+@mock.patch.object(ConfigurableReportSqlDataSource, 'get_query_strings', return_value=['query'])
+class ReportResultCacheReadsTest(SimpleTestCase):
+
+    def setUp(self):
+        caches['locmem'].clear()
+        self.config = DataSourceConfiguration(
+            domain='domain', table_id='table', referenced_doc_type='CommCareCase')
+        # the primary has the rows of the last write but the read replica doesn't yet
+        self.rows = {True: [{'count': 2}], False: [{'count': 1}]}
+
+    def _get_data_source(self):
+        return ConfigurableReportSqlDataSource('domain', self.config, [], [], [], [])
+
+    def _get_data(self):
+        data_source = self._get_data_source()
+
+        def _get_formatted_data(start, limit):
+            return self.rows[data_source._read_from_primary]
+
+        with mock.patch.object(data_source, '_get_formatted_data', side_effect=_get_formatted_data):
+            return data_source.get_data()
+
+    def test_cached_rows_read_from_primary(self, *_):
+        bump_table_version(self._get_data_source().table_name)
+        self.assertEqual([{'count': 2}], self._get_data())
+        # the rows are cached for the new table version and the stale replica isn't read
+        self.rows = {}
+        self.assertEqual([{'count': 2}], self._get_data())
+
+    def test_not_cached_reads_from_replica(self, *_):
+        with flag_disabled('UCR_REPORT_RESULT_CACHE'):
+            self.assertEqual([{'count': 1}], self._get_data())
@@ -129,7 +129,7 @@ def number_of_ucr_reports(domain):
     return len(ucr_reports)
 
 
-def get_indicator_adapter(config, raise_errors=False, load_source="unknown"):
+def get_indicator_adapter(config, raise_errors=False, load_source="unknown", override_table_name=None):
     from corehq.apps.userreports.sql.adapter import IndicatorSqlAdapter, ErrorRaisingIndicatorSqlAdapter, \
         MultiDBSqlAdapter, ErrorRaisingMultiDBAdapter
     requires_mirroring = config.mirrored_engine_ids
@@ -137,7 +137,7 @@ def get_indicator_adapter(config, raise_errors=False, load_source="unknown"):
         adapter_cls = ErrorRaisingMultiDBAdapter if raise_errors else MultiDBSqlAdapter
     else:
         adapter_cls = ErrorRaisingIndicatorSqlAdapter if raise_errors else IndicatorSqlAdapter
-    adapter = adapter_cls(config)
+    adapter = adapter_cls(config, override_table_name=override_table_name)
     track_load = ucr_load_counter(config.engine_id, load_source, config.domain)
     return IndicatorAdapterLoadTracker(adapter, track_load)
 
@@ -75,6 +75,7 @@ from corehq.apps.userreports.app_manager.helpers import (
     get_case_data_source,
     get_form_data_source,
 )
+from corehq.apps.userreports.compiler import ExpressionCompiler
 from corehq.apps.userreports.const import (
     DATA_SOURCE_MISSING_APP_ERROR_MESSAGE,
     DATA_SOURCE_NOT_FOUND_ERROR_MESSAGE,
@@ -105,6 +106,10 @@ from corehq.apps.userreports.models import (
     id_is_static,
     report_config_id_is_static,
 )
+from corehq.apps.userreports.profiling import (
+    DataSourceProfile,
+    profile_data_source,
+)
 from corehq.apps.userreports.rebuild import DataSourceResumeHelper
 from corehq.apps.userreports.reports.builder.forms import (
     ConfigureListReportForm,
@@ -895,6 +900,14 @@ def evaluate_expression(request, domain):
             expression_json,
             context=factory_context
         )
+        if request.POST.get('profile'):
+            profile = DataSourceProfile(data_source_id or None)
+            compiled_expression = ExpressionCompiler(profile=profile).compile_expression(parsed_expression)
+            result = compiled_expression(doc, EvaluationContext(doc))
+            return json_response({
+                "result": result,
+                "profile": profile.to_json(),
+            })
         result = parsed_expression(doc, EvaluationContext(doc))
         return json_response({
             "result": result,
@@ -960,6 +973,8 @@ def evaluate_data_source(request, domain):
             column.database_column_name.decode() for column in data_source.get_columns()
         ],
     }
+    if request.POST.get('profile'):
+        data['profile'] = profile_data_source(data_source, document_store.iter_documents(docs_id)).to_json()
 
     try:
         adapter = get_indicator_adapter(data_source)
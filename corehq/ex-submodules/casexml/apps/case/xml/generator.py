@@ -195,7 +195,7 @@ class V2CaseXMLGenerator(CaseXMLGeneratorBase):
             element.append(index_elem)
 
     def add_attachments(self, element):
-        if _sync_attachments(self.case.domain):
+        if should_sync_attachments(self.case.domain):
             if self.case.case_attachments:
                 attachment_elem = safe_element("attachment")
                 for k, a in self.case.case_attachments.items():
@@ -213,7 +213,7 @@ class V2CaseXMLGenerator(CaseXMLGeneratorBase):
             skip_arg=lambda _: settings.UNIT_TESTING,
             memoize_timeout=12 * 60 * 60,
             timeout=12 * 60 * 60)
-def _sync_attachments(domain):
+def should_sync_attachments(domain):
     return MM_CASE_PROPERTIES.enabled(domain)
 
 
@@ -0,0 +1,244 @@
+"""
+Restore benchmarks
+
+Generates synthetic domains with configurable case graph shapes and replays
+initial and incremental restores against them, recording per phase timings
+(from the restore ``TimingContext``), SQL query counts, peak memory and
+payload size of each restore. The results are plain dicts that can be
+serialized as JSON and compared between builds.
+
+This writes to the database and is meant to be run against a local test
+database (see the ``restore_benchmark`` management command).
+"""
+import random
+import re
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from itertools import islice
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from casexml.apps.case.const import CASE_INDEX_EXTENSION
+from casexml.apps.case.mock import CaseFactory, CaseIndex, CaseStructure
+from casexml.apps.case.xml import V2
+from casexml.apps.phone.restore import (
+    RestoreCacheSettings,
+    RestoreConfig,
+    RestoreParams,
+)
+from corehq.apps.domain.models import Domain
+from corehq.apps.groups.models import Group
+from corehq.apps.users.models import CommCareUser
+from corehq.apps.users.util import format_username
+
+CASE_TYPE = 'benchmark'
+FORM_BATCH_SIZE = 100
+
+
+def extension_chains(count, size, owner_id):
+    """`count` chains of `size` cases, each case an extension of the previous one
+
+    The last extension in each chain is owned by `owner_id`, which makes
+    the whole chain live.
+    """
+    structures = []
+    for _ in range(count):
+        structure = CaseStructure(attrs={'owner_id': '-', 'create': True})
+        for _ in range(size - 1):
+            structure = CaseStructure(
+                attrs={'owner_id': '-', 'create': True},
+                indices=[CaseIndex(structure, relationship=CASE_INDEX_EXTENSION)],
+            )
+        structure.attrs['owner_id'] = owner_id
+        structures.append(structure)
+    return structures
+
+
+def wide_parents(count, size, owner_id):
+    """`count` parent cases with `size` child cases each"""
+    structures = []
+    for _ in range(count):
+        parent = CaseStructure(attrs={'owner_id': owner_id, 'create': True})
+        structures.append(parent)
+        structures.extend(
+            CaseStructure(
+                attrs={'owner_id': owner_id, 'create': True},
+                indices=[CaseIndex(parent)],
+                walk_related=False,
+            )
+            for _ in range(size)
+        )
+    return structures
+
+
+SHAPES = {
+    'extension_chains': extension_chains,
+    'wide_parents': wide_parents,
+    # cases owned by a case sharing group with all users of the domain
+    'shared_owner': wide_parents,
+}
+
+
+def parse_shape(spec):
+    """Parse a shape spec of the form `<shape>:<count>x<size>`
+
+    :returns: A three-tuple: `(shape, count, size)`
+    """
+    match = re.match(r'^(\w+):(\d+)x(\d+)$', spec)
+    if not match or match.group(1) not in SHAPES:
+        raise ValueError("Bad shape: {!r}. Expected <shape>:<count>x<size> with shape in {}".format(
+            spec, ', '.join(sorted(SHAPES))))
+    return match.group(1), int(match.group(2)), int(match.group(3))
+
+
+def create_benchmark_domain(domain, num_users, shapes):
+    """Create a SQL domain with users and their cases
+
+    :param shapes: list of `(shape, count, size)` three-tuples. Each user
+    gets the cases of every shape except `shared_owner`, which are created
+    once and owned by a case sharing group with all users.
+    :returns: A two-tuple: `(project, users)`
+    """
+    if Domain.get_by_name(domain) is not None:
+        raise ValueError("Domain already exists: {}".format(domain))
+    project = Domain.get_or_create_with_name(
+        domain, is_active=True, secure_submissions=False, use_sql_backend=True)
+    users = [
+        CommCareUser.create(domain, format_username('user{}'.format(i), domain), uuid.uuid4().hex)
+        for i in range(num_users)
+    ]
+    group = Group(
+        domain=domain,
+        name='benchmark',
+        case_sharing=True,
+        users=[user.user_id for user in users],
+    )
+    group.save()
+
+    for shape, count, size in shapes:
+        if shape == 'shared_owner':
+            _create_cases(domain, users[0].user_id, SHAPES[shape](count, size, group._id))
+        else:
+            for user in users:
+                _create_cases(domain, user.user_id, SHAPES[shape](count, size, user.user_id))
+    return project, users
+
+
+def _create_cases(domain, user_id, structures):
+    factory = CaseFactory(domain, case_defaults={
+        'user_id': user_id,
+        'case_type': CASE_TYPE,
+    })
+    # create related cases before the cases that index them
+    blocks = (block
+              for structure in structures
+              for block in reversed(factory.get_case_blocks([structure])))
+    while True:
+        batch = list(islice(blocks, FORM_BATCH_SIZE))
+        if not batch:
+            break
+        factory.post_case_blocks(batch, user_id=user_id)
+
+
+def modify_cases(domain, user_id, case_ids, fraction, seed=None):
+    """Update a random `fraction` of the given cases
+
+    :returns: list of modified case ids.
+    """
+    case_ids = sorted(case_ids)
+    count = int(round(len(case_ids) * fraction))
+    modified = random.Random(seed).sample(case_ids, min(count, len(case_ids)))
+    factory = CaseFactory(domain, case_defaults={'user_id': user_id})
+    for start in range(0, len(modified), FORM_BATCH_SIZE):
+        factory.post_case_blocks([
+            factory.get_case_block(case_id, update={'benchmark_run': uuid.uuid4().hex})
+            for case_id in modified[start:start + FORM_BATCH_SIZE]
+        ], user_id=user_id)
+    return modified
+
+
+def run_restore(project, couch_user, case_sync, sync_log_id='', trace_memory=True):
+    """Run a single uncached restore
+
+    :returns: A two-tuple: `(result, sync_log)`. `result` is a dict
+    that can be serialized as JSON.
+    """
+    config = RestoreConfig(
+        project=project,
+        restore_user=couch_user.to_ota_restore_user(),
+        params=RestoreParams(sync_log_id=sync_log_id, version=V2),
+        cache_settings=RestoreCacheSettings(overwrite_cache=True),
+        case_sync=case_sync,
+    )
+    with ExitStack() as stack:
+        queries = {
+            connection.alias: stack.enter_context(CaptureQueriesContext(connection))
+            for connection in connections.all()
+        }
+        if trace_memory:
+            tracemalloc.start()
+            stack.callback(tracemalloc.stop)
+        with config.timing_context:
+            payload = config.get_payload()
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+
+    fileobj = payload.as_file()
+    try:
+        fileobj.seek(0, 2)
+        payload_size = fileobj.tell()
+    finally:
+        fileobj.close()
+
+    sync_log = config.restore_state.current_sync_log
+    queries_by_database = {alias: len(context) for alias, context in queries.items() if len(context)}
+    return {
+        'user': couch_user.raw_username,
+        'case_sync': case_sync,
+        'restore': 'incremental' if sync_log_id else 'initial',
+        'duration': config.timing_context.duration,
+        'phases': get_phase_durations(config.timing_context),
+        'queries': sum(queries_by_database.values()),
+        'queries_by_database': queries_by_database,
+        'peak_memory': peak_memory,
+        'payload_size': payload_size,
+        'cases': len(sync_log.case_ids_on_phone),
+    }, sync_log
+
+
+def get_phase_durations(timing_context):
+    """Get the total duration of each named phase of a restore
+
+    Counts are stripped from timer names (e.g. `"get_related_indices(3
+    cases, 0 seen)"` -> `"get_related_indices"`) so the phases of
+    different restores can be compared.
+    """
+    durations = {}
+    for timer in timing_context.to_list(exclude_root=True):
+        name = re.sub(r'\s*\(.*\)$', '', timer.name)
+        durations[name] = durations.get(name, 0) + timer.duration
+    return durations
+
+
+def run_benchmark(project, users, case_sync, incremental_syncs=1, modify_fraction=0.1,
+                  trace_memory=True, seed=None):
+    """Replay an initial restore followed by incremental restores for each user
+
+    A random fraction of each user's cases is modified before each
+    incremental restore.
+
+    :returns: generator of result dicts (see `run_restore`).
+    """
+    for user in users:
+        result, sync_log = run_restore(project, user, case_sync, trace_memory=trace_memory)
+        result['sequence'] = 0
+        yield result
+        for sequence in range(1, incremental_syncs + 1):
+            modified = modify_cases(
+                project.name, user.user_id, sync_log.case_ids_on_phone, modify_fraction, seed)
+            result, sync_log = run_restore(
+                project, user, case_sync, sync_log._id, trace_memory=trace_memory)
+            result['sequence'] = sequence
+            result['modified_cases'] = len(modified)
+            yield result
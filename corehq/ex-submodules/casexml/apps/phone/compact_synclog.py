@@ -0,0 +1,271 @@
+"""
+Compact storage format of the case state of ``SimplifiedSyncLog`` documents.
+
+The case state of a sync log (the case ids on the phone, the dependent and
+closed case ids and the two index trees) is stored as JSON in ``SyncLogSQL``,
+which repeats every case id up to four times. A compact document replaces
+these fields with a single ``compact_state`` string:
+
+- every case id is stored once in an id table (UUID case ids as 16 bytes)
+- the case id sets are sorted lists of positions in the table, stored as
+  the differences between consecutive positions
+- the index trees are lists of ``[case, [[identifier, referenced case], ...]]``
+  with cases as positions in the table
+
+and the result is compressed.
+
+A sync log can also be stored as a delta over a full compact sync log of the
+same chain (its *base*), in which case ``compact_state`` only contains the
+case ids that were added to or removed from each set and the index trees of
+the cases whose indices changed. The hash of the compact state of the base
+is stored with the delta, so a delta is never applied to a base that has
+changed since.
+
+The case state is expanded when the sync log is loaded, so the sync log
+itself works the same with either format.
+"""
+import base64
+import hashlib
+import json
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+COMPACT_FORMAT_VERSION = 1
+CASE_ID_SETS = ['case_ids_on_phone', 'dependent_case_ids_on_phone', 'closed_cases']
+INDEX_TREES = ['index_tree', 'extension_index_tree']
+
+# deltas are only stored over recent bases, which are still around when
+# the delta is loaded
+SYNC_LOG_DELTA_MAX_BASE_AGE = timedelta(days=7)
+# a delta is only stored when it is at most this fraction of the full state
+SYNC_LOG_DELTA_MAX_RATIO = 0.5
+
+# The full compact state of a sync log that other sync logs can be stored as deltas over
+DeltaBase = namedtuple('DeltaBase', 'synclog_id date compact_state')
+
+
+def is_compact_sync_log_doc(doc):
+    return 'compact_state' in doc
+
+
+def compact_sync_log_doc(doc, delta_base=None):
+    """Replace the case state of a sync log doc with its compact form
+
+    :param doc: sync log doc (as returned by ``SimplifiedSyncLog.to_json``).
+    :param delta_base: ``DeltaBase`` to store the case state as a delta over
+    if that is smaller than the full state.
+    :returns: the compact doc.
+    """
+    doc = dict(doc)
+    state = _pop_case_state(doc)
+    if delta_base is not None and datetime.utcnow() - delta_base.date <= SYNC_LOG_DELTA_MAX_BASE_AGE:
+        delta = _get_delta(_decode(delta_base.compact_state), state)
+        if _size(delta) <= _size(state) * SYNC_LOG_DELTA_MAX_RATIO:
+            doc['compact_state'] = _encode(delta)
+            doc['compact_base_id'] = delta_base.synclog_id
+            doc['compact_base_hash'] = _hash(delta_base.compact_state)
+            return doc
+    doc['compact_state'] = _encode(state)
+    return doc
+
+
+def expand_sync_log_doc(doc, get_delta_base):
+    """Restore the case state of a compact sync log doc
+
+    :param get_delta_base: function to get the ``DeltaBase`` of a delta by
+    sync log id, or ``None`` if it does not exist (see ``get_delta_base``).
+    :returns: A two-tuple: ``(doc, delta_base)`` with the expanded doc and
+    the ``DeltaBase`` the doc is stored over, or ``None`` if it was stored
+    in full.
+    :raises: ``ValueError`` if the base of the delta is missing or changed.
+    """
+    doc = dict(doc)
+    compact_state = doc.pop('compact_state')
+    base_id = doc.pop('compact_base_id', None)
+    base_hash = doc.pop('compact_base_hash', None)
+    delta_base = None
+    if base_id is None:
+        state = _decode(compact_state)
+    else:
+        delta_base = get_delta_base(base_id)
+        if delta_base is None or _hash(delta_base.compact_state) != base_hash:
+            raise ValueError("Base {} of sync log {} is missing or changed".format(base_id, doc.get('_id')))
+        state = _apply_delta(_decode(delta_base.compact_state), _decode(compact_state))
+    for name in CASE_ID_SETS:
+        doc[name] = sorted(state['sets'][name])
+    for name in INDEX_TREES:
+        doc[name] = dict(doc.get(name) or {}, indices=state['trees'][name])
+    return doc, delta_base
+
+
+def get_delta_base(synclog_id, date, doc):
+    """
+    :returns: the ``DeltaBase`` of a full compact sync log doc or ``None``
+    if the doc is not a full compact doc.
+    """
+    if not is_compact_sync_log_doc(doc) or 'compact_base_id' in doc:
+        return None
+    return DeltaBase(synclog_id, date, doc['compact_state'])
+
+
+def _pop_case_state(doc):
+    sets = {name: set(doc.pop(name, None) or []) for name in CASE_ID_SETS}
+    trees = {}
+    for name in INDEX_TREES:
+        tree = dict(doc.get(name) or {})
+        trees[name] = tree.pop('indices', None) or {}
+        doc[name] = tree
+    return {'sets': sets, 'trees': trees}
+
+
+def _get_delta(base, state):
+    sets = {}
+    for name in CASE_ID_SETS:
+        sets[name + '+'] = state['sets'][name] - base['sets'][name]
+        sets[name + '-'] = base['sets'][name] - state['sets'][name]
+    trees = {}
+    for name in INDEX_TREES:
+        old, new = base['trees'][name], state['trees'][name]
+        trees[name] = {
+            case_id: new.get(case_id, {})
+            for case_id in set(old) | set(new)
+            if old.get(case_id, {}) != new.get(case_id, {})
+        }
+    return {'sets': sets, 'trees': trees}
+
+
+def _apply_delta(base, delta):
+    sets = {
+        name: (base['sets'][name] - delta['sets'][name + '-']) | delta['sets'][name + '+']
+        for name in CASE_ID_SETS
+    }
+    trees = {}
+    for name in INDEX_TREES:
+        tree = dict(base['trees'][name])
+        for case_id, indices in delta['trees'][name].items():
+            if indices:
+                tree[case_id] = indices
+            else:
+                tree.pop(case_id, None)
+        trees[name] = tree
+    return {'sets': sets, 'trees': trees}
+
+
+def _size(state):
+    return (sum(len(ids) for ids in state['sets'].values())
+            + sum(len(tree) for tree in state['trees'].values()))
+
+
+def _hash(compact_state):
+    return hashlib.sha1(compact_state.encode('ascii')).hexdigest()
+
+
+def _encode(state):
+    ids = _IdTable.from_state(state)
+    data = {
+        'v': COMPACT_FORMAT_VERSION,
+        'uuids': base64.b64encode(b''.join(uuid.UUID(id_).bytes for id_ in ids.uuids)).decode('ascii'),
+        'hex_uuids': base64.b64encode(b''.join(uuid.UUID(id_).bytes for id_ in ids.hex_uuids)).decode('ascii'),
+        'other_ids': ids.other_ids,
+        'sets': {
+            name: _to_differences(sorted(ids.positions[id_] for id_ in case_ids))
+            for name, case_ids in state['sets'].items()
+        },
+        'trees': {
+            name: [
+                [ids.positions[case_id], [
+                    [identifier, ids.positions[referenced_id]]
+                    for identifier, referenced_id in sorted(indices.items())
+                ]]
+                for case_id, indices in sorted(tree.items())
+            ]
+            for name, tree in state['trees'].items()
+        },
+    }
+    return base64.b64encode(zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))).decode('ascii')
+
+
+def _decode(compact_state):
+    data = json.loads(zlib.decompress(base64.b64decode(compact_state)).decode('utf-8'))
+    if data['v'] != COMPACT_FORMAT_VERSION:
+        raise ValueError("Unknown compact sync log version: {}".format(data['v']))
+    ids = (
+        _uuids_from_bytes(base64.b64decode(data['uuids']), lambda value: str(value))
+        + _uuids_from_bytes(base64.b64decode(data['hex_uuids']), lambda value: value.hex)
+        + data['other_ids']
+    )
+    return {
+        'sets': {
+            name: {ids[position] for position in _from_differences(differences)}
+            for name, differences in data['sets'].items()
+        },
+        'trees': {
+            name: {
+                ids[case_position]: {
+                    identifier: ids[referenced_position]
+                    for identifier, referenced_position in indices
+                }
+                for case_position, indices in tree
+            }
+            for name, tree in data['trees'].items()
+        },
+    }
+
+
+class _IdTable(object):
+    """All case ids of a case state, with UUIDs that can be stored as bytes separate"""
+
+    def __init__(self, case_ids):
+        self.uuids = []
+        self.hex_uuids = []
+        self.other_ids = []
+        for case_id in sorted(case_ids):
+            try:
+                value = uuid.UUID(case_id)
+            except (ValueError, TypeError, AttributeError):
+                value = None
+            if value is not None and str(value) == case_id:
+                self.uuids.append(case_id)
+            elif value is not None and value.hex == case_id:
+                self.hex_uuids.append(case_id)
+            else:
+                self.other_ids.append(case_id)
+        self.positions = {
+            case_id: position
+            for position, case_id in enumerate(self.uuids + self.hex_uuids + self.other_ids)
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        case_ids = set()
+        for ids in state['sets'].values():
+            case_ids.update(ids)
+        for tree in state['trees'].values():
+            for case_id, indices in tree.items():
+                case_ids.add(case_id)
+                case_ids.update(indices.values())
+        return cls(case_ids)
+
+
+def _uuids_from_bytes(value, to_string):
+    return [to_string(uuid.UUID(bytes=value[i:i + 16])) for i in range(0, len(value), 16)]
+
+
+def _to_differences(positions):
+    previous = 0
+    differences = []
+    for position in positions:
+        differences.append(position - previous)
+        previous = position
+    return differences
+
+
+def _from_differences(differences):
+    position = 0
+    positions = []
+    for difference in differences:
+        position += difference
+        positions.append(position)
+    return positions
@@ -0,0 +1,294 @@
+"""
+Persisted footprint of the case graph read by livequery sync.
+
+``do_livequery`` walks the graph of cases related to the cases owned by the
+user one level of indices at a time. On a large footprint most of the
+restore is spent on these queries even when only a few cases changed since
+the last sync.
+
+The footprint records every answer to the graph queries of a livequery
+restore (the indices related to each case and the closed/deleted status of
+each case) and is stored on the sync log. The next livequery restore first
+finds the cases that changed since the footprint was recorded:
+
+- cases in the footprint that were modified (or deleted) since then
+- cases that are not in the footprint and have a new index to a case in it
+
+and only reads the indices and status of those cases from the database. The
+rest of the graph queries are answered from the footprint, so livequery runs
+the same algorithm on the same answers as a full restore, and the database
+is only queried for the parts of the graph that are not in the footprint
+(e.g. newly owned cases).
+
+Any change to the indices or the closed/deleted status of a case updates its
+``server_modified_on``, which is what the changes are found with.
+"""
+import base64
+import json
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from casexml.apps.phone.models import LOG_FORMAT_LIVEQUERY
+from corehq.form_processor.models import CommCareCaseIndexSQL
+from corehq.form_processor.utils import should_use_sql_backend
+from corehq.toggles import LIVEQUERY_CASE_GRAPH_FOOTPRINT
+
+# Cases modified shortly before a footprint is recorded may be committed
+# after they are read, so they are treated as changed on the next sync.
+FOOTPRINT_CLOCK_MARGIN = timedelta(minutes=5)
+
+_CLOSED = 1
+_DELETED = 2
+_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def get_case_graph_accessor(timing_context, restore_state, accessor):
+    """Get the accessor to build the livequery case graph with
+
+    :returns: ``accessor`` or a ``FootprintCaseAccessor`` wrapping it
+    """
+    if not (LIVEQUERY_CASE_GRAPH_FOOTPRINT.enabled(restore_state.domain)
+            and should_use_sql_backend(restore_state.domain)):
+        return accessor
+    date = datetime.utcnow() - FOOTPRINT_CLOCK_MARGIN
+    previous = _get_previous_footprint(restore_state.last_sync_log)
+    if previous is not None:
+        with timing_context("refresh_case_graph_footprint"):
+            previous.refresh(accessor)
+    return FootprintCaseAccessor(accessor, CaseGraphFootprint(date), previous)
+
+
+def save_case_graph_footprint(restore_state, accessor):
+    if isinstance(accessor, FootprintCaseAccessor):
+        restore_state.current_sync_log.livequery_footprint = accessor.footprint.to_string()
+
+
+def _get_previous_footprint(sync_log):
+    if (sync_log is None
+            or sync_log.log_format != LOG_FORMAT_LIVEQUERY
+            or not sync_log.livequery_footprint):
+        return None
+    try:
+        return CaseGraphFootprint.from_string(sync_log.livequery_footprint)
+    except (ValueError, KeyError, zlib.error):
+        return None
+
+
+class CaseGraphFootprint(object):
+    """The answers to the case graph queries of a livequery restore
+
+    :param date: Cases modified before this date have not changed
+    since the answers were read.
+    """
+
+    def __init__(self, date, related_ids=(), indices=(), status=None):
+        self.date = date
+        # ids of the cases whose related indices are all in `indices`
+        self.related_ids = set(related_ids)
+        # '<index.case_id> <index.identifier>' -> index fields
+        self.indices = {}
+        for index in indices:
+            self._add_index(index)
+        # case_id -> closed/deleted flags
+        self.status = status or {}
+        self._lookups = None
+
+    @classmethod
+    def from_string(cls, value):
+        data = json.loads(zlib.decompress(base64.b64decode(value)).decode('utf-8'))
+        return cls(
+            datetime.strptime(data['date'], _DATE_FORMAT),
+            data['related_ids'],
+            [tuple(index) for index in data['indices']],
+            data['status'],
+        )
+
+    def to_string(self):
+        data = json.dumps({
+            'date': self.date.strftime(_DATE_FORMAT),
+            'related_ids': sorted(self.related_ids),
+            'indices': list(self.indices.values()),
+            'status': self.status,
+        })
+        return base64.b64encode(zlib.compress(data.encode('utf-8'))).decode('ascii')
+
+    def refresh(self, accessor):
+        """Replace the parts of the footprint that changed since it was recorded
+
+        Updates the footprint date to the time of the refresh.
+
+        :returns: set of ids of the cases that changed.
+        """
+        date = datetime.utcnow() - FOOTPRINT_CLOCK_MARGIN
+        known_ids = self.related_ids | set(self.status) | {
+            index[0] for index in self.indices.values()}
+        modified_dates = accessor.get_last_modified_dates(list(known_ids)) if known_ids else {}
+        changed_ids = {
+            case_id for case_id in known_ids
+            if not modified_dates.get(case_id) or modified_dates[case_id] >= self.date
+        }
+
+        # cases that are not in the footprint don't have a modified date to
+        # check, but if they have a new index to a case in the footprint the
+        # index will not be excluded
+        unchanged_ids = list(self.related_ids - changed_ids)
+        if unchanged_ids:
+            new_indices = accessor.get_related_indices(unchanged_ids, set(self.indices))
+            changed_ids.update(index.case_id for index in new_indices)
+
+        if changed_ids:
+            self.related_ids -= changed_ids
+            self.indices = {key: index for key, index in self.indices.items()
+                            if index[0] not in changed_ids}
+            for case_id in changed_ids:
+                self.status.pop(case_id, None)
+            ids = list(changed_ids)
+            for index in accessor.get_related_indices(ids, set()):
+                self._add_index(_index_fields(index))
+            self.related_ids.update(changed_ids)
+            self._set_status(ids, accessor.get_closed_and_deleted_ids(ids))
+
+        # open extension cases are returned with the indices of their hosts
+        unknown_ids = list({
+            index[0] for index in self.indices.values()
+            if index[4] == CommCareCaseIndexSQL.EXTENSION and index[0] not in self.status
+        })
+        if unknown_ids:
+            self._set_status(unknown_ids, accessor.get_closed_and_deleted_ids(unknown_ids))
+
+        self.date = date
+        self._lookups = None
+        return changed_ids
+
+    def get_related_indices(self, domain, case_ids, exclude_indices):
+        """Same as ``CaseAccessors.get_related_indices``
+
+        All ``case_ids`` must be in ``related_ids``.
+        """
+        indices_by_case_id, extension_indices_by_host_id = self._get_lookups()
+        result = {}
+        for case_id in case_ids:
+            for key in indices_by_case_id[case_id]:
+                result[key] = self.indices[key]
+            for key in extension_indices_by_host_id[case_id]:
+                index = self.indices[key]
+                if not self.status.get(index[0]):
+                    result[key] = index
+        return [_make_index(domain, result[key]) for key in result if key not in exclude_indices]
+
+    def get_closed_and_deleted_ids(self, case_ids):
+        """Same as ``CaseAccessors.get_closed_and_deleted_ids``
+
+        All ``case_ids`` must be in ``status``.
+        """
+        return [
+            (case_id, bool(self.status[case_id] & _CLOSED), bool(self.status[case_id] & _DELETED))
+            for case_id in case_ids
+            if self.status[case_id]
+        ]
+
+    def record_related_indices(self, case_ids, indices):
+        self.related_ids.update(case_ids)
+        case_ids = set(case_ids)
+        for index in indices:
+            self._add_index(_index_fields(index))
+            if (index.relationship_id == CommCareCaseIndexSQL.EXTENSION
+                    and index.case_id not in case_ids
+                    and index.referenced_id in case_ids):
+                # returned as the open extension of a host
+                self.status.setdefault(index.case_id, 0)
+
+    def record_closed_and_deleted_ids(self, case_ids, rows):
+        self._set_status(case_ids, rows)
+
+    def _set_status(self, case_ids, rows):
+        for case_id in case_ids:
+            self.status[case_id] = 0
+        for case_id, closed, deleted in rows:
+            self.status[case_id] = (_CLOSED if closed else 0) | (_DELETED if deleted else 0)
+
+    def _add_index(self, index):
+        self.indices['{} {}'.format(index[0], index[1])] = index
+
+    def _get_lookups(self):
+        """:returns: ``(index keys by case_id, extension index keys by host id)``"""
+        if self._lookups is None:
+            by_case_id = defaultdict(list)
+            extensions_by_host_id = defaultdict(list)
+            for key, index in self.indices.items():
+                by_case_id[index[0]].append(key)
+                if index[4] == CommCareCaseIndexSQL.EXTENSION:
+                    extensions_by_host_id[index[2]].append(key)
+            self._lookups = by_case_id, extensions_by_host_id
+        return self._lookups
+
+
+def _index_fields(index):
+    return (
+        index.case_id,
+        index.identifier,
+        index.referenced_id,
+        index.referenced_type,
+        index.relationship_id,
+    )
+
+
+def _make_index(domain, fields):
+    case_id, identifier, referenced_id, referenced_type, relationship_id = fields
+    return CommCareCaseIndexSQL(
+        domain=domain,
+        case_id=case_id,
+        identifier=identifier,
+        referenced_id=referenced_id,
+        referenced_type=referenced_type,
+        relationship_id=relationship_id,
+    )
+
+
+class FootprintCaseAccessor(object):
+    """Case accessor for the livequery case graph queries
+
+    Records the answers to the queries in a new footprint and answers
+    them from the previous (refreshed) footprint where it can.
+    """
+
+    def __init__(self, accessor, footprint, previous=None):
+        self.domain = accessor.domain
+        self.accessor = accessor
+        self.footprint = footprint
+        self.previous = previous
+
+    def get_case_ids_by_owners(self, owner_ids, closed=None):
+        return self.accessor.get_case_ids_by_owners(owner_ids, closed=closed)
+
+    def get_related_indices(self, case_ids, exclude_indices):
+        known_ids, unknown_ids = self._split(case_ids, 'related_ids')
+        indices = {}
+        if known_ids:
+            for index in self.previous.get_related_indices(self.domain, known_ids, exclude_indices):
+                indices[(index.case_id, index.identifier)] = index
+        if unknown_ids:
+            for index in self.accessor.get_related_indices(unknown_ids, exclude_indices):
+                indices[(index.case_id, index.identifier)] = index
+        indices = list(indices.values())
+        self.footprint.record_related_indices(case_ids, indices)
+        return indices
+
+    def get_closed_and_deleted_ids(self, case_ids):
+        known_ids, unknown_ids = self._split(case_ids, 'status')
+        rows = []
+        if known_ids:
+            rows.extend(self.previous.get_closed_and_deleted_ids(known_ids))
+        if unknown_ids:
+            rows.extend(self.accessor.get_closed_and_deleted_ids(unknown_ids))
+        self.footprint.record_closed_and_deleted_ids(case_ids, rows)
+        return rows
+
+    def _split(self, case_ids, attr):
+        if self.previous is None:
+            return [], list(case_ids)
+        known = getattr(self.previous, attr)
+        known_ids = [case_id for case_id in case_ids if case_id in known]
+        unknown_ids = [case_id for case_id in case_ids if case_id not in known]
+        return known_ids, unknown_ids
@@ -28,15 +28,27 @@ from itertools import chain, islice
 
 from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
 from casexml.apps.phone.const import ASYNC_RETRY_AFTER
-from casexml.apps.phone.data_providers.case.load_testing import (
-    get_xml_for_response,
+from casexml.apps.phone.data_providers.case.footprint import (
+    get_case_graph_accessor,
+    save_case_graph_footprint,
+)
+from casexml.apps.phone.data_providers.case.prefetch import (
+    CaseBatch,
+    RestoreCaseLoader,
 )
 from casexml.apps.phone.data_providers.case.stock import get_stock_payload
 from casexml.apps.phone.data_providers.case.utils import get_case_sync_updates
+from casexml.apps.phone.data_providers.case.xml_cache import (
+    get_xml_for_updates,
+)
 from casexml.apps.phone.tasks import ASYNC_RESTORE_SENT
 from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
 from corehq.sql_db.routers import read_from_plproxy_standbys
-from corehq.toggles import LIVEQUERY_READ_FROM_STANDBYS, NAMESPACE_USER
+from corehq.toggles import (
+    LIVEQUERY_READ_FROM_STANDBYS,
+    NAMESPACE_USER,
+    RESTORE_CASE_BATCH_PREFETCH,
+)
 from corehq.util.datadog.utils import case_load_counter
 
 
@@ -60,6 +72,48 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
     the `restore_state.current_sync_log` and progress of `async_task`.
     Extends `response` with restore elements.
     """
+    debug = logging.getLogger(__name__).debug
+    accessor = CaseAccessors(restore_state.domain)
+    owner_ids = list(restore_state.owner_ids)
+
+    debug("sync %s for %r", restore_state.current_sync_log._id, owner_ids)
+    with timing_context("livequery"):
+        graph_accessor = get_case_graph_accessor(timing_context, restore_state, accessor)
+        live_ids, indices = get_live_case_ids_and_indices(timing_context, graph_accessor, owner_ids)
+        save_case_graph_footprint(restore_state, graph_accessor)
+
+        if restore_state.last_sync_log:
+            with timing_context("discard_already_synced_cases"):
+                debug('last sync: %s', restore_state.last_sync_log._id)
+                sync_ids = discard_already_synced_cases(
+                    live_ids, restore_state, accessor)
+        else:
+            sync_ids = live_ids
+        restore_state.current_sync_log.case_ids_on_phone = live_ids
+
+        with timing_context("compile_response(%s cases)" % len(sync_ids)):
+            if RESTORE_CASE_BATCH_PREFETCH.enabled(restore_state.domain):
+                iaccessor = RestoreCaseLoader(restore_state, accessor, indices)
+            else:
+                iaccessor = PrefetchIndexCaseAccessor(accessor, indices)
+            compile_response(
+                timing_context,
+                restore_state,
+                response,
+                batch_cases(iaccessor, sync_ids),
+                init_progress(async_task, len(sync_ids)),
+            )
+
+
+def get_live_case_ids_and_indices(timing_context, accessor, owner_ids):
+    """Get the live case graph of the given owners
+
+    :param accessor: ``CaseAccessors`` or an object with the same case
+    graph query methods.
+    :returns: A two-tuple: set of live case ids and dict of
+    `case_id -> list of CommCareCaseIndex-like` of the indices of all
+    cases in the graph.
+    """
     def index_key(index):
         return '{} {}'.format(index.case_id, index.identifier)
 
@@ -197,7 +251,6 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
 
     IGNORE = object()
     debug = logging.getLogger(__name__).debug
-    accessor = CaseAccessors(restore_state.domain)
 
     # case graph data structures
     live_ids = set()
@@ -207,67 +260,47 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
     parents_by_child = defaultdict(set)    # child_id -> parent_ids
     indices = defaultdict(list)  # case_id -> list of CommCareCaseIndex-like
     seen_ix = defaultdict(set)   # case_id -> set of '<index.case_id> <index.identifier>'
-    owner_ids = list(restore_state.owner_ids)
 
-    debug("sync %s for %r", restore_state.current_sync_log._id, owner_ids)
-    with timing_context("livequery"):
-        with timing_context("get_case_ids_by_owners"):
-            owned_ids = accessor.get_case_ids_by_owners(owner_ids, closed=False)
-            debug("owned: %r", owned_ids)
-
-        next_ids = all_ids = set(owned_ids)
-        owned_ids = set(owned_ids)  # owned, open case ids (may be extensions)
-        open_ids = set(owned_ids)
-        while next_ids:
-            exclude = set(chain.from_iterable(seen_ix[id] for id in next_ids))
-            with timing_context("get_related_indices({} cases, {} seen)".format(
-                    len(next_ids), len(exclude))):
-                related = accessor.get_related_indices(list(next_ids), exclude)
-                if not related:
-                    break
-                update_open_and_deleted_ids(related)
-                next_ids = {classify(index, next_ids)
-                    for index in related
-                    if index.referenced_id not in deleted_ids
-                        and index.case_id not in deleted_ids}
-                next_ids.discard(IGNORE)
-                all_ids.update(next_ids)
-                debug('next: %r', next_ids)
-
-        with timing_context("enliven open roots (%s cases)" % len(open_ids)):
-            debug('open: %r', open_ids)
-            # owned, open, not an extension -> live
-            for case_id in owned_ids:
-                if not is_extension(case_id):
-                    enliven(case_id)
-
-            # available case with live extension -> live
-            for case_id in open_ids:
-                if (case_id not in live_ids
-                        and not is_extension(case_id)
-                        and has_live_extension(case_id)):
-                    enliven(case_id)
-
-            debug('live: %r', live_ids)
-
-        if restore_state.last_sync_log:
-            with timing_context("discard_already_synced_cases"):
-                debug('last sync: %s', restore_state.last_sync_log._id)
-                sync_ids = discard_already_synced_cases(
-                    live_ids, restore_state, accessor)
-        else:
-            sync_ids = live_ids
-        restore_state.current_sync_log.case_ids_on_phone = live_ids
-
-        with timing_context("compile_response(%s cases)" % len(sync_ids)):
-            iaccessor = PrefetchIndexCaseAccessor(accessor, indices)
-            compile_response(
-                timing_context,
-                restore_state,
-                response,
-                batch_cases(iaccessor, sync_ids),
-                init_progress(async_task, len(sync_ids)),
-            )
+    with timing_context("get_case_ids_by_owners"):
+        owned_ids = accessor.get_case_ids_by_owners(owner_ids, closed=False)
+        debug("owned: %r", owned_ids)
+
+    next_ids = all_ids = set(owned_ids)
+    owned_ids = set(owned_ids)  # owned, open case ids (may be extensions)
+    open_ids = set(owned_ids)
+    while next_ids:
+        exclude = set(chain.from_iterable(seen_ix[id] for id in next_ids))
+        with timing_context("get_related_indices({} cases, {} seen)".format(
+                len(next_ids), len(exclude))):
+            related = accessor.get_related_indices(list(next_ids), exclude)
+            if not related:
+                break
+            update_open_and_deleted_ids(related)
+            next_ids = {classify(index, next_ids)
+                for index in related
+                if index.referenced_id not in deleted_ids
+                    and index.case_id not in deleted_ids}
+            next_ids.discard(IGNORE)
+            all_ids.update(next_ids)
+            debug('next: %r', next_ids)
+
+    with timing_context("enliven open roots (%s cases)" % len(open_ids)):
+        debug('open: %r', open_ids)
+        # owned, open, not an extension -> live
+        for case_id in owned_ids:
+            if not is_extension(case_id):
+                enliven(case_id)
+
+        # available case with live extension -> live
+        for case_id in open_ids:
+            if (case_id not in live_ids
+                    and not is_extension(case_id)
+                    and has_live_extension(case_id)):
+                enliven(case_id)
+
+        debug('live: %r', live_ids)
+
+    return live_ids, indices
 
 
 def discard_already_synced_cases(live_ids, restore_state, accessor):
@@ -299,6 +332,9 @@ class PrefetchIndexCaseAccessor(object):
             for ix in self.indices[case_id]]
         return self.accessor.get_cases(case_ids, **kw)
 
+    def get_case_batch(self, case_ids):
+        return CaseBatch(self.get_cases(case_ids), None)
+
 
 def batch_cases(accessor, case_ids):
     def take(n, iterable):
@@ -312,7 +348,7 @@ def batch_cases(accessor, case_ids):
         if not next_ids:
             break
         track_load(len(next_ids))
-        yield accessor.get_cases(next_ids)
+        yield accessor.get_case_batch(next_ids)
 
 
 def init_progress(async_task, total):
@@ -335,12 +371,13 @@ def init_progress(async_task, total):
 
 def compile_response(timing_context, restore_state, response, batches, update_progress):
     done = 0
-    for cases in batches:
+    for cases, ledgers in batches:
         with timing_context("get_stock_payload"):
             response.extend(get_stock_payload(
                 restore_state.project,
                 restore_state.stock_settings,
                 cases,
+                ledgers,
             ))
 
         with timing_context("get_case_sync_updates (%s cases)" % len(cases)):
@@ -348,9 +385,7 @@ def compile_response(timing_context, restore_state, response, batches, update_pr
                 restore_state.domain, cases, restore_state.last_sync_log)
 
         with timing_context("get_xml_for_response (%s updates)" % len(updates)):
-            response.extend(item
-                for update in updates
-                for item in get_xml_for_response(update, restore_state))
+            response.extend(get_xml_for_updates(updates, restore_state))
 
         done += len(cases)
         update_progress(done)
@@ -0,0 +1,73 @@
+"""
+Batch loading of the cases synced by a restore.
+
+The case blocks of a restore need the indices and (with the
+MM_CASE_PROPERTIES toggle) the attachments of each case, and the stock
+payload needs the ledger values of the cases. Loaded lazily by the case
+objects these take a query per case. ``RestoreCaseLoader`` loads them for a
+whole batch of cases at once:
+
+- the cases (one plproxy query)
+- their indices (one plproxy query, or none if they were loaded with the
+  live case graph)
+- their attachments (one query per shard database)
+- their ledger values (one plproxy query)
+
+The indices and attachments are attached to the cases the same way
+``CaseAccessorSQL.get_cases`` attaches prefetched indices, so the case XML
+is generated from the loaded data without further queries.
+"""
+from collections import defaultdict, namedtuple
+
+from casexml.apps.phone.data_providers.case.stock import uses_ledgers
+from corehq.form_processor.backends.sql.dbaccessors import CaseAccessorSQL
+from corehq.form_processor.interfaces.dbaccessors import LedgerAccessors
+from corehq.form_processor.utils.general import should_use_sql_backend
+from corehq.toggles import MM_CASE_PROPERTIES
+
+# `ledgers` is the current ledger state of the cases (see
+# `LedgerAccessors.get_current_ledger_state`) or `None` if it wasn't loaded
+CaseBatch = namedtuple('CaseBatch', 'cases ledgers')
+
+
+class RestoreCaseLoader(object):
+    """Loads batches of cases with their indices, attachments and ledgers
+
+    :param accessor: ``CaseAccessors`` of the restore domain.
+    :param indices: optional dict of ``case_id -> list of indices`` with
+    the indices of all cases that will be loaded.
+    """
+
+    def __init__(self, restore_state, accessor, indices=None):
+        self.domain = accessor.domain
+        self.accessor = accessor
+        self.indices = indices
+        self.is_sql = should_use_sql_backend(self.domain)
+        self.load_attachments = self.is_sql and MM_CASE_PROPERTIES.enabled(self.domain)
+        self.load_ledgers = uses_ledgers(restore_state.project)
+
+    def get_case_batch(self, case_ids):
+        if self.is_sql:
+            cases = self._get_sql_cases(case_ids)
+        else:
+            # couch cases are loaded with their indices and attachments
+            cases = self.accessor.get_cases(case_ids)
+        ledgers = None
+        if self.load_ledgers:
+            ledgers = LedgerAccessors(self.domain).get_current_ledger_state([case.case_id for case in cases])
+        return CaseBatch(cases, ledgers)
+
+    def _get_sql_cases(self, case_ids):
+        if self.indices is not None:
+            indices = [index for case_id in case_ids for index in self.indices[case_id]]
+        else:
+            indices = CaseAccessorSQL.get_indices_for_cases(self.domain, case_ids)
+        cases = CaseAccessorSQL.get_cases(case_ids, prefetched_indices=indices)
+
+        if self.load_attachments:
+            attachments = defaultdict(list)
+            for attachment in CaseAccessorSQL.get_attachments_for_cases(case_ids):
+                attachments[attachment.case_id].append(attachment)
+            for case in cases:
+                case._attachments_list = attachments[case.case_id]
+        return cases
@@ -12,28 +12,39 @@ from casexml.apps.stock.consumption import compute_default_monthly_consumption,
 from casexml.apps.stock.const import COMMTRACK_REPORT_XMLNS
 
 
-def get_stock_payload(project, stock_settings, case_stub_list):
-    uses_ledgers = project.commtrack_enabled or toggles.NON_COMMTRACK_LEDGERS.enabled(project.name)
-    if project and not uses_ledgers:
+def uses_ledgers(project):
+    return project.commtrack_enabled or toggles.NON_COMMTRACK_LEDGERS.enabled(project.name)
+
+
+def get_stock_payload(project, stock_settings, case_stub_list, ledgers=None):
+    """
+    :param ledgers: the current ledger state of the cases if it was already
+    loaded (see ``LedgerAccessors.get_current_ledger_state``).
+    """
+    if project and not uses_ledgers(project):
         return
 
-    generator = StockPayloadGenerator(project.name, stock_settings, case_stub_list)
+    generator = StockPayloadGenerator(project.name, stock_settings, case_stub_list, ledgers)
     for section in generator.yield_sections():
         yield section
 
 
 class StockPayloadGenerator(object):
-    def __init__(self, domain_name, stock_settings, case_stub_list):
+    def __init__(self, domain_name, stock_settings, case_stub_list, ledgers=None):
         self.domain_name = domain_name
         self.stock_settings = stock_settings
         self.case_stub_list = case_stub_list
+        self.ledgers = ledgers
 
         from lxml.builder import ElementMaker
         self.elem_maker = ElementMaker(namespace=COMMTRACK_REPORT_XMLNS)
 
     def yield_sections(self):
-        case_ids = [case.case_id for case in self.case_stub_list]
-        all_current_ledgers = LedgerAccessors(self.domain_name).get_current_ledger_state(case_ids)
+        if self.ledgers is not None:
+            all_current_ledgers = self.ledgers
+        else:
+            case_ids = [case.case_id for case in self.case_stub_list]
+            all_current_ledgers = LedgerAccessors(self.domain_name).get_current_ledger_state(case_ids)
         for case_stub in self.case_stub_list:
             case_id = case_stub.case_id
             case_ledgers = all_current_ledgers[case_id]
@@ -63,7 +74,8 @@ class StockPayloadGenerator(object):
                 if self.stock_settings.default_product_list:
                     for product_id in self.stock_settings.default_product_list:
                         state = current_section_sate.get(product_id, None)
-                        if not state:
+                        # loaded ledger state has all ledger values of the case
+                        if not state and self.ledgers is None:
                             try:
                                 state = LedgerAccessors(self.domain_name).get_ledger_value(
                                     case_id, section_id, product_id
@@ -0,0 +1,83 @@
+"""
+Cache of the serialized case blocks of restore payloads.
+
+A case block only depends on the case, the updates that are synced (create,
+update, close), the restore version and whether case attachments are synced
+(the MM_CASE_PROPERTIES toggle), so the serialized block can be reused
+by every restore that syncs the same version of the case. This saves building
+and serializing the XML of cases that are shared by many users (e.g. the cases
+of a location).
+
+Blocks are keyed on the case ID, the time the case was last modified on the
+server and (for couch cases) the revision, so a modified case never uses an
+older block. Blocks of old versions of a case are no longer requested and
+expire or are evicted by the cache when it runs out of memory.
+"""
+import hashlib
+
+from casexml.apps.case.xml.generator import should_sync_attachments
+from casexml.apps.phone.data_providers.case.load_testing import (
+    get_xml_for_response,
+)
+from casexml.apps.phone.xml import get_case_element, tostring
+from corehq.toggles import RESTORE_CASE_XML_CACHE
+from corehq.util.datadog.gauges import datadog_counter
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
+
+CASE_XML_CACHE_TIMEOUT = 24 * 60 * 60
+# larger blocks are not cached
+CASE_XML_CACHE_MAX_BYTES = 64 * 1024
+
+
+def get_case_xml_cache_key(case, required_updates, version, sync_attachments):
+    """
+    :param sync_attachments: whether the block includes the attachments of
+        the case (see ``should_sync_attachments``)
+    :returns: the key of the case block or ``None`` if it can't be cached
+    """
+    if not case.server_modified_on:
+        return None
+    case_version = '{} {}'.format(case.server_modified_on.isoformat(), getattr(case, '_rev', None) or '')
+    return 'restore-case-xml:{}:{}:{}:{}:{}'.format(
+        case.case_id,
+        version,
+        ','.join(sorted(required_updates)),
+        int(bool(sync_attachments)),
+        hashlib.md5(case_version.encode('utf-8')).hexdigest(),
+    )
+
+
+def get_xml_for_updates(updates, restore_state):
+    """
+    :param updates: list of ``CaseSyncUpdate`` objects
+    :returns: list of the serialized case blocks of the updates
+    """
+    if restore_state.loadtest_factor > 1 or not RESTORE_CASE_XML_CACHE.enabled(restore_state.domain):
+        return [
+            item
+            for update in updates
+            for item in get_xml_for_response(update, restore_state)
+        ]
+
+    sync_attachments = should_sync_attachments(restore_state.domain)
+    keys = [
+        get_case_xml_cache_key(update.case, update.required_updates, restore_state.version, sync_attachments)
+        for update in updates
+    ]
+    cache = get_redis_default_cache()
+    cached = cache.get_many([key for key in keys if key is not None])
+    items = []
+    to_cache = {}
+    for key, update in zip(keys, updates):
+        xml = cached.get(key)
+        if xml is None:
+            xml = tostring(get_case_element(update.case, update.required_updates, restore_state.version))
+            if key is not None and len(xml) <= CASE_XML_CACHE_MAX_BYTES:
+                to_cache[key] = xml
+        items.append(xml)
+
+    if to_cache:
+        cache.set_many(to_cache, timeout=CASE_XML_CACHE_TIMEOUT)
+    datadog_counter('commcare.restores.case_xml_cache.hits', len(cached))
+    datadog_counter('commcare.restores.case_xml_cache.misses', len(updates) - len(cached))
+    return items
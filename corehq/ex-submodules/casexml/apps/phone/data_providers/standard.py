@@ -1,5 +1,15 @@
+from django.db import connections
+
+from gevent.monkey import is_module_patched
+from gevent.pool import Pool
+
 from casexml.apps.phone import xml
 from casexml.apps.phone.fixtures import generator
+from corehq.toggles import PARALLEL_RESTORE_FIXTURES
+from corehq.util.timer import NestableTimer
+
+# maximum number of fixture providers run concurrently by a restore
+FIXTURE_POOL_SIZE = 4
 
 
 class TimedProvider(object):
@@ -56,8 +66,39 @@ class FixtureElementProvider(RestoreDataProvider):
             restore_state.restore_user,
             version=restore_state.version,
         )
+        # greenlets only run concurrently when blocking I/O is patched
+        # (e.g. in gunicorn gevent workers but not in celery or tests)
+        if PARALLEL_RESTORE_FIXTURES.enabled(restore_state.domain) and is_module_patched('threading'):
+            for element in self.get_elements_in_pool(providers, restore_state):
+                yield element
+            return
         for provider in providers:
             with self.timing_context('fixture:{}'.format(provider.id)):
                 elements = provider(restore_state)
                 for element in elements:
                     yield element
+
+    def get_elements_in_pool(self, providers, restore_state, pool_size=FIXTURE_POOL_SIZE):
+        """Run the fixture providers concurrently in a pool of greenlets
+
+        Elements are yielded in the same order as they are when the
+        providers are run one after another.
+        """
+        def get_fixtures(provider):
+            timer = NestableTimer('fixture:{}'.format(provider.id), is_root=False)
+            timer.start()
+            try:
+                return timer, list(provider(restore_state))
+            finally:
+                timer.stop()
+                # database connections are local to each greenlet
+                connections.close_all()
+
+        pool = Pool(pool_size)
+        try:
+            for timer, elements in pool.imap(get_fixtures, providers):
+                self.timing_context.peek().append(timer)
+                for element in elements:
+                    yield element
+        finally:
+            pool.kill()
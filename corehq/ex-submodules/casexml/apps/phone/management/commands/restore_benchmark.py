@@ -0,0 +1,78 @@
+import json
+import sys
+import uuid
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.core.management.base import CommandError
+
+from casexml.apps.phone.benchmark import (
+    create_benchmark_domain,
+    parse_shape,
+    run_benchmark,
+)
+from casexml.apps.phone.const import CLEAN_OWNERS, LIVEQUERY
+
+
+class Command(BaseCommand):
+    """
+    Benchmark restores on a synthetic domain and print the results of each
+    restore as a line of JSON.
+
+    This creates a domain with users and cases, so it can only be run
+    with DEBUG enabled (e.g. against a local test database).
+
+    Usage:
+        ./manage.py restore_benchmark --shape extension_chains:100x5 \\
+            --shape wide_parents:20x50 --shape shared_owner:10x10 \\
+            --users 2 --incremental 3 --label my-branch > results.jsonl
+    """
+    help = "Benchmark initial and incremental restores on a synthetic domain"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shape', dest='shapes', action='append', default=[],
+                            help="Case graph shape <shape>:<count>x<size>. Can be repeated.")
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--case-sync', choices=[LIVEQUERY, CLEAN_OWNERS], default=LIVEQUERY)
+        parser.add_argument('--incremental', type=int, default=1,
+                            help="Number of incremental restores after the initial restore of each user.")
+        parser.add_argument('--modify', type=float, default=0.1,
+                            help="Fraction of cases to modify before each incremental restore.")
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--no-memory', action='store_true', default=False,
+                            help="Don't trace memory allocations (they slow the restore down).")
+        parser.add_argument('--label', default='',
+                            help="Label added to each result, e.g. the name of the build.")
+        parser.add_argument('--keep', action='store_true', default=False,
+                            help="Don't delete the benchmark domain afterwards.")
+
+    def handle(self, shapes, users, case_sync, incremental, modify, seed, no_memory, label, keep, **options):
+        if not settings.DEBUG:
+            raise CommandError("This command creates a domain and should only be run locally with DEBUG=True")
+        try:
+            shapes = [parse_shape(spec) for spec in shapes or ['wide_parents:10x10']]
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        domain = 'restore-benchmark-{}'.format(uuid.uuid4().hex[:8])
+        self.stderr.write("creating {}".format(domain))
+        project, couch_users = create_benchmark_domain(domain, users, shapes)
+        try:
+            results = run_benchmark(
+                project,
+                couch_users,
+                case_sync,
+                incremental_syncs=incremental,
+                modify_fraction=modify,
+                trace_memory=not no_memory,
+                seed=seed,
+            )
+            for result in results:
+                result['label'] = label
+                result['shapes'] = ['{}:{}x{}'.format(*shape) for shape in shapes]
+                sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+                sys.stdout.flush()
+        finally:
+            if not keep:
+                self.stderr.write("deleting {}".format(domain))
+                project.delete(leave_tombstone=True)
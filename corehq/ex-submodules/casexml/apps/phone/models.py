@@ -17,6 +17,13 @@ from casexml.apps.case import const
 from casexml.apps.case.sharedmodels import CommCareCaseIndex, IndexHoldingMixIn
 from casexml.apps.phone.change_publishers import publish_synclog_saved
 from casexml.apps.phone.checksum import CaseStateHash, Checksum
+from casexml.apps.phone.compact_synclog import (
+    DeltaBase,
+    compact_sync_log_doc,
+    expand_sync_log_doc,
+    get_delta_base,
+    is_compact_sync_log_doc,
+)
 from casexml.apps.phone.exceptions import (
     IncompatibleSyncLogType,
     MissingSyncLog,
@@ -40,7 +47,11 @@ from dimagi.utils.couch import LooselyEqualDocumentSchema
 from dimagi.utils.logging import notify_exception
 
 from corehq.apps.domain.models import Domain
-from corehq.toggles import ENABLE_LOADTEST_USERS, LEGACY_SYNC_SUPPORT
+from corehq.toggles import (
+    COMPACT_SYNC_LOGS,
+    ENABLE_LOADTEST_USERS,
+    LEGACY_SYNC_SUPPORT,
+)
 from corehq.util.global_request import get_request_domain
 from corehq.util.soft_assert import soft_assert
 
@@ -265,6 +276,9 @@ LOG_FORMAT_LIVEQUERY = 'livequery'
 class UCRSyncLog(Document):
     report_uuid = StringProperty()
     datetime = DateTimeProperty()
+    # see ReportFixturesProviderV2._get_incremental_fixtures
+    result_key = StringProperty()
+    fixture_hash = StringProperty()
 
 
 class AbstractSyncLog(SafeSaveDocument):
@@ -369,14 +383,21 @@ def save_synclog_to_sql(synclog_json_object):
 
 def delete_synclogs(current_synclog):
     if current_synclog.user_id and current_synclog.device_id and current_synclog.app_id:
-        SyncLogSQL.objects.filter(
+        synclogs = SyncLogSQL.objects.filter(
             user_id=current_synclog.user_id,
             device_id=current_synclog.device_id,
             app_id=current_synclog.app_id,
             date__lt=current_synclog.date
-        ).delete()
+        )
     elif current_synclog.previous_log_id:
-        SyncLogSQL.objects.filter(synclog_id=current_synclog.previous_log_id).delete()
+        synclogs = SyncLogSQL.objects.filter(synclog_id=current_synclog.previous_log_id)
+    else:
+        return
+    delta_base = getattr(current_synclog, '_delta_base', None)
+    if delta_base is not None:
+        # the current sync log is stored as a delta over this one
+        synclogs = synclogs.exclude(synclog_id=delta_base.synclog_id)
+    synclogs.delete()
 
 
 def synclog_to_sql_object(synclog_json_object):
@@ -412,10 +433,20 @@ def synclog_to_sql_object(synclog_json_object):
     ]
     for from_field, to_field in field_mapping:
         setattr(synclog, to_field, getattr(synclog_json_object, from_field, None))
-    synclog.doc = synclog_json_object.to_json()
+    synclog.doc = _get_synclog_sql_doc(synclog_json_object)
     return synclog
 
 
+def _get_synclog_sql_doc(synclog_json_object):
+    doc = synclog_json_object.to_json()
+    if isinstance(synclog_json_object, SimplifiedSyncLog) and COMPACT_SYNC_LOGS.enabled(doc['domain']):
+        doc = compact_sync_log_doc(doc, synclog_json_object._delta_base)
+        if 'compact_base_id' not in doc:
+            synclog_json_object._delta_base = None
+            synclog_json_object._compact_state = doc['compact_state']
+    return doc
+
+
 @architect.install('partition', type='range', subtype='date', constraint='week', column='date')
 class SyncLogSQL(models.Model):
 
@@ -592,8 +623,13 @@ class SimplifiedSyncLog(AbstractSyncLog):
     closed_cases = SetProperty(six.text_type)
     extensions_checked = BooleanProperty(default=False)
     device_id = StringProperty()
+    # compressed case graph read by livequery sync, see CaseGraphFootprint
+    livequery_footprint = StringProperty()
 
     _purged_cases = None
+    # see casexml.apps.phone.compact_synclog
+    _delta_base = None  # DeltaBase this log is stored as a delta over
+    _compact_state = None  # stored full compact state of this log
 
     @property
     def purged_cases(self):
@@ -970,6 +1006,17 @@ class SimplifiedSyncLog(AbstractSyncLog):
             self.rev_before_last_submitted = self._rev
         return made_changes
 
+    def get_delta_base_for_next_log(self):
+        """
+        :returns: the ``DeltaBase`` the next sync log of this chain can be
+        stored as a delta over, or ``None``.
+        """
+        if self._delta_base is not None:
+            return self._delta_base
+        if self._compact_state is not None:
+            return DeltaBase(self._id, self.date, self._compact_state)
+        return None
+
     def purge_dependent_cases(self):
         """
         Attempt to purge any dependent cases from the sync log.
@@ -1021,12 +1068,28 @@ def get_properly_wrapped_sync_log(doc_id):
 
 
 def properly_wrap_sync_log(doc, synclog_sql=None):
+    delta_base = compact_state = None
+    if is_compact_sync_log_doc(doc):
+        compact_state = doc['compact_state'] if 'compact_base_id' not in doc else None
+        try:
+            doc, delta_base = expand_sync_log_doc(doc, _get_delta_base)
+        except ValueError as e:
+            raise MissingSyncLog(str(e))
     synclog = SimplifiedSyncLog.wrap(doc)
+    synclog._delta_base = delta_base
+    synclog._compact_state = compact_state
     if synclog_sql:
         synclog._synclog_sql = synclog_sql
     return synclog
 
 
+def _get_delta_base(synclog_id):
+    synclog = SyncLogSQL.objects.filter(synclog_id=synclog_id).first()
+    if synclog is None:
+        return None
+    return get_delta_base(synclog_id, synclog.date, synclog.doc)
+
+
 class OwnershipCleanlinessFlag(models.Model):
     """
     Stores whether an owner_id is "clean" aka has a case universe only belonging
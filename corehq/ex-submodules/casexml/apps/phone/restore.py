@@ -1,6 +1,5 @@
 import logging
 import os
-import shutil
 import tempfile
 import uuid
 from io import BytesIO
@@ -98,11 +97,20 @@ class StockSettings(object):
 
 
 class RestoreContent(object):
+    """
+    Writes the restore response to a temporary file.
+
+    The start tag is written first so that the complete response can be read
+    from the file without copying it. If the number of items is included in
+    the start tag, a fixed width is reserved for it (padded with whitespace
+    inside the tag) and it is filled in once all the items have been written.
+    """
     start_tag_template = (
         b'<OpenRosaResponse xmlns="http://openrosa.org/http/response"%(items)s>'
         b'<message nature="%(nature)s">Successfully restored account %(username)s!</message>'
     )
     items_template = b' items="%s"'
+    items_width = 10
     closing_tag = b'</OpenRosaResponse>'
 
     def __init__(self, username=None, items=False):
@@ -112,10 +120,12 @@ class RestoreContent(object):
 
     def __enter__(self):
         self.response_body = tempfile.TemporaryFile('w+b')
+        self.response_body.write(self._get_start_tag())
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.response_body.close()
+        if self.response_body is not None:
+            self.response_body.close()
 
     def append(self, xml_element):
         self.num_items += 1
@@ -130,24 +140,33 @@ class RestoreContent(object):
         for element in iterable:
             self.append(element)
 
-    def _write_to_file(self, fileobj):
-        # Add 1 to num_items to account for message element
-        items = (self.items_template % ('%s' % (self.num_items + 1)).encode('utf-8')) if self.items else b''
-        fileobj.write(self.start_tag_template % {
+    def _get_start_tag(self):
+        if self.items:
+            # Add 1 to num_items to account for message element
+            num_items = ('%s' % (self.num_items + 1)).encode('utf-8')
+            assert len(num_items) <= self.items_width, num_items
+            items = self.items_template % num_items + b' ' * (self.items_width - len(num_items))
+        else:
+            items = b''
+        return self.start_tag_template % {
             b"items": items,
             b"username": self.username.encode("utf8"),
             b"nature": ResponseNature.OTA_RESTORE_SUCCESS.encode("utf8"),
-        })
-
-        self.response_body.seek(0)
-        shutil.copyfileobj(self.response_body, fileobj)
-
-        fileobj.write(self.closing_tag)
+        }
 
     def get_fileobj(self):
-        fileobj = tempfile.TemporaryFile('w+b')
+        """Complete the response
+
+        :returns: The file object with the response content. The caller is
+        responsible for closing it. No more items can be added afterwards.
+        """
+        fileobj, self.response_body = self.response_body, None
         try:
-            self._write_to_file(fileobj)
+            fileobj.write(self.closing_tag)
+            if self.items:
+                # same length as the start tag that was written in __enter__
+                fileobj.seek(0)
+                fileobj.write(self._get_start_tag())
             fileobj.seek(0)
             return fileobj
         except:
@@ -466,6 +485,8 @@ class RestoreState(object):
             extensions_checked=True,
             device_id=self.params.device_id,
         )
+        if not self.is_initial:
+            new_synclog._delta_base = self.last_sync_log.get_delta_base_for_next_log()
         if self.params.app:
             new_synclog.app_id = self.params.app.copy_of or self.params.app_id
         if self.is_livequery:
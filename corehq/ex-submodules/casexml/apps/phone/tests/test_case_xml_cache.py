@@ -0,0 +1,96 @@
+import datetime
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+import mock
+
+from casexml.apps.case.const import CASE_ACTION_CREATE, CASE_ACTION_UPDATE
+from casexml.apps.case.models import CommCareCase
+from casexml.apps.case.xml import V2
+from casexml.apps.phone.data_providers.case.utils import CaseSyncUpdate
+from casexml.apps.phone.data_providers.case.xml_cache import (
+    get_case_xml_cache_key,
+    get_xml_for_updates,
+)
+from casexml.apps.phone.xml import get_case_element, get_case_xml
+from corehq.util.test_utils import flag_enabled
+
+MODULE = 'casexml.apps.phone.data_providers.case.xml_cache'
+
+
+class CaseXmlCacheKeyTest(SimpleTestCase):
+
+    def setUp(self):
+        self.case = _get_case()
+
+    def _key(self, updates=(CASE_ACTION_UPDATE,), version=V2, sync_attachments=False):
+        return get_case_xml_cache_key(self.case, updates, version, sync_attachments)
+
+    def test_same_case(self):
+        self.assertEqual(self._key(), get_case_xml_cache_key(_get_case(), [CASE_ACTION_UPDATE], V2, False))
+
+    def test_modified_case(self):
+        key = self._key()
+        self.case.server_modified_on += datetime.timedelta(seconds=1)
+        self.assertNotEqual(key, self._key())
+
+    def test_updates_and_version(self):
+        key = self._key()
+        self.assertNotEqual(key, self._key(updates=(CASE_ACTION_CREATE, CASE_ACTION_UPDATE)))
+        self.assertNotEqual(key, self._key(version='1.0'))
+
+    def test_sync_attachments(self):
+        self.assertNotEqual(self._key(), self._key(sync_attachments=True))
+
+    def test_not_cached_without_modified_date(self):
+        self.case.server_modified_on = None
+        self.assertIsNone(self._key())
+
+
+@mock.patch(MODULE + '.RESTORE_CASE_XML_CACHE.enabled', return_value=True)
+@mock.patch(MODULE + '.get_redis_default_cache', return_value=caches['locmem'])
+@mock.patch(MODULE + '.datadog_counter')
+class GetXmlForUpdatesTest(SimpleTestCase):
+
+    def setUp(self):
+        caches['locmem'].clear()
+        self.restore_state = mock.Mock(domain='winterfell', version=V2, loadtest_factor=1)
+
+    def test_cached_xml(self, *_):
+        update = CaseSyncUpdate(_get_case(), None)
+        expected = get_case_xml(update.case, update.required_updates, V2)
+        self.assertEqual([expected], get_xml_for_updates([update], self.restore_state))
+        with mock.patch(MODULE + '.get_case_element') as get_case_element:
+            self.assertEqual([expected], get_xml_for_updates([update], self.restore_state))
+        get_case_element.assert_not_called()
+
+    def test_modified_case_not_cached(self, *_):
+        case = _get_case()
+        get_xml_for_updates([CaseSyncUpdate(case, None)], self.restore_state)
+        case.name = 'jaqen'
+        case.server_modified_on += datetime.timedelta(seconds=1)
+        [xml] = get_xml_for_updates([CaseSyncUpdate(case, None)], self.restore_state)
+        self.assertIn(b'jaqen', xml)
+
+    def test_sync_attachments_not_cached(self, *_):
+        update = CaseSyncUpdate(_get_case(), None)
+        get_xml_for_updates([update], self.restore_state)
+        with flag_enabled('MM_CASE_PROPERTIES'), \
+                mock.patch(MODULE + '.get_case_element', wraps=get_case_element) as get_case_element_patch:
+            get_xml_for_updates([update], self.restore_state)
+        get_case_element_patch.assert_called_once_with(update.case, update.required_updates, V2)
+
+
+def _get_case():
+    return CommCareCase(
+        _id='arya',
+        domain='winterfell',
+        type='faceless',
+        name='arya',
+        owner_id='many-faced-god',
+        closed=False,
+        opened_on=datetime.datetime(2016, 5, 31),
+        modified_on=datetime.datetime(2016, 5, 31),
+        server_modified_on=datetime.datetime(2016, 5, 31, 12),
+    )
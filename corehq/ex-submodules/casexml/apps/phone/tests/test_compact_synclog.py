@@ -0,0 +1,80 @@
+import uuid
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.compact_synclog import (
+    compact_sync_log_doc,
+    expand_sync_log_doc,
+    get_delta_base,
+)
+
+
+class CompactSyncLogTest(SimpleTestCase):
+
+    def setUp(self):
+        self.case_ids = [str(uuid.uuid4()) for _ in range(10)] + [uuid.uuid4().hex, 'not-a-uuid']
+        self.doc = {
+            '_id': uuid.uuid4().hex,
+            'doc_type': 'SimplifiedSyncLog',
+            'case_ids_on_phone': self.case_ids,
+            'dependent_case_ids_on_phone': self.case_ids[:2],
+            'closed_cases': [],
+            'index_tree': {'doc_type': 'IndexTree', 'indices': {
+                self.case_ids[3]: {'parent': self.case_ids[0]},
+                self.case_ids[-1]: {'parent': self.case_ids[1], 'grandparent': self.case_ids[-2]},
+            }},
+            'extension_index_tree': {'doc_type': 'IndexTree', 'indices': {}},
+        }
+
+    def test_full(self):
+        compact = compact_sync_log_doc(self.doc)
+        self.assertNotIn('case_ids_on_phone', compact)
+        self.assertNotIn('compact_base_id', compact)
+        doc, delta_base = expand_sync_log_doc(compact, None)
+        self.assertIsNone(delta_base)
+        self.assertEqual(_normalize(self.doc), _normalize(doc))
+
+    def test_delta(self):
+        base = self._get_delta_base()
+        doc = self._next_doc()
+        compact = compact_sync_log_doc(doc, base)
+        self.assertEqual(base.synclog_id, compact['compact_base_id'])
+        expanded, delta_base = expand_sync_log_doc(compact, {base.synclog_id: base}.get)
+        self.assertEqual(base, delta_base)
+        self.assertEqual(_normalize(doc), _normalize(expanded))
+
+    def test_changed_base(self):
+        compact = compact_sync_log_doc(self._next_doc(), self._get_delta_base())
+        self.doc['closed_cases'] = self.case_ids[:1]
+        changed_base = self._get_delta_base()
+        with self.assertRaises(ValueError):
+            expand_sync_log_doc(compact, lambda synclog_id: changed_base)
+        with self.assertRaises(ValueError):
+            expand_sync_log_doc(compact, lambda synclog_id: None)
+
+    def test_old_base(self):
+        base = self._get_delta_base()._replace(date=datetime.utcnow() - timedelta(days=30))
+        self.assertNotIn('compact_base_id', compact_sync_log_doc(self._next_doc(), base))
+
+    def _get_delta_base(self):
+        compact = compact_sync_log_doc(self.doc)
+        return get_delta_base(compact['_id'], datetime.utcnow(), compact)
+
+    def _next_doc(self):
+        doc = _normalize(self.doc)
+        doc['_id'] = uuid.uuid4().hex
+        doc['case_ids_on_phone'] = self.case_ids[1:]
+        doc['extension_index_tree']['indices'][self.case_ids[2]] = {'host': self.case_ids[1]}
+        return doc
+
+
+def _normalize(doc):
+    doc = dict(doc)
+    for name in ['case_ids_on_phone', 'dependent_case_ids_on_phone', 'closed_cases']:
+        doc[name] = sorted(doc[name])
+    for name in ['index_tree', 'extension_index_tree']:
+        doc[name] = dict(doc[name], indices={
+            case_id: dict(indices) for case_id, indices in doc[name]['indices'].items()
+        })
+    return doc
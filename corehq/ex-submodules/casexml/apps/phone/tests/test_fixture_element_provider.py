@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+import gevent
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.data_providers import FixtureElementProvider
+from corehq.util.timer import TimingContext
+
+
+class FakeFixtureProvider(object):
+
+    def __init__(self, id, delay):
+        self.id = id
+        self.delay = delay
+
+    def __call__(self, restore_state):
+        gevent.sleep(self.delay)
+        return ['{}-{}'.format(self.id, i) for i in range(2)]
+
+
+@patch('casexml.apps.phone.data_providers.standard.connections')
+class FixtureElementProviderTest(SimpleTestCase):
+
+    def test_get_elements_in_pool(self, connections):
+        providers = [
+            FakeFixtureProvider('slow', 0.02),
+            FakeFixtureProvider('fast', 0),
+            FakeFixtureProvider('queued', 0.01),
+        ]
+        with TimingContext('restore') as timing_context:
+            with timing_context('FixtureElementProvider'):
+                elements = list(FixtureElementProvider(timing_context).get_elements_in_pool(
+                    providers, restore_state=None, pool_size=2))
+
+        self.assertEqual(['slow-0', 'slow-1', 'fast-0', 'fast-1', 'queued-0', 'queued-1'], elements)
+        self.assertEqual(
+            ['FixtureElementProvider', 'fixture:slow', 'fixture:fast', 'fixture:queued'],
+            [timer.name for timer in timing_context.to_list(exclude_root=True)]
+        )
+        self.assertEqual(3, connections.close_all.call_count)
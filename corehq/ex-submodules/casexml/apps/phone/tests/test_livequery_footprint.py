@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+import mock
+
+from casexml.apps.phone.data_providers.case.footprint import (
+    CaseGraphFootprint,
+    FootprintCaseAccessor,
+)
+from casexml.apps.phone.data_providers.case.livequery import (
+    get_live_case_ids_and_indices,
+)
+from corehq.form_processor.models import CommCareCaseIndexSQL
+
+CHILD = CommCareCaseIndexSQL.CHILD
+EXTENSION = CommCareCaseIndexSQL.EXTENSION
+
+
+@mock.patch('casexml.apps.phone.data_providers.case.footprint.FOOTPRINT_CLOCK_MARGIN', timedelta(0))
+class LiveQueryFootprintTest(SimpleTestCase):
+
+    def setUp(self):
+        self.db = FakeCaseDB()
+        self.footprint = None
+
+    def sync(self):
+        """Check that an incremental sync gets the same graph as a full sync"""
+        live_ids, indices = self.incremental_sync()
+        full_live_ids, full_indices = get_live_case_ids_and_indices(
+            _timing_context, self.db, ['me'])
+        self.assertEqual(full_live_ids, live_ids)
+        self.assertEqual(_index_keys(full_indices), _index_keys(indices))
+        return live_ids
+
+    def incremental_sync(self):
+        previous = self.footprint
+        if previous is not None:
+            previous = CaseGraphFootprint.from_string(previous.to_string())
+            previous.refresh(self.db)
+        accessor = FootprintCaseAccessor(self.db, CaseGraphFootprint(datetime.utcnow()), previous)
+        result = get_live_case_ids_and_indices(_timing_context, accessor, ['me'])
+        self.footprint = accessor.footprint
+        return result
+
+    def test_unchanged_graph_is_not_queried(self):
+        self.db.add('a')
+        self.db.add('b', owner='me', indices={'host': ('a', EXTENSION)})
+        self.assertEqual({'a', 'b'}, self.sync())
+        with mock.patch.object(self.db, 'get_related_indices', wraps=self.db.get_related_indices) as related:
+            live_ids, _ = self.incremental_sync()
+        self.assertEqual({'a', 'b'}, live_ids)
+        # only the query for new indices of cases in the footprint
+        related.assert_called_once()
+
+    def test_new_extension(self):
+        self.db.add('a', owner='me')
+        self.sync()
+        self.db.add('b', indices={'host': ('a', EXTENSION)})
+        self.assertEqual({'a', 'b'}, self.sync())
+
+    def test_closed_host(self):
+        self.db.add('a', closed=True)
+        self.db.add('b', indices={'host': ('a', EXTENSION)})
+        self.db.add('c', owner='me', indices={'host': ('b', EXTENSION)})
+        self.assertEqual(set(), self.sync())
+        self.db.update('a', closed=False)
+        self.assertEqual({'a', 'b', 'c'}, self.sync())
+
+    def test_removed_index(self):
+        self.db.add('a')
+        self.db.add('b', owner='me', indices={'parent': ('a', CHILD)})
+        self.assertEqual({'a', 'b'}, self.sync())
+        self.db.update('b', indices={})
+        self.assertEqual({'b'}, self.sync())
+
+    def test_ownership_change(self):
+        self.db.add('a', owner='me')
+        self.db.add('b', owner='other', indices={'parent': ('a', CHILD)})
+        self.assertEqual({'a'}, self.sync())
+        self.db.update('a', owner='other')
+        self.db.update('b', owner='me')
+        self.assertEqual({'a', 'b'}, self.sync())
+
+    def test_deleted_case(self):
+        self.db.add('a', owner='me')
+        self.db.add('b', indices={'host': ('a', EXTENSION)})
+        self.assertEqual({'a', 'b'}, self.sync())
+        self.db.update('b', deleted=True)
+        self.assertEqual({'a'}, self.sync())
+
+
+@contextmanager
+def _timing_context(name):
+    yield
+
+
+def _index_keys(indices):
+    return {
+        case_id: sorted((ix.case_id, ix.identifier, ix.referenced_id) for ix in case_indices)
+        for case_id, case_indices in indices.items()
+        if case_indices
+    }
+
+
+class FakeCaseDB(object):
+    """In-memory version of the case graph queries of ``CaseAccessors``"""
+    domain = 'test-domain'
+
+    def __init__(self):
+        self.cases = {}
+
+    def add(self, case_id, owner='other', closed=False, deleted=False, indices=None):
+        self.cases[case_id] = {
+            'owner': owner,
+            'closed': closed,
+            'deleted': deleted,
+            'indices': indices or {},
+            'modified': datetime(2020, 1, 1),
+        }
+
+    def update(self, case_id, **kw):
+        self.cases[case_id].update(kw, modified=datetime.utcnow())
+
+    def get_case_ids_by_owners(self, owner_ids, closed=None):
+        return [case_id for case_id, case in self.cases.items()
+                if case['owner'] in owner_ids and not case['closed'] and not case['deleted']]
+
+    def get_related_indices(self, case_ids, exclude_indices):
+        result = []
+        for case_id, case in self.cases.items():
+            for identifier, (referenced_id, relationship_id) in case['indices'].items():
+                if '{} {}'.format(case_id, identifier) in exclude_indices:
+                    continue
+                is_open = not (case['closed'] or case['deleted'])
+                if case_id in case_ids or (
+                        referenced_id in case_ids and relationship_id == EXTENSION and is_open):
+                    result.append(CommCareCaseIndexSQL(
+                        domain=self.domain,
+                        case_id=case_id,
+                        identifier=identifier,
+                        referenced_id=referenced_id,
+                        referenced_type='type',
+                        relationship_id=relationship_id,
+                    ))
+        return result
+
+    def get_closed_and_deleted_ids(self, case_ids):
+        return [(case_id, self.cases[case_id]['closed'], self.cases[case_id]['deleted'])
+                for case_id in case_ids
+                if case_id in self.cases and (self.cases[case_id]['closed'] or self.cases[case_id]['deleted'])]
+
+    def get_last_modified_dates(self, case_ids):
+        return {case_id: self.cases[case_id]['modified'] for case_id in case_ids if case_id in self.cases}
@@ -46,7 +46,8 @@ class OtaV3RestoreTest(TestCase):
 class TestRestoreContent(SimpleTestCase):
 
     def _expected(self, username, body, items=None):
-        items_text = (' items="%s"' % items) if items is not None else ''
+        # the item count is padded to a fixed width so it can be filled in last
+        items_text = (' items="%s"%s' % (items, ' ' * (10 - len(str(items))))) if items is not None else ''
         return (
             '<OpenRosaResponse xmlns="http://openrosa.org/http/response"%(items)s>'
             '<message nature="ota_restore_success">Successfully restored account %(username)s!</message>'
@@ -75,3 +76,18 @@ class TestRestoreContent(SimpleTestCase):
             response.append(body.encode('utf-8'))
             with response.get_fileobj() as fileobj:
                 self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_many_items(self):
+        user = 'user1'
+        body = '<elem>data0</elem>' * 1000
+        expected = self._expected(user, body, items=1001)
+        with RestoreContent(user, True) as response:
+            response.extend(b'<elem>data0</elem>' for _ in range(1000))
+            with response.get_fileobj() as fileobj:
+                self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_fileobj_outlives_content(self):
+        with RestoreContent('user1', False) as response:
+            fileobj = response.get_fileobj()
+        with fileobj:
+            self.assertTrue(fileobj.read().endswith(b'</OpenRosaResponse>'))
@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase, TestCase
+
+from casexml.apps.phone.benchmark import (
+    create_benchmark_domain,
+    get_phase_durations,
+    parse_shape,
+    run_benchmark,
+)
+from casexml.apps.phone.const import LIVEQUERY
+from corehq.util.timer import TimingContext
+
+
+class ParseShapeTest(SimpleTestCase):
+
+    def test_parse_shape(self):
+        self.assertEqual(('extension_chains', 10, 3), parse_shape('extension_chains:10x3'))
+
+    def test_bad_shape(self):
+        with self.assertRaises(ValueError):
+            parse_shape('pyramid:10x3')
+        with self.assertRaises(ValueError):
+            parse_shape('wide_parents:10')
+
+    def test_phase_durations(self):
+        with TimingContext('restore') as timing_context:
+            with timing_context('get_related_indices(3 cases, 0 seen)'):
+                pass
+            with timing_context('get_related_indices(1 cases, 2 seen)'):
+                pass
+        self.assertEqual(['get_related_indices'], list(get_phase_durations(timing_context)))
+
+
+class RestoreBenchmarkTest(TestCase):
+    domain = 'restore-benchmark-test'
+
+    def setUp(self):
+        super(RestoreBenchmarkTest, self).setUp()
+        self.project, self.users = create_benchmark_domain(self.domain, 2, [
+            ('extension_chains', 2, 3),
+            ('wide_parents', 1, 2),
+            ('shared_owner', 1, 1),
+        ])
+
+    def tearDown(self):
+        self.project.delete()
+        super(RestoreBenchmarkTest, self).tearDown()
+
+    def test_existing_domain(self):
+        with self.assertRaises(ValueError):
+            create_benchmark_domain(self.domain, 1, [])
+
+    def test_run_benchmark(self):
+        results = list(run_benchmark(self.project, self.users, LIVEQUERY, incremental_syncs=1, seed=1))
+        self.assertEqual(
+            [('initial', 0), ('incremental', 1)] * 2,
+            [(result['restore'], result['sequence']) for result in results]
+        )
+        initial = results[0]
+        # 2 chains of 3 cases, 1 parent with 2 children and 2 shared cases
+        self.assertEqual(11, initial['cases'])
+        self.assertGreater(initial['payload_size'], 0)
+        self.assertGreater(initial['queries'], 0)
+        self.assertGreater(initial['peak_memory'], 0)
+        self.assertIn('CasePayloadProvider', initial['phases'])
+        self.assertEqual(1, results[1]['modified_cases'])
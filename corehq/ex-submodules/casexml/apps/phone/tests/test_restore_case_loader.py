@@ -0,0 +1,55 @@
+import uuid
+
+from django.test import TestCase
+
+from mock import Mock, patch
+
+from casexml.apps.case.mock import CaseFactory, CaseIndex, CaseStructure
+from casexml.apps.case.xml import V2
+from casexml.apps.phone.data_providers.case.prefetch import RestoreCaseLoader
+from casexml.apps.phone.xml import get_case_xml
+from corehq.form_processor.backends.sql.dbaccessors import CaseAccessorSQL
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
+from corehq.form_processor.tests.utils import FormProcessorTestUtils, use_sql_backend
+from corehq.util.test_utils import flag_enabled
+
+
+@use_sql_backend
+@flag_enabled('MM_CASE_PROPERTIES')
+class RestoreCaseLoaderTest(TestCase):
+    domain = 'restore-case-loader'
+
+    def setUp(self):
+        super(RestoreCaseLoaderTest, self).setUp()
+        self.parent_id = uuid.uuid4().hex
+        self.child_id = uuid.uuid4().hex
+        CaseFactory(self.domain).create_or_update_case(CaseStructure(
+            case_id=self.child_id,
+            attrs={'create': True},
+            indices=[CaseIndex(CaseStructure(case_id=self.parent_id, attrs={'create': True}))],
+        ))
+
+    def tearDown(self):
+        FormProcessorTestUtils.delete_all_cases_forms_ledgers(self.domain)
+        super(RestoreCaseLoaderTest, self).tearDown()
+
+    def _get_batch(self, commtrack_enabled=False):
+        restore_state = Mock(project=Mock(commtrack_enabled=commtrack_enabled))
+        restore_state.project.name = self.domain
+        loader = RestoreCaseLoader(restore_state, CaseAccessors(self.domain))
+        return loader.get_case_batch([self.child_id, self.parent_id])
+
+    def test_case_xml_from_loaded_batch(self):
+        cases, ledgers = self._get_batch()
+        self.assertIsNone(ledgers)
+        self.assertEqual({self.child_id, self.parent_id}, {case.case_id for case in cases})
+        with patch.object(CaseAccessorSQL, 'get_indices') as get_indices, \
+                patch.object(CaseAccessorSQL, 'get_attachments') as get_attachments:
+            xml = {case.case_id: get_case_xml(case, ['create', 'update'], V2) for case in cases}
+        get_indices.assert_not_called()
+        get_attachments.assert_not_called()
+        self.assertIn(self.parent_id.encode('utf-8'), xml[self.child_id])
+
+    def test_ledgers(self):
+        cases, ledgers = self._get_batch(commtrack_enabled=True)
+        self.assertEqual({self.child_id: {}, self.parent_id: {}}, ledgers)
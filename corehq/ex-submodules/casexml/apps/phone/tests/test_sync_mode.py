@@ -1066,6 +1066,11 @@ class LiveQueryExtensionCasesSyncTokenUpdatesSQL(LiveQueryExtensionCasesSyncToke
     pass
 
 
+@flag_enabled('LIVEQUERY_CASE_GRAPH_FOOTPRINT')
+class LiveQueryFootprintExtensionCasesSyncTokenUpdatesSQL(LiveQueryExtensionCasesSyncTokenUpdatesSQL):
+    pass
+
+
 class ExtensionCasesFirstSync(BaseSyncTest):
 
     def setUp(self):
@@ -1180,6 +1185,11 @@ class LiveQueryChangingOwnershipTestSQL(LiveQueryChangingOwnershipTest):
     pass
 
 
+@flag_enabled('LIVEQUERY_CASE_GRAPH_FOOTPRINT')
+class LiveQueryFootprintChangingOwnershipTestSQL(LiveQueryChangingOwnershipTestSQL):
+    pass
+
+
 @patch('casexml.apps.phone.restore.INITIAL_SYNC_CACHE_THRESHOLD', 0)
 class SyncTokenCachingTest(BaseSyncTest):
 
@@ -1848,6 +1858,11 @@ class LiveQueryMultiUserSyncTestSQL(LiveQueryMultiUserSyncTest):
     pass
 
 
+@flag_enabled('LIVEQUERY_CASE_GRAPH_FOOTPRINT')
+class LiveQueryFootprintMultiUserSyncTestSQL(LiveQueryMultiUserSyncTestSQL):
+    pass
+
+
 class SteadyStateExtensionSyncTest(BaseSyncTest):
     """
     Test that doing multiple clean syncs with extensions does what we think it will
@@ -1,8 +1,16 @@
+import uuid
 from datetime import datetime
 
 from django.test import TestCase
 
-from casexml.apps.phone.models import SyncLogSQL, SimplifiedSyncLog
+from casexml.apps.phone.exceptions import MissingSyncLog
+from casexml.apps.phone.models import (
+    SimplifiedSyncLog,
+    SyncLogSQL,
+    delete_synclogs,
+    get_properly_wrapped_sync_log,
+)
+from corehq.util.test_utils import flag_enabled
 
 
 class SyncLogQueryTest(TestCase):
@@ -28,3 +36,59 @@ class SyncLogQueryTest(TestCase):
         with self.assertNumQueries(1):
             # previously this was 2 queries, fetch + update
             synclog.save()
+
+
+@flag_enabled('COMPACT_SYNC_LOGS')
+class CompactSyncLogQueryTest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.case_ids = {str(uuid.uuid4()) for _ in range(10)}
+        self.base = self._new_synclog(case_ids_on_phone=self.case_ids)
+        self.base.index_tree.set_index(min(self.case_ids), 'parent', max(self.case_ids))
+        self.base.save()
+
+    def tearDown(self):
+        SyncLogSQL.objects.all().delete()
+        super().tearDown()
+
+    def _new_synclog(self, **kwargs):
+        return SimplifiedSyncLog(
+            domain='test', user_id='user1', device_id='device', app_id='app', date=datetime.utcnow(), **kwargs
+        )
+
+    def _next_synclog(self):
+        synclog = self._new_synclog(
+            previous_log_id=self.base._id,
+            case_ids_on_phone=self.case_ids | {'new-case'},
+            index_tree=self.base.index_tree,
+        )
+        synclog._delta_base = get_properly_wrapped_sync_log(self.base._id).get_delta_base_for_next_log()
+        synclog.save()
+        return synclog
+
+    def test_full(self):
+        doc = SyncLogSQL.objects.get(synclog_id=self.base._id).doc
+        self.assertIn('compact_state', doc)
+        self.assertNotIn('compact_base_id', doc)
+        synclog = get_properly_wrapped_sync_log(self.base._id)
+        self.assertEqual(self.case_ids, synclog.case_ids_on_phone)
+        self.assertEqual(self.base.index_tree.indices, synclog.index_tree.indices)
+
+    def test_delta(self):
+        synclog = self._next_synclog()
+        self.assertEqual(self.base._id, SyncLogSQL.objects.get(synclog_id=synclog._id).doc['compact_base_id'])
+        loaded = get_properly_wrapped_sync_log(synclog._id)
+        self.assertEqual(self.case_ids | {'new-case'}, loaded.case_ids_on_phone)
+        self.assertEqual(self.base.index_tree.indices, loaded.index_tree.indices)
+
+        # the base of the delta is kept when the previous logs are deleted
+        delete_synclogs(loaded)
+        self.assertTrue(SyncLogSQL.objects.filter(synclog_id=self.base._id).exists())
+
+    def test_changed_base(self):
+        synclog = self._next_synclog()
+        self.base.closed_cases.add(min(self.case_ids))
+        self.base.save()
+        with self.assertRaises(MissingSyncLog):
+            get_properly_wrapped_sync_log(synclog._id)
@@ -1,3 +1,4 @@
+import hashlib
 import re
 import weakref
 from io import BytesIO
@@ -18,8 +19,10 @@ from memoized import memoized
 
 from corehq.blobs import get_blob_db, CODES, NotFound
 from corehq.blobs.models import BlobMeta
+from corehq.toggles import SHARED_USER_FIXTURE_CACHE
 from corehq.util.datadog.gauges import datadog_counter
 from dimagi.utils.couch import CriticalSection
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
 
 ITEMS_COMMENT_PREFIX = b'<!--items='
 ITESM_COMMENT_REGEX = re.compile(br'(<!--items=(\d+)-->)')
@@ -32,6 +35,10 @@ ITESM_COMMENT_REGEX = re.compile(br'(<!--items=(\d+)-->)')
 # This is an optimization to avoid an extra XML parse/serialize cycle.
 GLOBAL_USER_ID = 'global-user-id-7566F038-5000-4419-B3EF-5349FB2FF2E9'
 
+SCOPED_FIXTURE_CACHE_TIMEOUT = 24 * 60 * 60
+# larger fixtures are not cached
+SCOPED_FIXTURE_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
 
 def get_or_cache_global_fixture(restore_state, cache_bucket_prefix, fixture_name, data_fn):
     """
@@ -72,13 +79,60 @@ def get_or_cache_global_fixture(restore_state, cache_bucket_prefix, fixture_name
     return [data.replace(global_id, b_user_id)] if data else []
 
 
+def get_or_cache_scoped_fixture(restore_state, fixture_name, scope_fn, data_fn):
+    """
+    Get the fixture data for a user fixture that is the same for all users
+    with the same scope (e.g. the same fixture items or locations).
+
+    The fixture is cached under a fingerprint of the scope, so the scope
+    must include everything the fixture is built from, including the
+    revision or modified date of each object. Saving one of the objects
+    changes the fingerprint and the fixture is generated again.
+
+    :param restore_state: Restore state object used to access features of the restore
+    :param fixture_name: Name of the fixture
+    :param scope_fn: Function to get the list of strings that determine the
+    content of the fixture
+    :param data_fn: Function to generate the XML fixture elements for a user ID
+    :return: list containing byte string representation of the fixture
+    """
+    restore_user = restore_state.restore_user
+    if not SHARED_USER_FIXTURE_CACHE.enabled(restore_user.domain):
+        return data_fn(restore_user.user_id)
+
+    fingerprint = hashlib.sha1('\n'.join(scope_fn()).encode('utf-8')).hexdigest()
+    key = 'scoped-fixture:{}:{}:{}'.format(restore_user.domain, fixture_name, fingerprint)
+    cache = get_redis_default_cache()
+
+    data = None
+    if not restore_state.overwrite_cache:
+        data = cache.get(key)
+        _record_datadog_metric('scoped_cache_miss' if data is None else 'scoped_cache_hit', fixture_name)
+
+    if data is None:
+        _record_datadog_metric('scoped_generate', fixture_name)
+        items = data_fn(GLOBAL_USER_ID)
+        if not items:
+            return []
+        data = write_fixture_items_to_io(items).read()
+        if len(data) <= SCOPED_FIXTURE_CACHE_MAX_BYTES:
+            cache.set(key, data, timeout=SCOPED_FIXTURE_CACHE_TIMEOUT)
+
+    global_id = GLOBAL_USER_ID.encode('utf-8')
+    b_user_id = restore_user.user_id.encode('utf-8')
+    return [data.replace(global_id, b_user_id)]
+
+
 def write_fixture_items_to_io(items):
     io = BytesIO()
     io.write(ITEMS_COMMENT_PREFIX)
     io.write(six.text_type(len(items)).encode('utf-8'))
     io.write(b'-->')
     for element in items:
-        io.write(ElementTree.tostring(element, encoding='utf-8'))
+        if isinstance(element, bytes):
+            io.write(element)
+        else:
+            io.write(ElementTree.tostring(element, encoding='utf-8'))
     io.seek(0)
     return io
 
@@ -4,7 +4,7 @@ import logging
 import operator
 import struct
 from abc import ABCMeta, abstractmethod, abstractproperty
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from datetime import datetime
 from io import BytesIO
 from itertools import groupby
@@ -340,11 +340,13 @@ class ReindexAccessor(metaclass=ABCMeta):
 
 class FormReindexAccessor(ReindexAccessor):
 
-    def __init__(self, domain=None, include_attachments=True, limit_db_aliases=None, include_deleted=False):
+    def __init__(self, domain=None, include_attachments=True, limit_db_aliases=None, include_deleted=False,
+                 xmlns=None):
         super(FormReindexAccessor, self).__init__(limit_db_aliases)
         self.domain = domain
         self.include_attachments = include_attachments
         self.include_deleted = include_deleted
+        self.xmlns = xmlns
 
     @property
     def model_class(self):
@@ -374,6 +376,8 @@ class FormReindexAccessor(ReindexAccessor):
             filters.append(Q(state=F('state').bitand(XFormInstanceSQL.DELETED) + F('state')))
         if self.domain:
             filters.append(Q(domain=self.domain))
+        if self.xmlns:
+            filters.append(Q(xmlns=self.xmlns))
         return filters
 
 
@@ -866,6 +870,18 @@ class CaseAccessorSQL(AbstractCaseAccessor):
             results = fetchall_as_namedtuple(cursor)
             return [result.referenced_id for result in results]
 
+    @staticmethod
+    def get_indices_for_cases(domain, case_ids):
+        """
+        :returns: list of the indices of the cases, grouped by case ID
+        """
+        if not case_ids:
+            return []
+        return list(CommCareCaseIndexSQL.objects.plproxy_raw(
+            'SELECT * FROM get_multiple_cases_indices(%s, %s)',
+            [domain, list(case_ids)]
+        ))
+
     @staticmethod
     def get_reverse_indexed_cases(domain, case_ids, case_types=None, is_closed=None):
         assert isinstance(case_ids, list)
@@ -930,6 +946,14 @@ class CaseAccessorSQL(AbstractCaseAccessor):
     def get_attachments(case_id):
         return list(CaseAttachmentSQL.objects.partitioned_query(case_id).filter(case_id=case_id))
 
+    @staticmethod
+    def get_attachments_for_cases(case_ids):
+        """Get the attachments of many cases with one query per shard database"""
+        attachments = []
+        for db_name, db_case_ids in split_list_by_db_partition(case_ids):
+            attachments.extend(CaseAttachmentSQL.objects.using(db_name).filter(case_id__in=db_case_ids))
+        return attachments
+
     @staticmethod
     def get_transactions(case_id):
         return list(CaseTransaction.objects.partitioned_query(case_id).filter(case_id=case_id).order_by('server_date'))
@@ -1028,6 +1052,66 @@ class CaseAccessorSQL(AbstractCaseAccessor):
         except DatabaseError as e:
             raise CaseSaveError(e)
 
+    @staticmethod
+    def save_cases(cases):
+        """Save cases and their tracked models with a fixed number of queries per shard
+
+        Same as ``save_case`` for each case, but the models of all cases in
+        the same shard database are written together: new models with one
+        multi-row INSERT and saved models with one multi-row upsert per
+        model type.
+        """
+        cases_by_db = defaultdict(list)
+        for case in cases:
+            cases_by_db[case.db].append(case)
+        for db_name, db_cases in cases_by_db.items():
+            CaseAccessorSQL._save_cases_in_db(db_name, db_cases)
+
+    @staticmethod
+    def _save_cases_in_db(db_name, cases):
+        transactions_to_save = []
+        indices_to_save_or_update = []
+        index_ids_to_delete = []
+        attachments_to_save = []
+        attachment_ids_to_delete = []
+        for case in cases:
+            transactions_to_save.extend(case.get_live_tracked_models(CaseTransaction))
+            for index in case.get_live_tracked_models(CommCareCaseIndexSQL):
+                index.domain = case.domain  # ensure domain is set on indices
+                indices_to_save_or_update.append(index)
+            index_ids_to_delete.extend(
+                index.id for index in case.get_tracked_models_to_delete(CommCareCaseIndexSQL))
+            for attachment in case.get_tracked_models_to_create(CaseAttachmentSQL):
+                if attachment.is_saved():
+                    raise CaseSaveError(
+                        """Updating attachments is not supported.
+                        case id={}, attachment id={}""".format(
+                            case.case_id, attachment.attachment_id
+                        )
+                    )
+                attachments_to_save.append(attachment)
+            attachment_ids_to_delete.extend(
+                att.id for att in case.get_tracked_models_to_delete(CaseAttachmentSQL))
+
+        try:
+            with transaction.atomic(using=db_name, savepoint=False):
+                _bulk_save(db_name, CommCareCaseSQL, cases)
+                _bulk_save(db_name, CaseTransaction, transactions_to_save)
+                # prevent changing identifier
+                _bulk_save(db_name, CommCareCaseIndexSQL, indices_to_save_or_update,
+                           update_fields=['referenced_id', 'referenced_type', 'relationship_id'])
+                if index_ids_to_delete:
+                    CommCareCaseIndexSQL.objects.using(db_name).filter(id__in=index_ids_to_delete).delete()
+
+                _bulk_save(db_name, CaseAttachmentSQL, attachments_to_save)
+                if attachment_ids_to_delete:
+                    CaseAttachmentSQL.objects.using(db_name).filter(id__in=attachment_ids_to_delete).delete()
+
+                for case in cases:
+                    case.clear_tracked_models()
+        except DatabaseError as e:
+            raise CaseSaveError(e)
+
     @staticmethod
     def get_open_case_ids_for_owner(domain, owner_id):
         return CaseAccessorSQL._get_case_ids_in_domain(domain, owner_ids=[owner_id], is_closed=False)
@@ -1502,3 +1586,46 @@ def _attach_prefetch_models(objects_by_id, prefetched_models, link_field_name, c
     for obj_id in unseen:
         obj = objects_by_id[obj_id]
         setattr(obj, cached_attrib_name, [])
+
+
+def _bulk_save(db_name, model_class, objects, update_fields=None):
+    """Save model objects with (at most) one INSERT and one upsert
+
+    :param update_fields: fields to update on objects that are already
+    saved. All fields are updated if this is ``None``.
+    """
+    new_objects = [obj for obj in objects if not obj.is_saved()]
+    saved_objects = [obj for obj in objects if obj.is_saved()]
+    if new_objects:
+        # sets the primary keys of the objects
+        model_class.objects.using(db_name).bulk_create(new_objects)
+    if saved_objects:
+        _bulk_upsert(db_name, model_class, saved_objects, update_fields)
+
+
+def _bulk_upsert(db_name, model_class, objects, update_fields=None):
+    fields = model_class._meta.concrete_fields
+    update_columns = [
+        field.column for field in fields
+        if not field.primary_key and (update_fields is None or field.name in update_fields)
+    ]
+    with model_class.get_cursor_for_partition_db(db_name) as cursor:
+        connection = cursor.db
+        quote_name = connection.ops.quote_name
+        query = 'INSERT INTO {table} ({columns}) VALUES {rows} ON CONFLICT ({pk}) DO UPDATE SET {updates}'.format(
+            table=quote_name(model_class._meta.db_table),
+            columns=', '.join(quote_name(field.column) for field in fields),
+            rows=', '.join(['({})'.format(', '.join(['%s'] * len(fields)))] * len(objects)),
+            pk=quote_name(model_class._meta.pk.column),
+            updates=', '.join(
+                '{0} = EXCLUDED.{0}'.format(quote_name(column)) for column in update_columns
+            ),
+        )
+        cursor.execute(query, [
+            field.get_db_prep_save(field.pre_save(obj, False), connection)
+            for obj in objects
+            for field in fields
+        ])
+    for obj in objects:
+        obj._state.adding = False
+        obj._state.db = db_name
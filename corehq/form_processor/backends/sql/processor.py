@@ -15,7 +15,7 @@ from corehq.form_processor.backends.sql.dbaccessors import (
     FormAccessorSQL, CaseAccessorSQL, LedgerAccessorSQL
 )
 from corehq.form_processor.change_publishers import (
-    publish_form_saved, publish_case_saved, publish_ledger_v2_saved)
+    publish_form_changes_saved, publish_form_saved, publish_case_saved, publish_ledger_v2_saved)
 from corehq.form_processor.exceptions import CaseNotFound, KafkaPublishingError
 from corehq.form_processor.interfaces.processor import CaseUpdateMetadata
 from corehq.form_processor.models import (
@@ -121,8 +121,7 @@ class FormProcessorSQL(object):
 
                 FormAccessorSQL.save_new_form(processed_forms.submitted)
                 if cases:
-                    for case in cases:
-                        CaseAccessorSQL.save_case(case)
+                    cls._save_cases(processed_forms.submitted.domain, cases)
 
                 if stock_result:
                     ledgers_to_save = stock_result.models_to_save
@@ -132,9 +131,12 @@ class FormProcessorSQL(object):
                 sort_submissions = toggles.SORT_OUT_OF_ORDER_FORM_SUBMISSIONS_SQL.enabled(
                     processed_forms.submitted.domain, toggles.NAMESPACE_DOMAIN)
                 if sort_submissions:
-                    for case in cases:
-                        if SqlCaseUpdateStrategy(case).reconcile_transactions_if_necessary():
-                            CaseAccessorSQL.save_case(case)
+                    reconciled_cases = [
+                        case for case in cases
+                        if SqlCaseUpdateStrategy(case).reconcile_transactions_if_necessary()
+                    ]
+                    if reconciled_cases:
+                        cls._save_cases(processed_forms.submitted.domain, reconciled_cases)
         except DatabaseError:
             for model in all_models:
                 setattr(model, model._meta.pk.attname, None)
@@ -147,10 +149,23 @@ class FormProcessorSQL(object):
         except Exception as e:
             raise KafkaPublishingError(e)
 
+    @staticmethod
+    def _save_cases(domain, cases):
+        if toggles.BULK_CASE_SAVES.enabled(domain, toggles.NAMESPACE_DOMAIN):
+            CaseAccessorSQL.save_cases(cases)
+        else:
+            for case in cases:
+                CaseAccessorSQL.save_case(case)
+
     @staticmethod
     def publish_changes_to_kafka(processed_forms, cases, stock_result):
-        publish_form_saved(processed_forms.submitted)
         cases = cases or []
+        if toggles.BATCH_KAFKA_PUBLISHING.enabled(processed_forms.submitted.domain, toggles.NAMESPACE_DOMAIN):
+            ledgers = stock_result.models_to_save if stock_result else []
+            publish_form_changes_saved(processed_forms.submitted, cases, ledgers)
+            return
+
+        publish_form_saved(processed_forms.submitted)
         for case in cases:
             publish_case_saved(case)
 
@@ -120,6 +120,38 @@ class AbstractCaseDbCache(metaclass=ABCMeta):
         for case in self._iter_cases(case_ids):
             self.set(_get_id_for_case(case), case)
 
+    def populate_with_locks(self, case_ids):
+        """
+        Like populate, but gets the cases one by one with a lock (if locking
+        is enabled) that is held until the current context exits.
+        Cases are locked in a fixed order, so concurrent callers don't
+        deadlock. Invalid cases are skipped (and not locked).
+        """
+        for case_id in sorted(set(case_ids) - set(self.cache.keys())):
+            try:
+                case, lock = self.processor_interface.get_case_with_lock(case_id, self.lock, self.wrap)
+            except IllegalCaseId:
+                continue
+            if case:
+                try:
+                    self.set(case_id, case)
+                except IllegalCaseId:
+                    if lock is not None:
+                        release_lock(lock, True)
+                    continue
+            if lock:
+                self.locks.append(lock)
+
+    def reload(self):
+        """
+        Replace the cached cases with the cases in the database, discarding
+        any unsaved changes. Locks are kept.
+        """
+        case_ids = list(self.cache)
+        self.cache = {}
+        self.clear_changed()
+        self.populate(case_ids)
+
     @abstractmethod
     def _iter_cases(self, case_ids):
         pass
@@ -88,6 +88,22 @@ def change_meta_from_ledger_v2(ledger_ref, domain, deleted=False):
     )
 
 
+def publish_form_changes_saved(form, cases, ledger_values):
+    """
+    Publish the changes of a processed form to kafka together and run case post-save signals.
+    """
+    producer.send_changes(
+        [(topics.FORM_SQL, change_meta_from_sql_form(form))]
+        + [(topics.CASE_SQL, change_meta_from_sql_case(case)) for case in cases]
+        + [
+            (topics.LEDGER, change_meta_from_ledger_v2(ledger_value.ledger_reference, ledger_value.domain))
+            for ledger_value in ledger_values
+        ]
+    )
+    for case in cases:
+        sql_case_post_save.send(case.__class__, case=case)
+
+
 def publish_ledger_v1_saved(stock_state, deleted=False):
     producer.send_change(topics.LEDGER, change_meta_from_ledger_v1(stock_state, deleted))
 
@@ -489,16 +489,19 @@ class XFormInstanceSQL(PartitionedModel, models.Model, RedisLockableMixIn, Attac
     def form_data(self):
         """Returns the JSON representation of the form XML"""
         from couchforms import XMLSyntaxError
-        from .utils import convert_xform_to_json, adjust_datetimes
+        from .utils import convert_xform_to_json, convert_xform_to_adjusted_json, adjust_datetimes
         from corehq.form_processor.utils.metadata import scrub_form_meta
+        from corehq.toggles import SINGLE_PASS_XFORM_PARSING
         xml = self.get_xml()
-        try:
-            form_json = convert_xform_to_json(xml)
-        except XMLSyntaxError:
-            return {}
         # we can assume all sql domains are new timezone domains
         with force_phone_timezones_should_be_processed():
-            adjust_datetimes(form_json)
+            try:
+                if SINGLE_PASS_XFORM_PARSING.enabled(self.domain):
+                    form_json = convert_xform_to_adjusted_json(xml)
+                else:
+                    form_json = adjust_datetimes(convert_xform_to_json(xml))
+            except XMLSyntaxError:
+                return {}
 
         scrub_form_meta(self.form_id, form_json)
         return form_json
@@ -9,7 +9,12 @@ from corehq.form_processor.exceptions import MissingFormXml, NotAllowed
 from corehq.form_processor.interfaces.dbaccessors import FormAccessors
 from corehq.form_processor.interfaces.processor import FormProcessorInterface
 from corehq.form_processor.models import Attachment
-from corehq.form_processor.utils import convert_xform_to_json, adjust_datetimes
+from corehq.form_processor.utils import (
+    adjust_datetimes,
+    convert_xform_to_adjusted_json,
+    convert_xform_to_json,
+)
+from corehq.toggles import SINGLE_PASS_XFORM_PARSING
 from corehq.util.soft_assert.api import soft_assert
 from couchforms import XMLSyntaxError
 from couchforms.exceptions import MissingXMLNSError
@@ -97,11 +102,16 @@ def _create_new_xform(domain, instance_xml, attachments=None, auth_context=None)
     interface = FormProcessorInterface(domain)
 
     assert attachments is not None
-    form_data = convert_xform_to_json(instance_xml)
+    single_pass = SINGLE_PASS_XFORM_PARSING.enabled(domain)
+    if single_pass:
+        form_data = convert_xform_to_adjusted_json(instance_xml)
+    else:
+        form_data = convert_xform_to_json(instance_xml)
     if not form_data.get('@xmlns'):
         raise MissingXMLNSError("Form is missing a required field: XMLNS")
 
-    adjust_datetimes(form_data)
+    if not single_pass:
+        adjust_datetimes(form_data)
 
     xform = interface.new_xform(form_data)
     xform.domain = domain
@@ -0,0 +1,256 @@
+"""
+Batch form submissions
+
+``BatchSubmissionPost`` processes many form instances of a domain that were
+posted in one request. Each form is processed like a single submission
+(see ``SubmissionPost``) and gets its own OpenRosa response, but:
+
+- all instances are parsed before any form is processed, and the forms are
+  processed in case dependency order: a form that creates a case is
+  processed before the other forms of the batch that use the case.
+  Otherwise forms are processed in the order they were submitted.
+- all forms share one case cache, so a case used by several forms of the
+  batch is loaded and locked once. Forms are processed in groups of forms
+  that share cases, and the cases of a group are only locked while the
+  group is processed.
+
+The submission rate limit is checked for each form. Once it is reached the
+remaining forms of the batch are rejected.
+
+Each form is still saved in its own transactions, so a form that fails
+doesn't affect the other forms of the batch.
+"""
+import heapq
+import time
+from collections import defaultdict, namedtuple
+
+from django.http import HttpResponse
+
+from tastypie.http import HttpTooManyRequests
+
+from casexml.apps.case.xform import get_case_updates
+from dimagi.utils.logging import notify_exception
+
+from corehq.apps.receiverwrapper.rate_limiter import rate_limit_submission
+from corehq.form_processor.exceptions import XFormLockError
+from corehq.form_processor.interfaces.processor import FormProcessorInterface
+from corehq.form_processor.parsers.ledgers.form import get_case_ids_from_stock_transactions
+from corehq.form_processor.submission_post import FormProcessingResult, SubmissionPost
+
+# The cases a form updates (or has ledgers for), creates and indexes
+CaseDependencies = namedtuple('CaseDependencies', 'case_ids created_ids referenced_ids')
+
+# case locks expire after 120 seconds (see ``get_locked_obj``). No more forms
+# of a group are processed once its cases have been locked for this long.
+MAX_CASE_LOCK_SECONDS = 60
+
+
+def get_case_dependencies(xform):
+    if xform.is_submission_error_log:
+        return CaseDependencies(set(), set(), set())
+    case_updates = get_case_updates(xform)
+    index_actions = [update.get_index_action() for update in case_updates]
+    return CaseDependencies(
+        case_ids={update.id for update in case_updates} | get_case_ids_from_stock_transactions(xform),
+        created_ids={update.id for update in case_updates if update.creates_case()},
+        referenced_ids={
+            index.referenced_id
+            for action in index_actions if action
+            for index in action.indices if index.referenced_id
+        },
+    )
+
+
+def order_by_case_dependency(dependencies):
+    """Order forms so that cases are created before they are used
+
+    The form that creates a case comes before the other forms that update
+    or index the case, and forms that update the same case stay in the
+    order they were submitted. Forms are otherwise kept in submission order,
+    which is also used for forms with circular dependencies.
+
+    :param dependencies: list of ``CaseDependencies`` in submission order.
+    :returns: list of positions in ``dependencies``.
+    """
+    creators = {}
+    for position, form in enumerate(dependencies):
+        for case_id in form.created_ids:
+            creators.setdefault(case_id, position)
+
+    followers = defaultdict(set)
+    last_updates = {}
+    for position, form in enumerate(dependencies):
+        for case_id in form.case_ids | form.referenced_ids:
+            creator = creators.get(case_id, position)
+            if creator != position:
+                followers[creator].add(position)
+        for case_id in form.case_ids:
+            if creators.get(case_id) != position:
+                if case_id in last_updates:
+                    followers[last_updates[case_id]].add(position)
+                last_updates[case_id] = position
+
+    blockers = defaultdict(int)
+    for positions in followers.values():
+        for position in positions:
+            blockers[position] += 1
+    ready = [position for position in range(len(dependencies)) if not blockers[position]]
+    order = []
+    while ready:
+        position = heapq.heappop(ready)
+        order.append(position)
+        for follower in followers.pop(position, ()):
+            blockers[follower] -= 1
+            if not blockers[follower]:
+                heapq.heappush(ready, follower)
+
+    if len(order) < len(dependencies):
+        ordered = set(order)
+        order.extend(position for position in range(len(dependencies)) if position not in ordered)
+    return order
+
+
+def group_by_shared_cases(dependencies, order):
+    """Split forms into groups with no cases in common
+
+    :param dependencies: list of ``CaseDependencies`` in submission order.
+    :param order: positions in ``dependencies`` in processing order (see
+    ``order_by_case_dependency``).
+    :returns: list of position lists, each in processing order. Groups are
+    ordered by their first position in ``order``.
+    """
+    parents = list(range(len(dependencies)))
+
+    def find(position):
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    first_position_by_case_id = {}
+    for position, form in enumerate(dependencies):
+        for case_id in form.case_ids | form.referenced_ids:
+            if case_id in first_position_by_case_id:
+                parents[find(position)] = find(first_position_by_case_id[case_id])
+            else:
+                first_position_by_case_id[case_id] = position
+
+    groups = {}
+    for position in order:
+        groups.setdefault(find(position), []).append(position)
+    return list(groups.values())
+
+
+class BatchSubmissionPost(object):
+
+    def __init__(self, instances, domain, **kwargs):
+        """
+        :param instances: list of form XML instances.
+        :param kwargs: ``SubmissionPost`` arguments shared by all instances
+        (other than ``instance``, ``attachments`` and ``case_db``).
+        """
+        assert domain, "'domain' is required"
+        self.domain = domain
+        self.case_db = FormProcessorInterface(domain).casedb_cache(
+            domain=domain, lock=True, deleted_ok=True, load_src="batch_form_submission",
+        )
+        self.submissions = [
+            SubmissionPost(instance=instance, domain=domain, case_db=self.case_db, **kwargs)
+            for instance in instances
+        ]
+
+    def run(self):
+        """
+        :returns: list of ``FormProcessingResult``, one for each instance in
+        the order they were given.
+        """
+        results = [None] * len(self.submissions)
+        parsed_forms = {}
+        rate_limited = False
+        for position, submission in enumerate(self.submissions):
+            # usage is reported per form by check_failure_modes
+            rate_limited = rate_limited or rate_limit_submission(self.domain)
+            if rate_limited:
+                results[position] = FormProcessingResult(HttpTooManyRequests(), None, [], [], 'rate_limited')
+                continue
+            results[position] = submission.check_failure_modes()
+            if results[position] is None:
+                try:
+                    parsed_forms[position] = submission.parse_form()
+                except Exception:
+                    [results[position]] = self._get_error_results("Error parsing form of batch submission")
+
+        positions = sorted(parsed_forms)
+        dependencies = [get_case_dependencies(parsed_forms[position].submitted_form) for position in positions]
+        order = order_by_case_dependency(dependencies)
+        for group in group_by_shared_cases(dependencies, order):
+            group_positions = [positions[index] for index in group]
+            case_ids = set()
+            for index in group:
+                case_ids |= dependencies[index].case_ids | dependencies[index].referenced_ids
+            group_results = self._process_group(
+                [(self.submissions[position], parsed_forms[position]) for position in group_positions], case_ids
+            )
+            for position, result in zip(group_positions, group_results):
+                results[position] = result
+        return results
+
+    def _process_group(self, forms, case_ids):
+        """Process forms that share cases while holding the locks of the cases
+
+        :param forms: list of ``(submission, parsed_form)`` in processing order.
+        :returns: list of ``FormProcessingResult`` in the same order.
+        """
+        with self.case_db:
+            try:
+                self.case_db.populate_with_locks(case_ids)
+            except Exception:
+                return self._get_error_results(
+                    "Error loading cases of batch submission", [parsed_form for _, parsed_form in forms]
+                )
+
+            locked_on = time.time()
+            results = []
+            for submission, parsed_form in forms:
+                if results and time.time() - locked_on > MAX_CASE_LOCK_SECONDS:
+                    # the case locks are about to expire. The form can be submitted again
+                    response = HttpResponse(
+                        "Batch submission took too long to process", status=423, content_type="text/plain"
+                    )
+                    results.append(FormProcessingResult(response, None, [], [], 'error'))
+                else:
+                    results.append(self._process_form(submission, parsed_form))
+            return results
+
+    def _process_form(self, submission, parsed_form):
+        try:
+            result = submission.process_parsed_form(parsed_form)
+        except XFormLockError as err:
+            self.case_db.reload()
+            response = HttpResponse("XFormLockError: %s" % err, status=423, content_type="text/plain")
+            return FormProcessingResult(response, None, [], [], 'error')
+        except Exception:
+            self.case_db.reload()
+            [result] = self._get_error_results("Error processing form of batch submission", [parsed_form])
+            return result
+
+        if self.case_db.get_changed():
+            # the form changed cases but didn't save them
+            self.case_db.reload()
+        return result
+
+    def _get_error_results(self, message, parsed_forms=(None,)):
+        """
+        :returns: an error ``FormProcessingResult`` for each of ``parsed_forms``.
+        """
+        notify_exception(None, message, details={
+            'domain': self.domain,
+            'form_ids': [parsed_form.submitted_form.form_id for parsed_form in parsed_forms if parsed_form],
+        })
+        # the forms can be submitted again
+        return [
+            FormProcessingResult(
+                HttpResponse(message, status=500, content_type="text/plain"), None, [], [], 'error'
+            )
+            for parsed_form in parsed_forms
+        ]
@@ -89,7 +89,7 @@ class SubmissionPost(object):
         self.formdb = FormAccessors(domain)
         self.partial_submission = partial_submission
         # always None except in the case where a system form is being processed as part of another submission
-        # e.g. for closing extension cases
+        # e.g. for closing extension cases, or where a form is processed as part of a batch submission
         self.case_db = case_db
         if case_db:
             assert case_db.domain == domain
@@ -215,18 +215,39 @@ class SubmissionPost(object):
         return "\n\n".join(messages)
 
     def run(self):
+        failure_result = self.check_failure_modes()
+        if failure_result:
+            return failure_result
+        return self.process_parsed_form(self.parse_form())
+
+    def check_failure_modes(self):
+        """Track the submission and check for failures that prevent processing it
+
+        :returns: ``FormProcessingResult`` if the form can't be processed,
+        otherwise ``None``.
+        """
         self.track_load()
         report_submission_usage(self.domain)
         failure_response = self._handle_basic_failure_modes()
         if failure_response:
             return FormProcessingResult(failure_response, None, [], [], 'known_failures')
+        return None
 
+    def parse_form(self):
+        """Create the (unsaved) form from the submitted instance
+
+        :returns: the result of ``process_xform_xml``, to be passed to
+        ``process_parsed_form``.
+        """
         result = process_xform_xml(self.domain, self.instance, self.attachments, self.auth_context.to_json())
         submitted_form = result.submitted_form
 
         self._post_process_form(submitted_form)
         self._invalidate_caches(submitted_form)
+        return result
 
+    def process_parsed_form(self, result):
+        submitted_form = result.submitted_form
         if submitted_form.is_submission_error_log:
             self.formdb.save_new_form(submitted_form)
 
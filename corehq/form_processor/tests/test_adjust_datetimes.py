@@ -2,7 +2,29 @@ from django.test import SimpleTestCase
 from corehq.apps.tzmigration.api import phone_timezones_should_be_processed
 from corehq.apps.tzmigration.test_utils import \
     run_pre_and_post_timezone_migration
-from corehq.form_processor.utils import adjust_datetimes
+from corehq.form_processor.utils import (
+    adjust_datetimes,
+    convert_xform_to_adjusted_json,
+    convert_xform_to_json,
+)
+
+FORM_XML = """<?xml version='1.0' ?>
+<data xmlns="http://openrosa.org/formdesigner/adjust" uiVersion="1" version="3">
+    <visit_date>2015-04-03</visit_date>
+    <visit_time>2013-03-09T06:30:09.007+03</visit_time>
+    <not_a_datetime>2015-07-14 2015-06-07 </not_a_datetime>
+    <repeat when="2013-03-09T06:30:09.007">
+        <value>2013-03-09T06:30:09</value>
+    </repeat>
+    <repeat when="2013-03-10T06:30:09.007">
+        <value>2013-03-10T06:30:09Z</value>
+    </repeat>
+    <with_attr type="datetime">2013-03-09T06:30:09.007</with_attr>
+    <n1:meta xmlns:n1="http://openrosa.org/jr/xforms">
+        <n1:timeStart>2013-04-19T16:53:02.799-04</n1:timeStart>
+        <n1:timeEnd>2013-04-19T16:53:02.799-04</n1:timeEnd>
+    </n1:meta>
+</data>"""
 
 
 class AdjustDatetimesTest(SimpleTestCase):
@@ -36,3 +58,21 @@ class AdjustDatetimesTest(SimpleTestCase):
             adjust_datetimes({'fake_datetime': fake_datetime}),
             {'fake_datetime': fake_datetime}
         )
+
+
+class ConvertXformToAdjustedJsonTest(SimpleTestCase):
+
+    @run_pre_and_post_timezone_migration
+    def test_same_as_adjust_datetimes(self):
+        self.assertEqual(
+            convert_xform_to_adjusted_json(FORM_XML),
+            adjust_datetimes(convert_xform_to_json(FORM_XML)),
+        )
+
+    def test_mixed_content(self):
+        xml = FORM_XML.replace('<visit_date>', '<visit>2013-03-09T06:30:09.007<visit_date>').replace(
+            '</visit_date>', '</visit_date></visit>')
+        self.assertEqual(
+            convert_xform_to_adjusted_json(xml),
+            adjust_datetimes(convert_xform_to_json(xml)),
+        )
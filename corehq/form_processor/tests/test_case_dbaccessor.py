@@ -385,6 +385,78 @@ class CaseAccessorTestsSQL(TestCase):
         with self.assertRaises(CaseSaveError):
             CaseAccessorSQL.save_case(case)
 
+    def test_save_cases(self):
+        case1 = _create_case()
+        case2 = _create_case()
+        for case in [case1, case2]:
+            case.track_create(CommCareCaseIndexSQL(
+                case=case,
+                identifier='parent',
+                referenced_type='mother',
+                referenced_id=uuid.uuid4().hex,
+                relationship_id=CommCareCaseIndexSQL.CHILD
+            ))
+            case.track_create(CaseAttachmentSQL(
+                case=case,
+                attachment_id=uuid.uuid4().hex,
+                name='doc',
+                content_type='text/xml',
+                blob_id='128',
+                md5='123',
+            ))
+        case1.name = 'new_name'
+        CaseAccessorSQL.save_cases([case1, case2])
+
+        self.assertEqual('new_name', CaseAccessorSQL.get_case(case1.case_id).name)
+        self.assertEqual(2, len(CaseAccessorSQL.get_indices_for_cases(DOMAIN, [case1.case_id, case2.case_id])))
+        self.assertEqual(2, len(CaseAccessorSQL.get_attachments_for_cases([case1.case_id, case2.case_id])))
+
+        [index] = CaseAccessorSQL.get_indices(case1.domain, case1.case_id)
+        index.identifier = 'new_identifier'  # shouldn't get saved
+        index.referenced_id = uuid.uuid4().hex
+        case1.track_update(index)
+        [index2] = CaseAccessorSQL.get_indices(case2.domain, case2.case_id)
+        case2.track_delete(index2)
+        CaseAccessorSQL.save_cases([case1, case2])
+
+        [updated_index] = CaseAccessorSQL.get_indices(case1.domain, case1.case_id)
+        self.assertEqual(updated_index.id, index.id)
+        self.assertEqual('parent', updated_index.identifier)
+        self.assertEqual(index.referenced_id, updated_index.referenced_id)
+        self.assertEqual([], CaseAccessorSQL.get_indices(case2.domain, case2.case_id))
+
+    def test_save_cases_new_case(self):
+        case = CommCareCaseSQL(
+            case_id=uuid.uuid4().hex,
+            domain=DOMAIN,
+            type='',
+            owner_id='user1',
+            opened_on=datetime.utcnow(),
+            modified_on=datetime.utcnow(),
+            modified_by='user1',
+            server_modified_on=datetime.utcnow(),
+        )
+        CaseAccessorSQL.save_cases([case])
+        self.assertTrue(case.is_saved())
+        self.assertEqual(case.id, CaseAccessorSQL.get_case(case.case_id).id)
+
+    def test_save_cases_update_attachment(self):
+        case = _create_case()
+        case.track_create(CaseAttachmentSQL(
+            case=case,
+            attachment_id=uuid.uuid4().hex,
+            name='doc',
+            content_type='text/xml',
+            blob_id='128',
+            md5='123',
+        ))
+        CaseAccessorSQL.save_cases([case])
+
+        [attachment] = CaseAccessorSQL.get_attachments(case.case_id)
+        case.track_create(attachment)
+        with self.assertRaises(CaseSaveError):
+            CaseAccessorSQL.save_cases([case])
+
     def test_get_case_ids_by_owners(self):
         case1 = _create_case(user_id="user1")
         case2 = _create_case(user_id="user1")
@@ -0,0 +1,172 @@
+import uuid
+
+from django.test import SimpleTestCase, TestCase
+
+from mock import patch
+
+from casexml.apps.case.mock import CaseBlock
+
+from corehq.form_processor import submission_batch
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
+from corehq.form_processor.submission_batch import (
+    BatchSubmissionPost,
+    CaseDependencies,
+    group_by_shared_cases,
+    order_by_case_dependency,
+)
+from corehq.form_processor.tests.utils import (
+    FormProcessorTestUtils,
+    use_sql_backend,
+)
+from corehq.form_processor.utils.xform import FormSubmissionBuilder
+
+DOMAIN = 'test-submission-batch'
+
+
+def _dependencies(case_ids=(), created_ids=(), referenced_ids=()):
+    return CaseDependencies(set(case_ids) | set(created_ids), set(created_ids), set(referenced_ids))
+
+
+class OrderByCaseDependencyTest(SimpleTestCase):
+
+    def test_submission_order(self):
+        self.assertEqual([0, 1, 2], order_by_case_dependency([
+            _dependencies(created_ids=['a']),
+            _dependencies(case_ids=['a']),
+            _dependencies(case_ids=['b']),
+        ]))
+
+    def test_create_before_update(self):
+        self.assertEqual([1, 0, 2], order_by_case_dependency([
+            _dependencies(case_ids=['a']),
+            _dependencies(created_ids=['a']),
+            _dependencies(case_ids=['b']),
+        ]))
+
+    def test_create_before_index(self):
+        self.assertEqual([0, 2, 1], order_by_case_dependency([
+            _dependencies(case_ids=['b']),
+            _dependencies(created_ids=['c'], referenced_ids=['a']),
+            _dependencies(created_ids=['a']),
+        ]))
+
+    def test_updates_keep_order(self):
+        self.assertEqual([2, 0, 1], order_by_case_dependency([
+            _dependencies(case_ids=['a']),
+            _dependencies(case_ids=['a']),
+            _dependencies(created_ids=['a']),
+        ]))
+
+    def test_circular_dependencies(self):
+        self.assertEqual([0, 1], order_by_case_dependency([
+            _dependencies(created_ids=['a'], referenced_ids=['b']),
+            _dependencies(created_ids=['b'], referenced_ids=['a']),
+        ]))
+
+
+class GroupBySharedCasesTest(SimpleTestCase):
+
+    def test_groups(self):
+        dependencies = [
+            _dependencies(case_ids=['a']),
+            _dependencies(case_ids=['b']),
+            _dependencies(created_ids=['c'], referenced_ids=['a']),
+            _dependencies(),
+            _dependencies(case_ids=['b', 'd']),
+        ]
+        self.assertEqual(
+            [[2, 0], [1, 4], [3]],
+            group_by_shared_cases(dependencies, [2, 1, 0, 3, 4])
+        )
+
+    def test_transitive(self):
+        dependencies = [
+            _dependencies(case_ids=['a']),
+            _dependencies(case_ids=['b']),
+            _dependencies(case_ids=['a', 'b']),
+        ]
+        self.assertEqual([[0, 1, 2]], group_by_shared_cases(dependencies, [0, 1, 2]))
+
+
+@use_sql_backend
+class BatchSubmissionPostTest(TestCase):
+
+    def tearDown(self):
+        FormProcessorTestUtils.delete_all_sql_forms(DOMAIN)
+        FormProcessorTestUtils.delete_all_sql_cases(DOMAIN)
+        super(BatchSubmissionPostTest, self).tearDown()
+
+    def _get_form_xml(self, *case_blocks):
+        return FormSubmissionBuilder(uuid.uuid4().hex, case_blocks=case_blocks).as_xml_string()
+
+    def test_batch(self):
+        parent_id = uuid.uuid4().hex
+        child_id = uuid.uuid4().hex
+        results = BatchSubmissionPost([
+            self._get_form_xml(CaseBlock(child_id, create=True, index={'parent': ('person', parent_id)})),
+            self._get_form_xml(CaseBlock(parent_id, update={'age': '3'})),
+            self._get_form_xml(CaseBlock(parent_id, create=True, case_type='person')),
+        ], DOMAIN).run()
+
+        self.assertEqual(['normal'] * 3, [result.submission_type for result in results])
+        self.assertEqual([201] * 3, [result.response.status_code for result in results])
+        parent = CaseAccessors(DOMAIN).get_case(parent_id)
+        self.assertEqual('3', parent.get_case_property('age'))
+        [index] = CaseAccessors(DOMAIN).get_case(child_id).indices
+        self.assertEqual(parent_id, index.referenced_id)
+
+    def test_form_error(self):
+        case_id = uuid.uuid4().hex
+        results = BatchSubmissionPost([
+            self._get_form_xml(CaseBlock(case_id, create=True)),
+            self._get_form_xml(
+                CaseBlock(case_id, update={'name': 'bad'}),
+                CaseBlock(uuid.uuid4().hex, create=True, index={'parent': ('person', 'missing')}),
+            ),
+            self._get_form_xml(CaseBlock(case_id, update={'name': 'good'})),
+        ], DOMAIN).run()
+
+        self.assertEqual(['normal', 'error', 'normal'], [result.submission_type for result in results])
+        self.assertEqual('good', CaseAccessors(DOMAIN).get_case(case_id).get_case_property('name'))
+        self.assertEqual(2, len(CaseAccessors(DOMAIN).get_case(case_id).transactions))
+
+    def test_rate_limited(self):
+        case_id = uuid.uuid4().hex
+        with patch('corehq.form_processor.submission_batch.rate_limit_submission',
+                   side_effect=[False, True]) as rate_limit:
+            results = BatchSubmissionPost([
+                self._get_form_xml(CaseBlock(case_id, create=True)),
+                self._get_form_xml(CaseBlock(case_id, update={'name': 'limited'})),
+                self._get_form_xml(CaseBlock(case_id, update={'name': 'limited'})),
+            ], DOMAIN).run()
+
+        self.assertEqual(2, rate_limit.call_count)
+        self.assertEqual([201, 429, 429], [result.response.status_code for result in results])
+        self.assertEqual(1, len(CaseAccessors(DOMAIN).get_case(case_id).transactions))
+
+    def test_case_locks_held_too_long(self):
+        case_id = uuid.uuid4().hex
+        other_case_id = uuid.uuid4().hex
+        with patch.object(submission_batch, 'MAX_CASE_LOCK_SECONDS', 0):
+            results = BatchSubmissionPost([
+                self._get_form_xml(CaseBlock(case_id, create=True)),
+                self._get_form_xml(CaseBlock(case_id, update={'name': 'late'})),
+                self._get_form_xml(CaseBlock(other_case_id, create=True)),
+            ], DOMAIN).run()
+
+        # the first form of each group is always processed
+        self.assertEqual([201, 423, 201], [result.response.status_code for result in results])
+        self.assertEqual(1, len(CaseAccessors(DOMAIN).get_case(case_id).transactions))
+
+    def test_error_loading_cases(self):
+        case_id = uuid.uuid4().hex
+        batch = BatchSubmissionPost([
+            self._get_form_xml(CaseBlock(case_id, create=True)),
+            self._get_form_xml(CaseBlock(case_id, update={'name': 'new'})),
+        ], DOMAIN)
+        with patch.object(batch.case_db, 'populate_with_locks', side_effect=Exception), \
+                patch('corehq.form_processor.submission_batch.notify_exception') as notify:
+            results = batch.run()
+
+        self.assertEqual([500, 500], [result.response.status_code for result in results])
+        self.assertEqual(1, notify.call_count)
@@ -5,6 +5,7 @@ import iso8601
 import pytz
 
 import xml2json
+from xml2json.lib import convert_xml_to_json
 from corehq.apps.tzmigration.api import phone_timezones_should_be_processed
 from corehq.form_processor.interfaces.processor import XFormQuestionValueIterator
 from corehq.form_processor.models import Attachment
@@ -172,6 +173,45 @@ def convert_xform_to_json(xml_string):
     return json_form
 
 
+def convert_xform_to_adjusted_json(xml_string, process_timezones=None):
+    """
+    Same as convert_xform_to_json followed by adjust_datetimes, but the
+    datetimes are adjusted on the parsed XML (element text and attribute
+    values) before it is converted to json, so the json isn't walked again.
+    """
+    from couchforms import XMLSyntaxError
+    if isinstance(xml_string, str):
+        xml_string = xml_string.encode('utf-8')
+    try:
+        root = etree.XML(xml_string)
+    except etree.XMLSyntaxError as e:
+        raise XMLSyntaxError('Invalid XML: %s' % e)
+
+    process_timezones = process_timezones or phone_timezones_should_be_processed()
+    mixed_content = False
+    for element in root.iter(tag=etree.Element):
+        if len(element):
+            # text next to child elements ends up in '#text' (or is dropped)
+            mixed_content = mixed_content or bool(element.text and element.text.strip())
+        elif element.text:
+            adjusted = _adjust_datetime_text(element.text, process_timezones)
+            if adjusted is not None:
+                element.text = adjusted
+        if element is not root and element.tail and element.tail.strip():
+            mixed_content = True
+        for name, value in element.items():
+            adjusted = _adjust_datetime_text(value, process_timezones)
+            if adjusted is not None:
+                element.set(name, adjusted)
+
+    name, json_form = convert_xml_to_json(root)
+    json_form['#type'] = name
+    if mixed_content:
+        # rare, so leave it to adjust_datetimes (which is idempotent)
+        adjust_datetimes(json_form, process_timezones=process_timezones)
+    return json_form
+
+
 def adjust_text_to_datetime(text, process_timezones=None):
     matching_datetime = iso8601.parse_date(text)
     if process_timezones or phone_timezones_should_be_processed():
@@ -197,13 +237,10 @@ def adjust_datetimes(data, parent=None, key=None, process_timezones=None):
     process_timezones = process_timezones or phone_timezones_should_be_processed()
     # this strips the timezone like we've always done
     # todo: in the future this will convert to UTC
-    if isinstance(data, str) and jsonobject.re_loose_datetime.match(data):
-        try:
-            parent[key] = str(json_format_datetime(
-                adjust_text_to_datetime(data, process_timezones=process_timezones)
-            ))
-        except (iso8601.ParseError, ValueError):
-            pass
+    if isinstance(data, str):
+        adjusted = _adjust_datetime_text(data, process_timezones)
+        if adjusted is not None:
+            parent[key] = adjusted
     elif isinstance(data, dict):
         for key, value in data.items():
             adjust_datetimes(value, parent=data, key=key, process_timezones=process_timezones)
@@ -216,6 +253,21 @@ def adjust_datetimes(data, parent=None, key=None, process_timezones=None):
     return data
 
 
+def _adjust_datetime_text(text, process_timezones):
+    """
+    :returns: the uniformly formatted datetime if text is datetime-like,
+    otherwise None.
+    """
+    if jsonobject.re_loose_datetime.match(text):
+        try:
+            return str(json_format_datetime(
+                adjust_text_to_datetime(text, process_timezones=process_timezones)
+            ))
+        except (iso8601.ParseError, ValueError):
+            pass
+    return None
+
+
 def resave_form(domain, form):
     from corehq.form_processor.utils import should_use_sql_backend
     from corehq.form_processor.change_publishers import publish_form_saved
@@ -82,7 +82,8 @@ def get_case_pillow(
         pillow_id='case-pillow', ucr_division=None,
         include_ucrs=None, exclude_ucrs=None,
         num_processes=1, process_num=0, ucr_configs=None, skip_ucr=False,
-        processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE, topics=None, **kwargs):
+        processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE, topics=None, domain_pool_size=0,
+        **kwargs):
     """Return a pillow that processes cases. The processors include, UCR and elastic processors
 
     Processors:
@@ -103,6 +104,7 @@ def get_case_pillow(
         include_ucrs=include_ucrs,
         exclude_ucrs=exclude_ucrs,
         run_migrations=(process_num == 0),  # only first process runs migrations
+        domain_pool_size=domain_pool_size,
     )
     if ucr_configs:
         ucr_processor.bootstrap(ucr_configs)
@@ -170,7 +170,8 @@ def get_xform_to_elasticsearch_pillow(pillow_id='XFormToElasticsearchPillow', nu
 def get_xform_pillow(pillow_id='xform-pillow', ucr_division=None,
                      include_ucrs=None, exclude_ucrs=None,
                      num_processes=1, process_num=0, ucr_configs=None, skip_ucr=False,
-                     processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE, topics=None, **kwargs):
+                     processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE, topics=None, domain_pool_size=0,
+                     **kwargs):
     """Generic XForm change processor
 
     Processors:
@@ -195,6 +196,7 @@ def get_xform_pillow(pillow_id='xform-pillow', ucr_division=None,
         include_ucrs=include_ucrs,
         exclude_ucrs=exclude_ucrs,
         run_migrations=(process_num == 0),  # only first process runs migrations
+        domain_pool_size=domain_pool_size,
     )
     xform_to_es_processor = BulkElasticProcessor(
         elasticsearch=get_es_new(),
@@ -607,6 +607,13 @@ REPORT_BUILDER = StaticToggle(
     [NAMESPACE_DOMAIN],
 )
 
+UCR_REPORT_RESULT_CACHE = StaticToggle(
+    'ucr_report_result_cache',
+    'Cache the results of UCR report queries until the data source changes',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+)
+
 UCR_SUM_WHEN_TEMPLATES = StaticToggle(
     'ucr_sum_when_templates',
     'Allow sum when template columns in dynamic UCRs',
@@ -734,6 +741,90 @@ LIVEQUERY_SYNC = StaticToggle(
     namespaces=[NAMESPACE_DOMAIN],
 )
 
+LIVEQUERY_CASE_GRAPH_FOOTPRINT = StaticToggle(
+    'livequery_case_graph_footprint',
+    'Livequery sync: only read the parts of the case graph that changed since the last sync',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+RESTORE_CASE_XML_CACHE = StaticToggle(
+    'restore_case_xml_cache',
+    'Reuse the serialized case blocks of unchanged cases between restores',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+SHARED_USER_FIXTURE_CACHE = StaticToggle(
+    'shared_user_fixture_cache',
+    'Share the serialized lookup table and location fixtures of users with the same fixture items or locations',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+BULK_LOCATION_FIXTURES = StaticToggle(
+    'bulk_location_fixtures',
+    'Write location fixtures from a single query without building an XML element per location field',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+COMPACT_SYNC_LOGS = StaticToggle(
+    'compact_sync_logs',
+    'Store the case state of sync logs in a compact format, as a delta over the previous sync log where possible',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+PARALLEL_RESTORE_FIXTURES = StaticToggle(
+    'parallel_restore_fixtures',
+    'Generate the fixtures of a restore concurrently',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+INCREMENTAL_MOBILE_UCR_FIXTURES = StaticToggle(
+    'incremental_mobile_ucr_fixtures',
+    'Only sync mobile report fixtures that changed since the last sync',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+RESTORE_CASE_BATCH_PREFETCH = StaticToggle(
+    'restore_case_batch_prefetch',
+    'Load the indices, attachments and ledgers of each batch of restore cases together',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+BULK_CASE_SAVES = StaticToggle(
+    'bulk_case_saves',
+    'Save the cases of a form submission with multi-row queries per shard database',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+BULK_FORM_SUBMISSIONS = StaticToggle(
+    'bulk_form_submissions',
+    'Allow submitting many forms in one request to the batch submission endpoint',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+SINGLE_PASS_XFORM_PARSING = StaticToggle(
+    'single_pass_xform_parsing',
+    'Adjust the datetimes of submitted forms while parsing the form XML',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+BATCH_KAFKA_PUBLISHING = StaticToggle(
+    'batch_kafka_publishing',
+    'Publish the form, case and ledger changes of a form submission to kafka together',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
 NO_VELLUM = StaticToggle(
     'no_vellum',
     'Allow disabling Form Builder per form '